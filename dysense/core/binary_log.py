@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import json
+import struct
+
+from dysense.core.time_index import TimeIndexWriter, time_index_path
+from dysense.interfaces.data_ring_buffer import DataRecordLayout, check_record_data
+
+# First bytes of every binary log so readers can tell it apart from other files.
+BINARY_LOG_MAGIC = b'DYSBLOG\x00'
+
+# Increment if the file layout changes in a way older readers can't handle.
+BINARY_LOG_FORMAT_VERSION = 1
+
+# Extension used for binary logs (CSV logs use .csv)
+BINARY_LOG_EXTENSION = '.dlog'
+
+# Size of the header length that follows the magic bytes.
+_header_length_struct = struct.Struct(str('<I'))
+
+# Every record starts with utc_time.
+_utc_time_struct = struct.Struct(str('<d'))
+
+def supports_binary_log(data_metadata):
+    '''Return true if every data item in sensor metadata is numeric so it can be stored in a binary log.'''
+
+    data_types = [data_info.get('type', None) for data_info in data_metadata]
+
+    return len(data_types) > 0 and all(data_type in DataRecordLayout.type_to_format for data_type in data_types)
+
+class BinaryLog(object):
+    '''
+    Log each sensor data sample as a fixed-width little-endian record of utc_time followed by one field for each
+    data item. The file starts with BINARY_LOG_MAGIC, a 4 byte header length and then a UTF8 JSON header describing
+    the columns and record format, so it can be read (e.g. by numpy) without any other information.
+
+    Has the same interface as CSVLog so either can be used for session data logs.
+    Only works for sensors where all data is numeric (see supports_binary_log).
+    '''
+    def __init__(self, file_path, data_metadata, log_writer=None, index_interval=None):
+        '''
+        Save properties for creating log file when first data is received.
+
+        :param str file_path: path of new log file.
+        :param list data_metadata: 'data' section of sensor metadata that describes each data item.
+        :param log_writer: if specified then records are written by this LogWriter thread. Otherwise every record is
+                           written and flushed when it's received.
+        :param int index_interval: if specified then write a sparse time index next to the log with an entry for
+                                   every index_interval records.
+        '''
+        self.file_path = file_path
+        self.log_writer = log_writer
+        self.file = None
+
+        self.data_types = [data_info['type'] for data_info in data_metadata]
+
+        formats = ''.join(DataRecordLayout.type_to_format[data_type] for data_type in self.data_types)
+        self._struct = struct.Struct(str('<d' + formats))
+
+        self.columns = [{'name': 'utc_time', 'type': 'float', 'units': 'seconds'}]
+        for data_info in data_metadata:
+            self.columns.append({'name': data_info.get('name', ''), 'type': data_info['type'], 'units': data_info.get('units', '')})
+
+        if index_interval is not None:
+            self.time_index = TimeIndexWriter(time_index_path(file_path), index_interval)
+        else:
+            self.time_index = None
+
+    def handle_metadata(self, metadata):
+        '''Use metadata (list of column names, starting with utc_time) in header. Same as CSVLog.'''
+
+        if len(metadata) != len(self.columns):
+            raise ValueError("Expected {} column names but got {}".format(len(self.columns), len(metadata)))
+
+        for column, name in zip(self.columns, metadata):
+            column['name'] = name
+
+    def write(self, data):
+        '''
+        Write data (list starting with utc_time) to file or pass it to the log writer.
+        Raise ValueError if data doesn't match the sensor metadata.
+        '''
+        # Pack right away (it's cheap) so invalid data is reported to the caller instead of the writer thread.
+        record = self.prepare_row(data)
+
+        if self.log_writer is not None:
+            self.log_writer.submit(self, record)
+            return
+
+        self.write_rows([record])
+        self.file.flush()
+
+    def prepare_row(self, data):
+        '''Return data (list starting with utc_time) packed into a record. Raise ValueError if it doesn't match metadata.'''
+
+        if (data is None) or (len(data) == 0):
+            raise ValueError("Data can't be empty.")
+
+        check_record_data(data[1:], self.data_types)
+        try:
+            return self._struct.pack(*data)
+        except struct.error as e:
+            raise ValueError("Can't pack data sample. {}".format(e))
+
+    def row_utc_time(self, row):
+        '''Return utc_time of record returned by prepare_row().'''
+        return _utc_time_struct.unpack_from(row)[0]
+
+    def write_rows(self, rows):
+        '''Write list of packed records to file without flushing. Called by LogWriter thread.'''
+
+        if self.file is None:
+            self.file = open(self.file_path, 'wb')
+            self._write_header()
+
+        record_offset = self.file.tell()
+
+        self.file.write(b''.join(rows))
+
+        if self.time_index is not None:
+            record_size = self._struct.size
+            for record in rows:
+                self.time_index.add_row(self.row_utc_time(record), record_offset, record_offset + record_size)
+                record_offset += record_size
+
+    def flush(self, sync_to_disk=False):
+        '''Flush written data to the operating system, and optionally wait for it to be written to the disk itself.'''
+
+        if self.file is None:
+            return
+
+        self.file.flush()
+
+        if sync_to_disk:
+            os.fsync(self.file.fileno())
+
+        if self.time_index is not None:
+            self.time_index.flush()
+
+    def terminate(self):
+        '''Close file, or if using a log writer then queue it to be closed once everything before it is written.'''
+
+        if self.log_writer is not None:
+            self.log_writer.close_log(self)
+            return
+
+        self.close()
+
+    def close(self):
+        '''Make sure everything is on disk and then close file.'''
+
+        if self.file is None:
+            return # Never received any data.
+
+        if self.time_index is not None:
+            self.time_index.close(self.file.tell())
+
+        self.flush(sync_to_disk=True)
+        self.file.close()
+        self.file = None
+
+    def _write_header(self):
+
+        header = {'format_version': BINARY_LOG_FORMAT_VERSION,
+                  'record_format': self._struct.format,
+                  'record_size': self._struct.size,
+                  'columns': self.columns,
+                  }
+
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf8')
+
+        self.file.write(BINARY_LOG_MAGIC)
+        self.file.write(_header_length_struct.pack(len(header_bytes)))
+        self.file.write(header_bytes)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import collections
+
+class ChangeTracker(object):
+    '''
+    Collect changes to the controller and its sensors so they can be sent to managers once per loop iteration,
+    as one message for each object that changed, instead of one message for every individual change.
+
+    Sensor changes are tracked by field as they happen. The controller info is compared against the last info
+    that was sent so only the fields that are actually different are sent.
+    '''
+    def __init__(self):
+
+        # True if controller info may have changed since it was last sent.
+        self.controller_changed = False
+
+        # Last controller info that changes were taken from.
+        self._last_controller_info = {}
+
+        # Associate sensor ID with dictionary of {info_name: newest value} that haven't been sent yet.
+        self._sensor_id_to_changes = collections.OrderedDict()
+
+    def mark_controller_changed(self):
+
+        self.controller_changed = True
+
+    def mark_sensor_changed(self, sensor_id, info_name, value):
+
+        try:
+            self._sensor_id_to_changes[sensor_id][info_name] = value
+        except KeyError:
+            self._sensor_id_to_changes[sensor_id] = {info_name: value}
+
+    def forget_sensor(self, sensor_id):
+        '''Discard changes that haven't been sent for sensor (e.g. because it was removed).'''
+
+        self._sensor_id_to_changes.pop(sensor_id, None)
+
+    def pop_controller_changes(self, controller_info):
+        '''
+        Return dictionary of the fields in controller_info that are different than the last time this was called.
+        The 'id' field is always included. Return None if there aren't any changes.
+        '''
+        self.controller_changed = False
+
+        changes = {}
+        for info_name, value in controller_info.iteritems():
+            if info_name not in self._last_controller_info or self._last_controller_info[info_name] != value:
+                changes[info_name] = value
+
+        # Copy so changes to mutable values (e.g. settings dictionary) will be detected next time.
+        self._last_controller_info = _copy_info(controller_info)
+
+        if len(changes) == 0:
+            return None
+
+        changes['id'] = controller_info['id']
+        return changes
+
+    def pop_sensor_changes(self):
+        '''Return list of (sensor_id, {info_name: value}) for every sensor that changed, in the order they first changed.'''
+
+        sensor_changes = self._sensor_id_to_changes.items()
+        self._sensor_id_to_changes = collections.OrderedDict()
+        return sensor_changes
+
+def _copy_info(info):
+    '''Return copy of info dictionary where any list or dictionary values are copied too (one level deep).'''
+
+    info_copy = {}
+    for info_name, value in info.iteritems():
+        if isinstance(value, dict):
+            value = dict(value)
+        elif isinstance(value, list):
+            value = list(value)
+        info_copy[info_name] = value
+    return info_copy
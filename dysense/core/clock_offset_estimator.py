@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import collections
+
+class ClockOffsetEstimator(object):
+    '''
+    Estimate the offset between UTC time (from the time source) and the local system time, along with how fast
+    that offset is drifting. A single sample includes however long it was delayed before being timestamped, which
+    can only make the measured offset (utc_time - sys_time) smaller. So samples are grouped into short bins and
+    only the least delayed sample (largest offset) in each bin is kept, then a line is fit through the bins in a
+    sliding window. This gives a much steadier offset than using the newest sample by itself.
+
+    Also decides when the estimate needs to be published (e.g. to sensors) so it's only sent when it changes
+    meaningfully or when it hasn't been sent for a while, rather than once for every time source sample.
+    '''
+    def __init__(self, bin_duration=0.5, window_duration=30.0, min_fit_duration=5.0, max_drift=0.001, reset_threshold=1.0,
+                 update_threshold=0.001, update_period=2.0, min_update_interval=0.1):
+        '''
+        Constructor.
+
+        :param float bin_duration: keep one sample for every this many seconds.
+        :param float window_duration: samples older than this many seconds (compared to newest sample) aren't used.
+        :param float min_fit_duration: samples must span this many seconds before drift is estimated.
+        :param float max_drift: largest drift (seconds per second) that's believable.
+        :param float reset_threshold: if a sample is off by more than this many seconds then the time source must have
+                                      jumped (e.g. it changed) so the old samples are thrown out.
+        :param float update_threshold: publish estimate if it's changed by more than this many seconds.
+        :param float update_period: publish estimate at least this often (in seconds).
+        :param float min_update_interval: never publish estimate more often than this (in seconds).
+        '''
+        self.bin_duration = bin_duration
+        self.window_duration = window_duration
+        self.min_fit_duration = min_fit_duration
+        self.max_drift = max_drift
+        self.reset_threshold = reset_threshold
+        self.update_threshold = update_threshold
+        self.update_period = update_period
+        self.min_update_interval = min_update_interval
+
+        self.reset()
+
+    def reset(self):
+        '''Throw out all samples so the estimate starts over (e.g. because the time source changed).'''
+
+        # Least delayed sample (sys_time, offset) from each bin in the order they were received.
+        self._samples = collections.deque()
+
+        # System time that the newest bin started at.
+        self._bin_start_time = None
+
+        # Current fit is offset + drift * (sys_time - reference_sys_time).
+        self._reference_sys_time = 0.0
+        self._offset = 0.0
+        self.drift = 0.0
+
+        # Offset and system time of the last estimate that was published. None if it hasn't been published yet.
+        self._published_offset = None
+        self._published_sys_time = None
+
+    @property
+    def has_estimate(self):
+        return len(self._samples) > 0
+
+    @property
+    def num_samples(self):
+        return len(self._samples)
+
+    def add_sample(self, utc_time, sys_time):
+        '''Update estimate with time source sample where sys_time is when utc_time was read.'''
+
+        offset = utc_time - sys_time
+
+        if self.has_estimate and abs(offset - self.offset_at(sys_time)) > self.reset_threshold:
+            self.reset()
+
+        if self._bin_start_time is not None and (sys_time - self._bin_start_time) < self.bin_duration:
+            if offset <= self._samples[-1][1]:
+                return # more delayed than the sample already in this bin so it doesn't change anything
+            self._samples[-1] = (sys_time, offset)
+        else:
+            self._samples.append((sys_time, offset))
+            self._bin_start_time = sys_time
+
+        while self._samples[0][0] < sys_time - self.window_duration:
+            self._samples.popleft()
+
+        self._fit()
+
+    def offset_at(self, sys_time):
+        '''Return estimated UTC offset (utc - sys) at the specified system time.'''
+
+        return self._offset + self.drift * (sys_time - self._reference_sys_time)
+
+    def utc_time_at(self, sys_time):
+        '''Return estimated UTC time at the specified system time, or 0 if there aren't any samples yet.'''
+
+        if not self.has_estimate:
+            return 0.0
+
+        return sys_time + self.offset_at(sys_time)
+
+    def update_due(self, sys_time):
+        '''Return true if the estimate at sys_time should be published.'''
+
+        if not self.has_estimate:
+            return False
+
+        if self._published_sys_time is None:
+            return True # never been published
+
+        elapsed_time = sys_time - self._published_sys_time
+        if elapsed_time < self.min_update_interval:
+            return False
+
+        if elapsed_time >= self.update_period:
+            return True
+
+        return abs(self.offset_at(sys_time) - self._published_offset) > self.update_threshold
+
+    def mark_published(self, sys_time):
+        '''Record that the estimate at sys_time was published.'''
+
+        self._published_offset = self.offset_at(sys_time)
+        self._published_sys_time = sys_time
+
+    def _fit(self):
+        '''Least squares fit of offset vs system time through the current samples.'''
+
+        num_samples = float(len(self._samples))
+
+        # Reference everything to the newest sample to keep the numbers small.
+        self._reference_sys_time = self._samples[-1][0]
+
+        mean_time = sum(t - self._reference_sys_time for t, _ in self._samples) / num_samples
+        mean_offset = sum(offset for _, offset in self._samples) / num_samples
+
+        self.drift = 0.0
+        span = self._samples[-1][0] - self._samples[0][0]
+        if span >= self.min_fit_duration:
+            covariance = 0.0
+            variance = 0.0
+            for t, offset in self._samples:
+                dt = t - self._reference_sys_time - mean_time
+                covariance += dt * (offset - mean_offset)
+                variance += dt * dt
+            if variance > 0:
+                self.drift = max(-self.max_drift, min(self.max_drift, covariance / variance))
+
+        # Line passes through the mean sample.
+        self._offset = mean_offset - self.drift * mean_time
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import time
+import zlib
+import struct
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None # zstd compression is optional so only gzip will be available.
+
+# Values of the 'compression' sensor setting.
+COMPRESSION_TYPES = ['none', 'gzip', 'zstd']
+
+# Appended to the file name of compressed files.
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+# First bytes of each compressed block so readers can detect compression.
+_gzip_magic = b'\x1f\x8b'
+_zstd_magic = b'\x28\xb5\x2f\xfd'
+
+# CRC and uncompressed size at the end of every gzip member.
+_gzip_trailer_struct = struct.Struct(str('<II'))
+
+def is_compressed(compression):
+    '''Return true if compression setting means the file is compressed.'''
+    return compression not in [None, '', 'none']
+
+def compression_available(compression):
+    '''Return true if compression setting is valid and supported by the installed packages.'''
+
+    if compression not in COMPRESSION_TYPES:
+        return False
+
+    return compression != 'zstd' or zstandard is not None
+
+def compressed_file_path(file_path, compression):
+    '''Return file path with the extension for the compression type added (if it's compressed).'''
+
+    if not is_compressed(compression):
+        return file_path
+
+    return file_path + COMPRESSION_EXTENSIONS[compression]
+
+def open_output_file(file_path, compression):
+    '''Return new file opened for writing bytes that's compressed (see BlockCompressedFile) if specified.'''
+
+    if not is_compressed(compression):
+        return open(file_path, 'wb')
+
+    return BlockCompressedFile(file_path, compression)
+
+class BlockCompressedFile(object):
+    '''
+    Write-only file that compresses data in independent blocks. Each block is a complete gzip member or zstd frame,
+    which standard tools (e.g. gunzip, zstd -d) decompress as if it's one stream. A block is written whenever the file
+    is flushed, once enough data is waiting or once data has been waiting long enough. If the program crashes then
+    every block before the one being written can still be read (see read_compressed_file).
+    '''
+    def __init__(self, file_path, compression, max_block_size=1024*1024, max_block_age=2.0):
+        '''
+        Constructor.
+
+        :param str file_path: path of file to create.
+        :param str compression: either 'gzip' or 'zstd'.
+        :param int max_block_size: write block once this many uncompressed bytes are waiting.
+        :param float max_block_age: write block when data is written this many seconds after the first waiting data,
+                                    so files that are rarely flushed don't lose much data in a crash.
+        '''
+        if compression == 'gzip':
+            self._compress = _compress_gzip_block
+        elif compression == 'zstd':
+            if zstandard is None:
+                raise ValueError("zstd compression requires the zstandard package.")
+            self._compress = zstandard.ZstdCompressor().compress
+        else:
+            raise ValueError("Invalid compression type {}".format(compression))
+
+        self.name = file_path
+        self.compression = compression
+        self.max_block_size = max_block_size
+        self.max_block_age = max_block_age
+
+        self.file = open(file_path, 'wb')
+
+        # Uncompressed data waiting to be written as the next block.
+        self._pending = []
+        self._pending_size = 0
+        self._pending_start_time = None
+
+    def write(self, data):
+
+        if len(data) == 0:
+            return
+
+        if self._pending_start_time is None:
+            self._pending_start_time = time.time()
+
+        self._pending.append(data)
+        self._pending_size += len(data)
+
+        if self._pending_size >= self.max_block_size or (time.time() - self._pending_start_time) >= self.max_block_age:
+            self._write_block()
+
+    def tell(self):
+        '''Return how many compressed bytes have been written so far (not including data waiting for next block).'''
+        return self.file.tell()
+
+    def flush(self):
+        '''Write waiting data as a block and flush it to the operating system.'''
+
+        self._write_block()
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+
+        if self.file.closed:
+            return
+
+        self.flush()
+        self.file.close()
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def _write_block(self):
+
+        if self._pending_size == 0:
+            return
+
+        self.file.write(self._compress(b''.join(self._pending)))
+
+        self._pending = []
+        self._pending_size = 0
+        self._pending_start_time = None
+
+def _compress_gzip_block(data):
+    '''Return data as a complete gzip member.'''
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    return compressor.compress(data) + compressor.flush()
+
+def detect_compression(file_path):
+    '''Return 'gzip' or 'zstd' if file at path is compressed, otherwise 'none'.'''
+
+    with open(file_path, 'rb') as detect_file:
+        start = detect_file.read(len(_zstd_magic))
+
+    if start.startswith(_gzip_magic):
+        return 'gzip'
+    elif start.startswith(_zstd_magic):
+        return 'zstd'
+
+    return 'none'
+
+def read_compressed_file(file_path, compression=None):
+    '''
+    Return decompressed contents of file written by BlockCompressedFile (or any multi-member gzip / multi-frame zstd
+    file). If the last block is incomplete or corrupt (e.g. from a crash) then only the blocks before it are returned.
+    If compression isn't specified then it's detected.
+    '''
+    if compression is None:
+        compression = detect_compression(file_path)
+
+    with open(file_path, 'rb') as compressed_file:
+        data = compressed_file.read()
+
+    if compression == 'gzip':
+        return b''.join(_read_gzip_blocks(data))
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("Reading {} requires the zstandard package.".format(file_path))
+        return b''.join(_read_zstd_blocks(data))
+
+    return data
+
+def open_log_file(file_path):
+    '''Return file object for reading log as bytes. Compressed logs are detected and decompressed.'''
+
+    compression = detect_compression(file_path)
+
+    if compression == 'none':
+        return open(file_path, 'rb')
+
+    return io.BytesIO(read_compressed_file(file_path, compression))
+
+def _read_gzip_blocks(data):
+
+    blocks = []
+    remaining_data = data
+    while len(remaining_data) > 0:
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            block = decompressor.decompress(remaining_data)
+        except zlib.error:
+            break # corrupt block
+
+        if len(decompressor.unused_data) == 0:
+            # Either the last block or a partial one, so make sure the trailer matches what was decompressed.
+            if len(remaining_data) < _gzip_trailer_struct.size:
+                break
+            crc, size = _gzip_trailer_struct.unpack(remaining_data[-_gzip_trailer_struct.size:])
+            if crc != (zlib.crc32(block) & 0xffffffff) or size != (len(block) & 0xffffffff):
+                break
+
+        blocks.append(block)
+        remaining_data = decompressor.unused_data
+
+    return blocks
+
+def _read_zstd_blocks(data):
+
+    blocks = []
+    remaining_data = data
+    while len(remaining_data) > 0:
+
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        try:
+            block = decompressor.decompress(remaining_data)
+        except zstandard.ZstdError:
+            break # corrupt block
+
+        if not decompressor.eof:
+            break # partial block
+
+        blocks.append(block)
+        remaining_data = decompressor.unused_data
+
+    return blocks
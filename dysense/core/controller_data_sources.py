@@ -115,3 +115,33 @@ class HeightDataSource(AbstractDataSource):
             self.height_idx = self.get_matching_tag_idx('height')
         except ValueError:
             raise ValueError("Could not find valid height tag in sensor metadata")
+
+class DataSourceTable(object):
+    '''
+    Lookup table of which data sources a sensor is, so each new sample only needs a single dictionary lookup
+    instead of checking every source.  Needs to be rebuilt whenever the sources change.
+    '''
+    def __init__(self):
+
+        # Associate (sensor_id, controller_id) with a tuple of (role, source) in the order the sources were given.
+        self._key_to_roles = {}
+
+    def rebuild(self, role_to_sources):
+        '''
+        Rebuild table from list of (role, sources) where role is a name such as 'position' and sources is a list of
+        data sources (None entries are skipped).  The roles are returned by lookup() in the same order.
+        '''
+        key_to_roles = {}
+        for role, sources in role_to_sources:
+            for source in sources:
+                if source is None:
+                    continue
+                key = (source.sensor_id, source.controller_id)
+                key_to_roles[key] = key_to_roles.get(key, ()) + ((role, source),)
+
+        self._key_to_roles = key_to_roles
+
+    def lookup(self, sensor_id, controller_id):
+        '''Return tuple of (role, source) for every data source the sensor is. Empty if it's not a data source.'''
+
+        return self._key_to_roles.get((sensor_id, controller_id), ())
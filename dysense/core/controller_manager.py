@@ -35,20 +35,30 @@ class ControllerManager(object):
 
                                    # From Controllers
                                   'entire_controller_update': self.handle_entire_controller_update,
+                                  'controller_changes': self.handle_controller_changes,
                                   'controller_event': self.handle_controller_event,
                                   'entire_sensor_update': self.handle_entire_sensor_update,
                                   'sensor_changed': self.handle_sensor_changed,
+                                  'sensor_changes': self.handle_sensor_changes,
                                   'sensor_removed': self.handle_sensor_removed,
                                   'new_sensor_text': self.handle_new_sensor_text,
                                   'new_sensor_data': self.handle_new_sensor_data,
                                   'error_message': self.handle_error_message,
                                   'new_controller_text': self.handle_new_controller_text,
                                   'new_source_data': self.handle_new_source_data,
+                                  'connection_stats': self.handle_connection_stats,
                                   }
 
         self.controller_interface.register_callbacks(self.message_callbacks)
         self.presenter_interface.register_callbacks(self.message_callbacks)
 
+        # High-volume message types that are relayed from controllers to presenters without being decoded.
+        # The callbacks above are still used for controllers that don't send routing headers.
+        self.forwarded_message_types = ['new_sensor_data', 'new_source_data', 'new_sensor_text']
+
+        for message_type in self.forwarded_message_types:
+            self.controller_interface.register_forwarder(message_type, self.forward_to_presenter)
+
     def run(self):
 
         try:
@@ -141,6 +151,14 @@ class ControllerManager(object):
     def handle_entire_sensor_update(self, controller, sensor_info):
         self._send_message_to_presenter('entire_sensor_update', (controller.id, sensor_info))
 
+    def handle_controller_changes(self, controller, changes):
+        '''Propagate changed controller info to all presenters.'''
+        self._send_message_to_presenter('controller_changes', (controller.id, changes))
+
+    def handle_sensor_changes(self, controller, sensor_id, changes):
+        '''Propagate changed sensor info to all presenters.'''
+        self._send_message_to_presenter('sensor_changes', (controller.id, sensor_id, changes))
+
     def handle_sensor_changed(self, controller, sensor_id, info_name, value):
         '''Propagate change to all presenters.'''
         self._send_message_to_presenter('sensor_changed', (controller.id, sensor_id, info_name, value))
@@ -169,6 +187,16 @@ class ControllerManager(object):
 
         self._send_message_to_presenter('new_source_data', (controller.id, sensor_id, source_type, utc_time, sys_time, data))
 
+    def handle_connection_stats(self, controller, stats):
+
+        self._send_message_to_presenter('connection_stats', (controller.id, stats))
+
+    def forward_to_presenter(self, controller, message_type, route, raw_message):
+        '''Relay encoded message to presenters. The controller ID is added to the route so presenter receives it as the first argument.'''
+
+        for presenter_id in self.presenter_interface.connection_ids():
+            self.presenter_interface.forward_message(presenter_id, message_type, [controller.id] + route, raw_message)
+
     def _send_message_to_presenter(self, message_type, message_body):
 
         # TODO dont hardcode presenter ID
@@ -2,10 +2,13 @@
 # -*- coding: utf-8 -*-
 #from __future__ import unicode_literals
 
+import os
 import csv
 from _ctypes import ArgumentError
 
 from dysense.core.utility import make_utf8
+from dysense.core.time_index import TimeIndexWriter, time_index_path
+from dysense.core.compressed_file import open_output_file, is_compressed
 
 class CSVLog:
     '''
@@ -13,7 +16,7 @@ class CSVLog:
     If any element of the data contains a comma that element is enclosed in quotes.
     '''
 
-    def __init__(self, file_path, buffer_size):
+    def __init__(self, file_path, buffer_size, log_writer=None, index_interval=None, compression=None):
         '''
         Save properties for creating log file when first data is received.
 
@@ -22,49 +25,124 @@ class CSVLog:
         Buffer size is how many samples to buffer before writing (and flushing) to file.
         buffer_size =  0 or 1  flush every sample to file right when it's received.
         buffer_size =  n       buffer 'n' samples before flushing all of them to the file.
+
+        If log_writer (a LogWriter) is specified then samples are passed to its thread to be formatted and written
+        instead, so the caller never waits on the disk. In that case buffer_size is ignored and the writer decides
+        when to flush.
+
+        If index_interval is specified then a sparse time index (see TimeIndexWriter) is written next to the log with
+        one entry for every index_interval samples.
+
+        If compression ('gzip' or 'zstd') is specified then the file is written in compressed blocks (see
+        BlockCompressedFile) where each flush ends a block. Compressed logs can't have a time index since the
+        byte offsets in the file don't line up with rows.
         '''
+        if index_interval is not None and is_compressed(compression):
+            raise ValueError(u"Compressed logs can't have a time index.")
+
         self.file_path = file_path
         self.buffer_size = buffer_size
         self.buffer = []
         self.file = None
+        self.log_writer = log_writer
+        self.compression = compression
+
+        if index_interval is not None:
+            self.time_index = TimeIndexWriter(time_index_path(file_path), index_interval)
+        else:
+            self.time_index = None
 
     def write(self, data):
         '''Write data to file or buffer it depending on class settings. Data is a list.'''
 
-        if (data is None) or (len(data) == 0):
-            # Create blank one element tuple so it's obvious in log that no data was received.
-            raise Exception(u"Data can't be empty.")
+        data = self.prepare_row(data)
 
-        for i, val in enumerate(data):
-            if type(data[i]) == float:
-                # Convert all floats using built in representation function.  This avoids loss of precision
-                #  due to the way floats are printed in python.
-                val = repr(val)
-            # Make sure all data is encoded as utf8.
-            data[i] = make_utf8(val)
+        if self.log_writer is not None:
+            self.log_writer.submit(self, data)
+            return
 
         # Check if all we need to do is buffer data.
         if self.buffer_size > 1:
             if len(self.buffer) < (self.buffer_size - 1):
+                self._format(data)
                 self.buffer.append(data)
                 return
 
+        self.write_rows([data])
+
+        # Make sure data gets written in case of power failure.
+        self.file.flush()
+
+    def prepare_row(self, data):
+        '''Return data (list starting with utc_time) as a row that can be passed to write_rows().'''
+
+        if (data is None) or (len(data) == 0):
+            # Create blank one element tuple so it's obvious in log that no data was received.
+            raise Exception(u"Data can't be empty.")
+
+        return data
+
+    def row_utc_time(self, row):
+        '''Return utc_time of row returned by prepare_row(), before it's written.'''
+        return row[0]
+
+    def write_rows(self, rows):
+        '''Write list of samples (and anything buffered) to file without flushing. Called by LogWriter thread.'''
+
         # Make sure file is open so we can write to it.
         if self.file is None:
-            self.file = open(self.file_path, 'wb')
+            self.file = open_output_file(self.file_path, self.compression)
             self.writer = csv.writer(self.file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
 
         if len(self.buffer) > 0:
             # Write all the data we've been saving.
-            self.writer.writerows(self.buffer)
+            self._write_formatted_rows(self.buffer)
             self.buffer = []
 
-        # Write current sample data.
-        self.writer.writerow(data)
+        for row in rows:
+            self._format(row)
+
+        self._write_formatted_rows(rows)
+
+    def _write_formatted_rows(self, rows):
+        '''Write rows that have already been formatted and add any samples (not metadata) to time index.'''
+
+        if self.time_index is None:
+            self.writer.writerows(rows)
+            return
+
+        for row in rows:
+            row_offset = self.file.tell()
+            self.writer.writerow(row)
+            if row[0].startswith(b'#'):
+                continue # metadata
+            self.time_index.add_row(float(row[0]), row_offset, self.file.tell())
+
+    def flush(self, sync_to_disk=False):
+        '''Flush written data to the operating system, and optionally wait for it to be written to the disk itself.'''
+
+        if self.file is None:
+            return
 
-        # Make sure data gets written in case of power failure.
         self.file.flush()
 
+        if sync_to_disk:
+            os.fsync(self.file.fileno())
+
+        if self.time_index is not None:
+            # Only flushed (not synced) since readers still scan any rows the index doesn't cover.
+            self.time_index.flush()
+
+    def _format(self, data):
+
+        for i, val in enumerate(data):
+            if type(data[i]) == float:
+                # Convert all floats using built in representation function.  This avoids loss of precision
+                #  due to the way floats are printed in python.
+                val = repr(val)
+            # Make sure all data is encoded as utf8.
+            data[i] = make_utf8(val)
+
     def handle_metadata(self, metadata):
         '''Store metadata in buffer to be written out the first time handle_data is called.'''
         if len(metadata) == 0:
@@ -74,13 +152,27 @@ class CSVLog:
         self.buffer.append(metadata)
 
     def terminate(self):
-        '''Write any buffered data to file and then close file.'''
+        '''
+        Write any buffered data to file and then close file. If using a log writer then this just queues the file to
+        be closed once everything before it is written.
+        '''
+        if self.log_writer is not None:
+            self.log_writer.close_log(self)
+            return
+
+        self.close()
+
+    def close(self):
+        '''Write any buffered data to file, make sure it's on disk and then close file.'''
         if self.file is None:
             return # Never received any data.
 
         if len(self.buffer) > 1:
-            self.writer.writerows(self.buffer)
+            self._write_formatted_rows(self.buffer)
 
-        self.file.flush()
+        if self.time_index is not None:
+            self.time_index.close(self.file.tell())
+
+        self.flush(sync_to_disk=True)
         self.file.close()
         self.file = None
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+class LatestValueCoalescer(object):
+    '''
+    Limit how often values are emitted for each key (e.g. (controller_id, sensor_id)) by only keeping
+    the newest value that's been added since the last emit.  The first value after a quiet period is
+    emitted right away, so slow sensors aren't delayed, and any value added during the rate limit period
+    replaces the one before it.  The number of values that were replaced (and never emitted) is reported
+    along with each emitted value.
+    '''
+    def __init__(self, max_rate):
+        '''
+        Constructor.
+
+        :param float max_rate: maximum number of values to emit per second for each key. None or 0 for no limit.
+        '''
+        self.max_rate = max_rate
+
+        # Minimum time (in seconds) between emitted values for the same key.
+        self.min_period = 1.0 / max_rate if max_rate else 0
+
+        # Associate key with [newest value, number of values it replaced] that hasn't been emitted yet.
+        self._key_to_pending = {}
+
+        # Associate key with the system time that the next value is allowed to be emitted.
+        self._key_to_next_emit_time = {}
+
+        # Associate key with total number of values that have been coalesced (never emitted).
+        self.key_to_total_coalesced = {}
+
+    def add(self, key, value):
+        '''Store value as the newest one for key, replacing any value that hasn't been emitted yet.'''
+
+        try:
+            pending = self._key_to_pending[key]
+            pending[0] = value
+            pending[1] += 1
+            self.key_to_total_coalesced[key] = self.key_to_total_coalesced.get(key, 0) + 1
+        except KeyError:
+            self._key_to_pending[key] = [value, 0]
+
+    def pop_ready(self, current_time):
+        '''Return list of (key, value, num_coalesced) for every key that's allowed to emit its newest value at current_time.'''
+
+        ready = []
+        for key, (value, num_coalesced) in self._key_to_pending.items():
+
+            if current_time < self._key_to_next_emit_time.get(key, 0):
+                continue # still in rate limit period
+
+            del self._key_to_pending[key]
+            self._key_to_next_emit_time[key] = current_time + self.min_period
+            ready.append((key, value, num_coalesced))
+
+        return ready
+
+    def next_emit_time(self):
+        '''Return earliest system time that a waiting value can be emitted, or None if no values are waiting.'''
+
+        if len(self._key_to_pending) == 0:
+            return None
+
+        return min(self._key_to_next_emit_time.get(key, 0) for key in self._key_to_pending)
+
+    def discard(self, key_filter):
+        '''Forget everything about keys where key_filter(key) returns true (e.g. sensor was removed).'''
+
+        for key_dict in [self._key_to_pending, self._key_to_next_emit_time, self.key_to_total_coalesced]:
+            for key in key_dict.keys():
+                if key_filter(key):
+                    del key_dict[key]
@@ -28,8 +28,16 @@ from dysense.core.version import *
 
 from dysense.interfaces.server_interface import ServerInterface
 from dysense.interfaces.client_interface import ClientInterface
+from dysense.interfaces.message_codec import available_codec_names
 
-def dysense_main():
+def dysense_main(message_codecs=None):
+    '''
+    Run the program until the main window is closed.
+
+    :param list message_codecs: names of codecs (e.g. ['msgpack', 'json']) that controllers, managers and presenters
+                                offer for encoding messages, in order of preference. Codecs that aren't installed are
+                                ignored. If None then only JSON is used.
+    '''
 
     # This program uses relative paths for finding sensors, so make sure the working directory
     # is set to the directory containing this function.
@@ -74,6 +82,15 @@ def dysense_main():
     # Client for presenter to talk to managers.
     p2m_client = ClientInterface(zmq_context, 'gui_presenter', p2m_version)
 
+    # Sensor data is relayed through the manager to the presenter, so let the manager forward it without re-encoding.
+    for interface in [c2m_server, m2c_client, m2p_server, p2m_client]:
+        interface.use_routing_headers = True
+
+    if message_codecs is not None:
+        codecs = [codec_name for codec_name in message_codecs if codec_name in available_codec_names()]
+        for interface in [c2s_server, c2m_server, m2c_client, m2p_server, p2m_client]:
+            interface.codecs = codecs
+
     # Wire clients to servers so that when they are setup they will automatically connect.
     m2c_client.wire_locally_to(c2m_server)
     p2m_client.wire_locally_to(m2p_server)
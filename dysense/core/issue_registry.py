@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import collections
+
+class IssueRegistry(object):
+    '''
+    Active and resolved issues of a controller. Active issues are indexed by (id, sub_id, type) and counted by level
+    so finding an issue or checking if there are any issues of a certain level (e.g. 'critical') doesn't need to scan
+    every issue.  Issues that are set to expire are tracked separately so checking for expired issues only has to
+    look at those.
+
+    Issue levels and expiration should be changed through the registry, not directly on the issue, so it stays up to date.
+    '''
+    def __init__(self):
+
+        # Associate (id, sub_id, type) with active Issue. Ordered so issues are reported in the order they were created.
+        self._key_to_issue = collections.OrderedDict()
+
+        # Associate issue level with how many active issues have that level.
+        self._level_to_count = collections.Counter()
+
+        # Keys of active issues that have an expiration time.
+        self._expiring_keys = set()
+
+        # Issues that have expired, oldest first.
+        self.resolved_issues = []
+
+    def __len__(self):
+        '''Return number of active issues.'''
+        return len(self._key_to_issue)
+
+    @property
+    def active_issues(self):
+        '''Return list of active issues in the order they were created.'''
+        return self._key_to_issue.values()
+
+    def find(self, main_id, sub_id, issue_type):
+        '''Return active issue matching the specified fields, or None if there isn't one.'''
+
+        return self._key_to_issue.get((main_id, sub_id, issue_type), None)
+
+    def add(self, issue):
+        '''Add new active issue. Raise ValueError if there's already an active issue with the same ID, sub ID and type.'''
+
+        key = _issue_key(issue)
+        if key in self._key_to_issue:
+            raise ValueError("Issue {} is already active.".format(key))
+
+        self._key_to_issue[key] = issue
+        self._level_to_count[issue.level] += 1
+
+        if issue.expiration_time > 0:
+            self._expiring_keys.add(key)
+
+    def change_level(self, issue, new_level):
+        '''Update level of active issue. Return true if it changed.'''
+
+        if issue.level == new_level:
+            return False
+
+        self._level_to_count[issue.level] -= 1
+        self._level_to_count[new_level] += 1
+        issue.level = new_level
+
+        return True
+
+    def count(self, level):
+        '''Return number of active issues with the specified level.'''
+
+        return self._level_to_count[level]
+
+    def has_level(self, level):
+        '''Return true if there's at least one active issue with the specified level.'''
+
+        return self._level_to_count[level] > 0
+
+    def renew(self, issue):
+        '''Keep active issue from expiring.'''
+
+        issue.renew()
+        self._expiring_keys.discard(_issue_key(issue))
+
+    def expire(self, issue, force_expire=False):
+        '''Set active issue to expire. See Issue.expire().'''
+
+        issue.expire(force_expire)
+        self._expiring_keys.add(_issue_key(issue))
+
+    def expire_all_for(self, main_id, sub_id, force_expire=False):
+        '''Set every active issue with the specified ID and sub ID (e.g. for a sensor that was removed) to expire.'''
+
+        for key, issue in self._key_to_issue.iteritems():
+            if key[0] == main_id and key[1] == sub_id:
+                self.expire(issue, force_expire)
+
+    def resolve_expired(self):
+        '''Move any expired issues from active to resolved. Return list of issues that were resolved.'''
+
+        newly_resolved = []
+        for key in list(self._expiring_keys):
+
+            issue = self._key_to_issue[key]
+            if not issue.expired:
+                continue
+
+            self._expiring_keys.discard(key)
+            del self._key_to_issue[key]
+            self._level_to_count[issue.level] -= 1
+
+            newly_resolved.append(issue)
+
+        # Keep the order they were created in, the same as active issues.
+        newly_resolved.sort(key=lambda issue: issue.start_time)
+
+        self.resolved_issues.extend(newly_resolved)
+
+        return newly_resolved
+
+def _issue_key(issue):
+
+    return (issue.id, issue.sub_id, issue.issue_type)
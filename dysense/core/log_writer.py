@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+import Queue
+import threading
+import collections
+
+from dysense.core.utility import make_unicode
+from dysense.interfaces.loop_monitor import Histogram
+
+# Put in queue to tell thread to finish writing and exit.
+_STOP = object()
+
+class LogWriter(threading.Thread):
+    '''
+    Thread that writes data logs (e.g. CSVLog) so the controller never waits on the disk. Rows are passed through a
+    bounded queue and written in group commits: everything waiting in the queue is written together and then logs
+    are flushed once enough time has passed or enough rows have been written. Logs are synced to the disk
+    periodically and when they're closed, so a slow disk only shows up as a growing queue and write latency.
+    '''
+    def __init__(self, max_queue_size=20000, flush_interval=0.5, flush_size=2000, fsync_interval=5.0):
+        '''
+        Constructor.
+
+        :param int max_queue_size: how many rows can be waiting to be written.
+        :param float flush_interval: flush at least this often (in seconds) while there are rows that haven't been flushed.
+        :param int flush_size: flush once this many rows have been written since the last flush.
+        :param float fsync_interval: sync logs to disk at least this often (in seconds). If None then only sync on close.
+        '''
+        threading.Thread.__init__(self, name='log_writer')
+        self.daemon = True
+
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.fsync_interval = fsync_interval
+
+        self.max_queue_size = max_queue_size
+        self._queue = Queue.Queue(maxsize=max_queue_size)
+
+        # Protects stats below since they're updated by this thread and read by the controller.
+        self._stats_lock = threading.Lock()
+
+        # How long each group commit (writing, and flushing if needed) took in seconds.
+        self.write_latency = Histogram()
+
+        self.num_rows_written = 0
+        self.num_rows_dropped = 0
+
+        # Most rows that have been waiting in queue, and longest group commit, since check_health() was last called.
+        self._max_queue_depth_since_check = 0
+        self._max_latency_since_check = 0.0
+        self._num_dropped_at_check = 0
+
+        # Most recent error writing to a log (e.g. disk full), or None if there hasn't been one.
+        self.last_error = None
+
+        # Logs that have rows written since they were last flushed / synced to disk.
+        self._unflushed_logs = set()
+        self._unsynced_logs = set()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, log, row):
+        '''
+        Queue row to be written to log. Return false if the row had to be dropped because the queue is full.
+        Never waits for room in the queue since this is called from the controller's message loop.
+        '''
+        try:
+            self._queue.put_nowait((log, row))
+        except Queue.Full:
+            with self._stats_lock:
+                self.num_rows_dropped += 1
+            return False
+
+        return True
+
+    def close_log(self, log):
+        '''Close log after all the rows that were submitted before it are written.'''
+
+        # Block since a log must be closed even if the queue is full.
+        self._queue.put((log, None))
+
+    def stop(self):
+        '''Write everything that's queued, sync it to disk and then wait for thread to exit.'''
+
+        self._queue.put(_STOP)
+        self.join()
+
+    def public_stats(self):
+        '''Return dictionary of queue depth, write latency summary and row counts.'''
+
+        with self._stats_lock:
+            return {'queue_depth': self.queue_depth,
+                    'max_queue_size': self.max_queue_size,
+                    'rows_written': self.num_rows_written,
+                    'rows_dropped': self.num_rows_dropped,
+                    'write_latency': self.write_latency.summary(),
+                    'last_error': self.last_error,
+                    }
+
+    def check_health(self):
+        '''
+        Return (rows dropped, max queue depth, max write latency) since this was last called.
+        This is meant to be called periodically to decide if the disk is keeping up.
+        '''
+        with self._stats_lock:
+            max_queue_depth = max(self._max_queue_depth_since_check, self.queue_depth)
+            health = (self.num_rows_dropped - self._num_dropped_at_check, max_queue_depth, self._max_latency_since_check)
+            self._num_dropped_at_check = self.num_rows_dropped
+            self._max_queue_depth_since_check = 0
+            self._max_latency_since_check = 0.0
+
+        return health
+
+    def run(self):
+
+        last_flush_time = time.time()
+        last_fsync_time = last_flush_time
+        num_rows_since_flush = 0
+
+        while True:
+
+            # Don't need to wake up for a flush if everything has already been flushed.
+            if len(self._unflushed_logs) > 0:
+                timeout = max(0, last_flush_time + self.flush_interval - time.time())
+            else:
+                timeout = None
+
+            items = self._get_waiting_items(timeout)
+
+            commit_start_time = time.time()
+
+            num_rows_written, stop_requested = self._write_items(items)
+            num_rows_since_flush += num_rows_written
+
+            current_time = time.time()
+            if num_rows_since_flush >= self.flush_size or (current_time - last_flush_time) >= self.flush_interval or stop_requested:
+                sync_to_disk = self.fsync_interval is not None and (current_time - last_fsync_time) >= self.fsync_interval
+                self._flush_logs(sync_to_disk or stop_requested)
+                last_flush_time = current_time
+                num_rows_since_flush = 0
+                if sync_to_disk:
+                    last_fsync_time = current_time
+
+            if len(items) > 0:
+                commit_duration = time.time() - commit_start_time
+                with self._stats_lock:
+                    self.write_latency.add(commit_duration)
+                    self.num_rows_written += num_rows_written
+                    self._max_queue_depth_since_check = max(self._max_queue_depth_since_check, len(items))
+                    self._max_latency_since_check = max(self._max_latency_since_check, commit_duration)
+
+            if stop_requested:
+                break
+
+    def _get_waiting_items(self, timeout):
+        '''Wait up to timeout (None is forever) for first item and then return list of everything in queue.'''
+
+        items = []
+        try:
+            items.append(self._queue.get(True, timeout))
+            while True:
+                items.append(self._queue.get_nowait())
+        except Queue.Empty:
+            pass
+
+        return items
+
+    def _write_items(self, items):
+        '''Write rows in items, grouped by log, and close any logs. Return (number of rows written, true if stop was requested).'''
+
+        # Associate log with rows that need to be written to it, in the order the logs were first seen.
+        log_to_rows = collections.OrderedDict()
+        num_rows_written = 0
+        stop_requested = False
+
+        for item in items:
+
+            if item is _STOP:
+                stop_requested = True
+                continue
+
+            log, row = item
+
+            if row is not None:
+                log_to_rows.setdefault(log, []).append(row)
+                continue
+
+            # Request to close log so write what it has first.
+            num_rows_written += self._write_log_rows(log, log_to_rows.pop(log, []))
+            self._close_log(log)
+
+        for log, rows in log_to_rows.iteritems():
+            num_rows_written += self._write_log_rows(log, rows)
+
+        return num_rows_written, stop_requested
+
+    def _write_log_rows(self, log, rows):
+
+        if len(rows) == 0:
+            return 0
+
+        try:
+            log.write_rows(rows)
+        except Exception as e:
+            self._record_error(log, e, len(rows))
+            return 0
+
+        self._unflushed_logs.add(log)
+        self._unsynced_logs.add(log)
+
+        return len(rows)
+
+    def _flush_logs(self, sync_to_disk):
+
+        logs_to_flush = self._unsynced_logs if sync_to_disk else self._unflushed_logs
+
+        for log in logs_to_flush:
+            try:
+                log.flush(sync_to_disk)
+            except Exception as e:
+                self._record_error(log, e, 0)
+
+        self._unflushed_logs = set()
+        if sync_to_disk:
+            self._unsynced_logs = set()
+
+    def _close_log(self, log):
+
+        self._unflushed_logs.discard(log)
+        self._unsynced_logs.discard(log)
+
+        try:
+            log.close()
+        except Exception as e:
+            self._record_error(log, e, 0)
+
+    def _record_error(self, log, error, num_rows_lost):
+
+        with self._stats_lock:
+            self.last_error = "{}: {}".format(log.file_path, make_unicode(error))
+            self.num_rows_dropped += num_rows_lost
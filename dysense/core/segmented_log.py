@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import yaml
+
+from dysense.core.utility import yaml_load_unicode
+
+# Appended to a segmented log's base path to get the path of its manifest.
+SEGMENT_MANIFEST_SUFFIX = '_manifest.yaml'
+
+# Increment if the manifest layout changes in a way older readers can't handle.
+SEGMENT_MANIFEST_FORMAT_VERSION = 1
+
+def segment_manifest_path(base_path):
+    return base_path + SEGMENT_MANIFEST_SUFFIX
+
+def read_segment_manifest(manifest_path):
+    '''Return manifest dictionary written by SegmentedLog. Raise ValueError if the format isn't supported.'''
+
+    with open(manifest_path, 'r') as manifest_file:
+        manifest = yaml_load_unicode(manifest_file)
+
+    if manifest.get('format_version', 0) > SEGMENT_MANIFEST_FORMAT_VERSION:
+        raise ValueError("Segment manifest version {} isn't supported. Latest supported is {}.".format(manifest['format_version'], SEGMENT_MANIFEST_FORMAT_VERSION))
+
+    return manifest
+
+class SegmentedLog(object):
+    '''
+    Log that's split into a series of segment logs (e.g. CSVLog) so a bad write or full disk only damages the current
+    segment, and closed segments can be processed while the session is still running. A new segment is started once
+    the current one reaches the max size or covers the max duration of utc_time. Segments are named after the base
+    path with a 4 digit number, and a YAML manifest next to them lists each segment's file name, time range, row count
+    and whether it's closed. The manifest is rewritten whenever a segment is opened or closed and whenever logs are
+    synced to disk.
+
+    Has the same interface as CSVLog so it can be used for session data logs.
+    '''
+    def __init__(self, base_path, extension, create_segment, max_segment_size=None, max_segment_duration=None, log_writer=None):
+        '''
+        Constructor.
+
+        :param str base_path: path of segments without the segment number or extension.
+        :param str extension: file extension of each segment (e.g. '.csv')
+        :param create_segment: function that takes a segment file path and returns a new log (without a log writer).
+        :param int max_segment_size: start a new segment once current one is this many bytes. None is no limit.
+        :param float max_segment_duration: start a new segment once current one spans this many seconds. None is no limit.
+        :param log_writer: if specified then rows are written (and segments rotated) by this LogWriter thread.
+        '''
+        self.base_path = base_path
+        self.extension = extension
+        self.create_segment = create_segment
+        self.max_segment_size = max_segment_size
+        self.max_segment_duration = max_segment_duration
+        self.log_writer = log_writer
+
+        # Refer to manifest for errors reported by the log writer.
+        self.file_path = segment_manifest_path(base_path)
+
+        # Manifest entry of each segment that has been opened, in order.
+        self.segments = []
+
+        # Log of segment currently being written to, or None if it hasn't been opened yet.
+        self.segment = None
+
+        # Column names passed to each segment (see handle_metadata)
+        self.metadata = None
+
+        # Every segment is the same type of log so the first one is also used to check and prepare rows on the
+        # caller's thread, even after it's been closed.
+        self._first_segment = create_segment(self._segment_path(0))
+        self._row_preparer = self._first_segment
+
+        # Set once log is closed so the manifest shows the session finished normally.
+        self._complete = False
+
+    def handle_metadata(self, metadata):
+        '''Store metadata (list of column names, starting with utc_time) to write at the start of every segment.'''
+
+        self.metadata = list(metadata)
+
+    def write(self, data):
+        '''Write data (list starting with utc_time) to current segment or pass it to the log writer.'''
+
+        row = self._row_preparer.prepare_row(data)
+
+        if self.log_writer is not None:
+            self.log_writer.submit(self, row)
+            return
+
+        self.write_rows([row])
+        self.flush()
+
+    def write_rows(self, rows):
+        '''Write list of prepared rows, starting a new segment whenever the current one is full.'''
+
+        for row in rows:
+
+            if self.segment is None:
+                self._open_segment()
+
+            # Get time first since some logs format rows in place when they're written.
+            utc_time = self._row_preparer.row_utc_time(row)
+
+            # Write one row at a time so segments never go past the limits by more than a row.
+            self.segment.write_rows([row])
+
+            segment_info = self.segments[-1]
+            segment_info['num_rows'] += 1
+            if segment_info['start_utc'] is None:
+                segment_info['start_utc'] = utc_time
+                segment_info['end_utc'] = utc_time
+            else:
+                segment_info['start_utc'] = min(segment_info['start_utc'], utc_time)
+                segment_info['end_utc'] = max(segment_info['end_utc'], utc_time)
+
+            if self._segment_full(segment_info):
+                self._close_segment()
+
+    def flush(self, sync_to_disk=False):
+        '''Flush current segment, and if syncing to disk then also update manifest so it has current row counts.'''
+
+        if self.segment is None:
+            return
+
+        self.segment.flush(sync_to_disk)
+
+        if sync_to_disk:
+            self._write_manifest()
+
+    def terminate(self):
+        '''Close log, or if using a log writer then queue it to be closed once everything before it is written.'''
+
+        if self.log_writer is not None:
+            self.log_writer.close_log(self)
+            return
+
+        self.close()
+
+    def close(self):
+        '''Close current segment and mark manifest as complete.'''
+
+        self._complete = True
+
+        if self.segment is not None:
+            self._close_segment()
+        elif len(self.segments) > 0:
+            self._write_manifest()
+
+    def _segment_path(self, segment_number):
+        return '{}_{:04d}{}'.format(self.base_path, segment_number, self.extension)
+
+    def _segment_full(self, segment_info):
+
+        if self.max_segment_size and self.segment.file.tell() >= self.max_segment_size:
+            return True
+
+        if self.max_segment_duration and (segment_info['end_utc'] - segment_info['start_utc']) >= self.max_segment_duration:
+            return True
+
+        return False
+
+    def _open_segment(self):
+
+        segment_number = len(self.segments)
+
+        if segment_number == 0:
+            self.segment = self._first_segment
+        else:
+            self.segment = self.create_segment(self._segment_path(segment_number))
+
+        if self.metadata is not None:
+            # Copy since logs can modify metadata.
+            self.segment.handle_metadata(list(self.metadata))
+
+        self.segments.append({'file_name': os.path.basename(self._segment_path(segment_number)),
+                              'start_utc': None,
+                              'end_utc': None,
+                              'num_rows': 0,
+                              'closed': False})
+
+        self._write_manifest()
+
+    def _close_segment(self):
+
+        self.segment.close()
+        self.segment = None
+
+        self.segments[-1]['closed'] = True
+
+        self._write_manifest()
+
+    def _write_manifest(self):
+        '''Replace manifest with a new one so readers never see a partially written manifest.'''
+
+        manifest = {'format_version': SEGMENT_MANIFEST_FORMAT_VERSION,
+                    'complete': self._complete,
+                    'segments': self.segments}
+
+        manifest_path = segment_manifest_path(self.base_path)
+        temp_manifest_path = manifest_path + '.tmp'
+
+        with open(temp_manifest_path, 'w') as manifest_file:
+            manifest_file.write(yaml.safe_dump(manifest, allow_unicode=True, default_flow_style=False))
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+        try:
+            os.rename(temp_manifest_path, manifest_path)
+        except OSError:
+            # Windows can't rename over an existing file.
+            os.remove(manifest_path)
+            os.rename(temp_manifest_path, manifest_path)
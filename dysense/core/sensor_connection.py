@@ -4,8 +4,10 @@ from __future__ import unicode_literals
 import time
 
 from dysense.core.sensor_creation import SensorCloseTimeout
+from dysense.core.text_message_ring import TextMessageRing
 from dysense.core.utility import validate_setting, validate_type, pretty, make_unicode
 from dysense.interfaces.component_connection import ComponentConnection
+from dysense.interfaces.data_ring_buffer import make_record_layout
 
 class SensorConnection(ComponentConnection):
 
@@ -28,7 +30,8 @@ class SensorConnection(ComponentConnection):
 
         self.overall_health = 'neutral'
 
-        self.text_messages = []
+        # Newest messages from driver. Rate limited so a driver that keeps reporting errors can't flood managers.
+        self.text_messages = TextMessageRing(max_rate=5, burst_size=20)
 
         # Sensor offsets relative to vehicle position.
         self._position_offsets = position_offsets # Forward right down - meters
@@ -44,6 +47,10 @@ class SensorConnection(ComponentConnection):
         # Either thread or process object that sensor driver runs in.
         self.sensor_driver = None
 
+        # Fixed record format for sensor data. None if the data isn't all numeric so it can't use a data ring buffer.
+        # Even then the buffer is only used if the sensor's 'use_data_ring_buffer' setting turns it on.
+        self.data_layout = make_record_layout(metadata.get('data', []))
+
         # Notified when one of the public sensor fields change.
         self.controller = controller
 
@@ -63,7 +70,7 @@ class SensorConnection(ComponentConnection):
                 'sensor_health': self.sensor_health,
                 'sensor_paused': self.sensor_paused,
                 'overall_health': self.overall_health,
-                'text_messages': self.text_messages,
+                'text_messages': self.text_messages.snapshot(),
                 'position_offsets': self.position_offsets,
                 'orientation_offsets': self.orientation_offsets,
                 'instrument_type': self.instrument_type,
@@ -108,6 +115,26 @@ class SensorConnection(ComponentConnection):
         self._sensor_paused = new_value
         self.notify_controller('sensor_paused', self._sensor_paused)
 
+    @property
+    def settings(self):
+        return self._settings
+
+    @property
+    def log_compression(self):
+        '''Return how data log should be compressed. Sensors without a 'compression' setting are never compressed.'''
+        return self._settings.get('compression', 'none')
+
+    @property
+    def data_ring_buffer_layout(self):
+        '''
+        Return layout for driver to send data through a ring buffer instead of over ZMQ, or None if it shouldn't.
+        Sensors without a 'use_data_ring_buffer' setting never use one.
+        '''
+        if self._settings.get('use_data_ring_buffer', False) != True:
+            return None
+
+        return self.data_layout
+
     @property
     def position_offsets(self):
         return self._position_offsets
@@ -180,6 +207,8 @@ class SensorConnection(ComponentConnection):
         if self._connection_state == 'opened':
             # Update any session-dependent settings that were lost when sensor was closed.
             self.update_data_file_directory(self._desired_data_file_path)
+            # Time is only sent to sensors when it changes so make sure this one doesn't have to wait for it.
+            self.controller.send_time_estimate([self])
 
         # Show user (and log) changes in connection state.  Don't show opened since printing two
         # messages is obnoxious.  If it's not opened then it will throw an error or timeout.
@@ -218,7 +247,7 @@ class SensorConnection(ComponentConnection):
         self.sensor_state ='closed'
         self.sensor_health = 'neutral'
         self.sensor_paused = True
-        self.text_messages = []
+        self.text_messages.clear()
 
     def setup(self):
 
@@ -228,7 +257,8 @@ class SensorConnection(ComponentConnection):
         self.reset()
 
         try:
-            self.sensor_driver = self.driver_factory.create_sensor(self.sensor_type, self.sensor_id, self.instrument_id, self._settings)
+            self.sensor_driver = self.driver_factory.create_sensor(self.sensor_type, self.sensor_id, self.instrument_id,
+                                                                   self._settings, self.data_ring_buffer_layout)
         except Exception as e:
             self.controller.handle_new_sensor_text(self, "{}".format(repr(e)))
 
@@ -245,6 +275,8 @@ class SensorConnection(ComponentConnection):
         try:
             if self.sensor_driver:
                 self.sensor_driver.close(timeout=3) # TODO allow sensor driver to specify timeout
+                # Make sure last samples are handled before buffer goes away with the driver.
+                self.controller.read_data_ring_buffer(self)
                 self.sensor_driver = None
             else:
                 # There's no driver to close down.  Most likely this is the user hitting close after there's been an error
@@ -257,6 +289,14 @@ class SensorConnection(ComponentConnection):
 
         ComponentConnection.close(self)
 
+    @property
+    def data_ring_buffer(self):
+        '''Return buffer that driver sends data through, or None if it's sent over ZMQ.'''
+        try:
+            return self.sensor_driver.data_ring_buffer
+        except AttributeError:
+            return None # no driver
+
     def is_closed(self):
         '''Return true if sensor driver is closed.'''
         return self.sensor_driver is None
@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 import os
+import math
 import time
 import zmq
 import json
@@ -18,14 +19,22 @@ from dysense.core.sensor_creation import SensorDriverFactory, SensorCloseTimeout
 from dysense.core.csv_log import CSVLog
 from dysense.core.controller_data_sources import *
 from dysense.core.issue import Issue
+from dysense.core.issue_registry import IssueRegistry
+from dysense.core.change_tracker import ChangeTracker
+from dysense.core.clock_offset_estimator import ClockOffsetEstimator
 from dysense.core.utility import format_id, format_setting, utf_8_encoder
 from dysense.core.utility import make_unicode, make_utf8, validate_type, make_filename_unique
 from dysense.core.version import app_version, output_version
-from dysense.core.session import Session
+from dysense.core.session import Session, DATA_LOG_FORMATS
+from dysense.core.compressed_file import compression_available, COMPRESSION_TYPES
+from dysense.core.subscriptions import SubscriptionTable
+from dysense.core.text_message_ring import TextMessageRing
+from dysense.interfaces.deadline_scheduler import DeadlineScheduler
+from dysense.interfaces.loop_monitor import LoopMonitor
 
 class SensorController(object):
 
-    def __init__(self, context, metadata, controller_id, sensor_interface, manager_interface):
+    def __init__(self, context, metadata, controller_id, sensor_interface, manager_interface, max_loop_lag=0.5):
 
         self.setup_logging()
 
@@ -36,7 +45,11 @@ class SensorController(object):
         self.sensors = []
         self.managers = {}
 
-        self.text_messages = []
+        # Which sensor data streams each manager wants to receive.
+        self.subscriptions = SubscriptionTable()
+
+        # Newest messages logged by controller. Not rate limited since they're all generated by this program.
+        self.text_messages = TextMessageRing()
 
         self._time_source = None
         self._position_sources = []
@@ -44,6 +57,13 @@ class SensorController(object):
         self._height_sources = []
         self._fixed_height_source = None
 
+        # Controller and sensor changes that haven't been sent to managers yet.
+        self.state_changes = ChangeTracker()
+
+        # Which data sources each sensor is. Rebuilt the next time data is received after the sources change.
+        self.data_source_table = DataSourceTable()
+        self._data_source_table_stale = True
+
         self.controller_id = format_id(controller_id)
 
         self.sensor_interface = sensor_interface
@@ -51,23 +71,29 @@ class SensorController(object):
 
         self.session = Session(self)
 
-        self.active_issues = []
-        self.resolved_issues = []
+        # Active and resolved issues.
+        self.issues = IssueRegistry()
 
         self.core_settings = {'base_out_directory': '',
                               'operator_name': '',
                               'platform_type': '',
                               'platform_tag': '',
-                              'surveyed': True}
+                              'surveyed': True,
+                              'data_log_format': 'csv',
+                              'max_log_segment_size': 0.0,
+                              'max_log_segment_duration': 0.0}
 
         # Additional settings that can be specified by user.
         self.extra_settings = {}
 
         # Allow settings to optionally define a type (e.g. bool) that will be enforced.
-        self.setting_name_to_type = {'surveyed': 'bool'}
+        self.setting_name_to_type = {'surveyed': 'bool', 'max_log_segment_size': 'float', 'max_log_segment_duration': 'float'}
 
         self.stop_request = threading.Event()
 
+        # Runs periodic tasks and connection heartbeats/time outs from the message loop.
+        self.scheduler = DeadlineScheduler()
+
         # The last manager that a message was received from.
         self.last_manager = None
 
@@ -75,8 +101,20 @@ class SensorController(object):
         self.last_utc_time = 0.0
         self.last_sys_time_update = 0.0
 
-        # Used for timing test dealing with message passing.
-        self.time_test_durations = []
+        # Filtered estimate of UTC time from time source samples. Sensors are only sent the estimate when it changes.
+        self.clock_estimator = ClockOffsetEstimator()
+
+        # Iteration time, lag and message latency of the message loop. A warning issue is created if it lags by more than max_loop_lag seconds.
+        self.loop_monitor = LoopMonitor(max_lag=max_loop_lag)
+
+        # Warn if writing session data logs takes longer than this many seconds.
+        self.max_log_write_latency = 1.0
+
+        # How many 'time_test' events have been received since their latency was last reported.
+        self.num_time_test_events = 0
+
+        # Associate (interface, connection ID) with how many messages had been dropped last time it was checked.
+        self.last_num_messages_dropped = {}
 
         # Used for creating new sensor drivers. Can't instantiate it until we know what endpoints we're bound to.
         self.sensor_driver_factory = None
@@ -97,9 +135,13 @@ class SensorController(object):
                                   'change_controller_setting': self.handle_change_controller_setting,
                                   'new_data_source_data': self.handle_data_source_data,
                                   'controller_command': self.handle_controller_command,
+                                  'subscribe': self.handle_subscribe,
+                                  'unsubscribe': self.handle_unsubscribe,
 
                                    # From Sensors
                                   'new_sensor_data': self.handle_new_sensor_data,
+                                  'new_sensor_data_batch': self.handle_new_sensor_data_batch,
+                                  'new_sensor_data_ready': self.handle_new_sensor_data_ready,
                                   'new_sensor_text': self.handle_new_sensor_text,
                                   'new_sensor_status': self.handle_new_sensor_status,
                                   'new_sensor_heartbeat': self.handle_new_sensor_heartbeat,
@@ -128,9 +170,9 @@ class SensorController(object):
                 'settings': self.core_settings,
                 'extra_settings': self.extra_settings,
                 'setting_types': self.setting_name_to_type,
-                'text_messages': self.text_messages,
-                'active_issues': [source.public_info for source in self.active_issues],
-                'resolved_issues': [source.public_info for source in self.resolved_issues],
+                'text_messages': self.text_messages.snapshot(),
+                'active_issues': [issue.public_info for issue in self.issues.active_issues],
+                'resolved_issues': [issue.public_info for issue in self.issues.resolved_issues],
                 }
 
     @property
@@ -147,8 +189,10 @@ class SensorController(object):
         if new_value is None:
             self._time_source = None
         else:
-            self._time_source = TimeDataSource(self.send_entire_controller_info, **new_value)
-        self.send_entire_controller_info()
+            self._time_source = TimeDataSource(self.notify_controller_changed, **new_value)
+        self.clock_estimator.reset()
+        self._data_source_table_stale = True
+        self.notify_controller_changed()
 
     @property
     def position_sources(self):
@@ -157,8 +201,9 @@ class SensorController(object):
     def position_sources(self, new_value):
         self._position_sources = []
         for val in new_value:
-            self._position_sources.append(PositionDataSource(self.send_entire_controller_info, **val))
-        self.send_entire_controller_info()
+            self._position_sources.append(PositionDataSource(self.notify_controller_changed, **val))
+        self._data_source_table_stale = True
+        self.notify_controller_changed()
 
     @property
     def orientation_sources(self):
@@ -168,8 +213,9 @@ class SensorController(object):
         self._orientation_sources = []
         angle_types = ['roll', 'pitch', 'yaw']
         for n, val in enumerate(new_value):
-            self._orientation_sources.append(OrientationDataSource(self.send_entire_controller_info, angle_types[n], **val))
-        self.send_entire_controller_info()
+            self._orientation_sources.append(OrientationDataSource(self.notify_controller_changed, angle_types[n], **val))
+        self._data_source_table_stale = True
+        self.notify_controller_changed()
 
     @property
     def height_sources(self):
@@ -178,8 +224,9 @@ class SensorController(object):
     def height_sources(self, new_value):
         self._height_sources = []
         for val in new_value:
-            self._height_sources.append(HeightDataSource(self.send_entire_controller_info, **val))
-        self.send_entire_controller_info()
+            self._height_sources.append(HeightDataSource(self.notify_controller_changed, **val))
+        self._data_source_table_stale = True
+        self.notify_controller_changed()
 
     @property
     def all_sources(self):
@@ -199,7 +246,7 @@ class SensorController(object):
             except ValueError:
                 self.log_message("{} is not a valid height measurement.".format(new_value), logging.ERROR, self.last_manager)
 
-        self.send_entire_controller_info()
+        self.notify_controller_changed()
 
     def setup_logging(self):
 
@@ -233,7 +280,7 @@ class SensorController(object):
             manager.send_message('error_message', (msg, level))
 
         if level >= logging.INFO:
-            self.text_messages.append(msg)
+            self.text_messages.add(msg)
             self.manager_interface.send_message_to_all('new_controller_text', msg)
 
     def run(self):
@@ -274,6 +321,10 @@ class SensorController(object):
         self.sensor_interface.setup()
         self.manager_interface.setup()
 
+        # Only refresh connections when they could need a heartbeat or time out, rather than every loop.
+        self.sensor_interface.use_scheduler(self.scheduler)
+        self.manager_interface.use_scheduler(self.scheduler)
+
         # Need to do this after remote endpoint is determined.
         self.sensor_driver_factory = SensorDriverFactory(self.context,
                                                          self.sensor_interface.local_endpoint,
@@ -281,45 +332,60 @@ class SensorController(object):
 
     def run_message_loop(self):
 
-        # How often to run slower rate 'update' loop.
-        # Note: Don't change this without considering effect on slower inside loop.
-        update_loop_interval = 0.1
-        next_update_loop_time = time.time()
+        # Periodic tasks. Connection heartbeats and time outs are scheduled by the interfaces themselves.
+        self.scheduler.call_every(0.25, self.run_housekeeping)
+        # Run this at a slower rate since it involves a lot of checks and isn't very efficient.
+        self.scheduler.call_every(0.5, self.update_issues)
 
-        # How many times loop has ran.
-        loop_counter = 0
+        while not self.stop_request.is_set():
 
-        # Timeout when waiting for new messages.
-        # Multiply by 1000 to convert to milliseconds.
-        message_timeout = update_loop_interval * 1000
+            # Sleep until messages arrive or the next scheduled task is due.
+            poll_result = self.wait_for_messages(timeout=self.scheduler.time_until_next(max_wait=0.25))
 
-        while True:
+            iteration_start_time = time.time()
 
-            self.process_new_messages(message_timeout)
+            # How late the most overdue scheduled task (e.g. heartbeat or time out check) is running.
+            loop_lag = self.scheduler.time_overdue(iteration_start_time)
 
-            current_time = time.time()
-            if current_time >= next_update_loop_time:
+            num_messages = self.process_new_messages(poll_result)
+
+            self.scheduler.run_expired()
+
+            # Everything that changed in this iteration is sent together.
+            self.send_state_changes()
+
+            iteration_end_time = time.time()
+            self.loop_monitor.record_iteration(iteration_end_time - iteration_start_time, loop_lag, num_messages, iteration_end_time)
 
-                if self.stop_request.is_set():
-                    break  # from main loop
+    def run_housekeeping(self):
+        '''Called periodically by scheduler to update anything that isn't driven by messages.'''
 
-                # See if any issues have been resolved.
-                for issue in self.active_issues[:]:
-                    if issue.expired:
-                        self.active_issues.remove(issue)
-                        self.resolved_issues.append(issue)
-                        self.send_controller_issue_event('issue_resolved', issue)
-                        self.send_entire_controller_info()
+        # See if any issues have been resolved.
+        resolved_issues = self.issues.resolve_expired()
+        for issue in resolved_issues:
+            self.send_controller_issue_event('issue_resolved', issue)
+        if len(resolved_issues) > 0:
+            self.notify_controller_changed()
 
-                if loop_counter % 5 == 0:
-                    # Run this at a slower rate since it involves a lot of checks and isn't very efficient.
-                    self.update_source_issues()
+        # Drivers running in this process notify when they write data, but check in case a notification was missed.
+        for sensor in self.sensors:
+            self.read_data_ring_buffer(sensor)
+
+        # Let managers know about messages that were rate limited even if the driver stopped sending new ones.
+        for sensor in self.sensors:
+            summary = sensor.text_messages.flush_suppressed()
+            if summary is not None:
+                self.manager_interface.send_message_to_all('new_sensor_text', (sensor.sensor_id, summary))
 
-                self.session.update_state()
+        self.session.update_state()
 
-                next_update_loop_time = current_time + update_loop_interval
+    def update_issues(self):
+        '''Called periodically by scheduler to create/resolve issues that are found by checking every sensor.'''
 
-                loop_counter += 1
+        self.update_source_issues()
+        self.update_send_queue_issues()
+        self.update_loop_lag_issue()
+        self.update_log_writer_issues()
 
     def close_down(self):
 
@@ -331,6 +397,8 @@ class SensorController(object):
         for sensor in self.sensors:
             self.close_down_sensor(sensor)
 
+        self.send_state_changes()
+
         self.manager_interface.close()
         self.sensor_interface.close()
 
@@ -341,16 +409,50 @@ class SensorController(object):
         except SensorCloseTimeout:
             pass  # TODO notify managers that sensor failed to close down.
 
-    def process_new_messages(self, timeout):
+    def wait_for_messages(self, timeout):
+        '''Wait up to timeout (in seconds) for messages on either interface. Return poll result.'''
+
+        # Round up to whole milliseconds, otherwise a deadline less than 1 ms away would be busy-waited on.
+        return dict(self.poller.poll(int(math.ceil(timeout * 1000))))
+
+    def process_new_messages(self, poll_result):
+        '''
+        Only process the interfaces that have messages waiting in poll_result. Return number of messages received.
+        Connection states are refreshed by the scheduler so this doesn't scan every connection.
+        '''
+        num_messages = 0
+
+        if self.sensor_interface.is_readable(poll_result):
+            num_messages += self.sensor_interface.process_new_messages(refresh_connections=False)
+
+        if self.manager_interface.is_readable(poll_result):
+            num_messages += self.manager_interface.process_new_messages(refresh_connections=False)
+
+        return num_messages
+
+    def send_entire_controller_info(self, manager=None):
+        '''Send all controller info to manager, or every manager if it's None.'''
+
+        if manager is None:
+            self.manager_interface.send_message_to_all('entire_controller_update', self.public_info)
+        else:
+            manager.send_message('entire_controller_update', self.public_info)
+
+    def notify_controller_changed(self):
+        '''Controller info changed so send the changes to managers at the end of this loop iteration.'''
 
-        msgs = dict(self.poller.poll(timeout))
+        self.state_changes.mark_controller_changed()
 
-        self.sensor_interface.process_new_messages()
-        self.manager_interface.process_new_messages()
+    def send_state_changes(self):
+        '''Send one message for the controller and each sensor with everything that's changed since this was last called.'''
 
-    def send_entire_controller_info(self):
+        if self.state_changes.controller_changed:
+            controller_changes = self.state_changes.pop_controller_changes(self.public_info)
+            if controller_changes is not None:
+                self.manager_interface.send_message_to_all('controller_changes', controller_changes)
 
-        self.manager_interface.send_message_to_all('entire_controller_update', self.public_info)
+        for sensor_id, sensor_changes in self.state_changes.pop_sensor_changes():
+            self.manager_interface.send_message_to_all('sensor_changes', (sensor_id, sensor_changes))
 
     def send_controller_issue_event(self, event_type, issue):
 
@@ -372,9 +474,24 @@ class SensorController(object):
 
         self.manager_interface.send_message_to_all('entire_sensor_update', sensor.public_info)
 
+    def send_to_subscribers(self, sensor_id, message_type, message_body):
+        '''Send message to every manager subscribed to the message type for the specified sensor.'''
+
+        recipient_ids = self.subscriptions.recipients(self.manager_interface.connection_ids(), sensor_id, message_type, time.time())
+
+        for manager_id in recipient_ids:
+            self.manager_interface.send_message(manager_id, message_type, message_body)
+
     def handle_request_connect(self, manager, unused):
 
-        self.send_entire_controller_info()
+        # Manager is (re)connecting so it needs to subscribe again.
+        self.subscriptions.remove_subscriber(manager.id)
+
+        # Bring other managers up to date so the changes sent to them afterwards start from the same info as this manager.
+        self.notify_controller_changed()
+        self.send_state_changes()
+
+        self.send_entire_controller_info(manager)
 
         for sensor in self.sensors:
             manager.send_message('entire_sensor_update', sensor.public_info)
@@ -456,6 +573,7 @@ class SensorController(object):
         for sensor in sensors[:]:
             self.close_down_sensor(sensor)
             self.sensors.remove(sensor)
+            self.state_changes.forget_sensor(sensor.sensor_id)
             self.manager_interface.send_message_to_all('sensor_removed', sensor.sensor_id)
 
             self.log_message("Removed sensor {} ({})".format(sensor.sensor_id, sensor.sensor_type), logging.DEBUG)
@@ -472,11 +590,10 @@ class SensorController(object):
             for source in self.height_sources[:]:
                 if source.matches(sensor.sensor_id, sensor.controller_id):
                     self.height_sources.remove(source)
+            self._data_source_table_stale = True
 
             # Remove any active issues that match up with the removed sensors.
-            for issue in self.active_issues:
-                if issue.id == self.controller_id and issue.sub_id == sensor.sensor_id:
-                    issue.expire(force_expire=True)
+            self.issues.expire_all_for(self.controller_id, sensor.sensor_id, force_expire=True)
 
     def handle_request_sensor(self, manager, sensor_id):
 
@@ -591,7 +708,7 @@ class SensorController(object):
         # Make sure data source is allowed to be changed.
         if self.session.active:
             self.log_message('Cannot change info while session is active.', logging.ERROR, manager)
-            self.send_entire_controller_info() # so user can be notified didn't change.
+            self.send_entire_controller_info(manager) # so user can be notified didn't change.
             return
 
         try:
@@ -632,7 +749,7 @@ class SensorController(object):
             value_can_change = False
 
         if not value_can_change:
-            self.send_entire_controller_info() # so user can be notified setting didn't change.
+            self.send_entire_controller_info(manager) # so user can be notified setting didn't change.
             return
 
         try:
@@ -651,7 +768,7 @@ class SensorController(object):
                 setting_value = validate_type(setting_value, setting_type)
             except ValueError:
                 self.log_message("{} cannot be converted into the expected type '{}'".format(setting_value, setting_type), logging.ERROR, manager)
-                self.send_entire_controller_info() # so user can be notified setting didn't change.
+                self.send_entire_controller_info(manager) # so user can be notified setting didn't change.
                 return # don't set value
 
         except KeyError:
@@ -659,7 +776,7 @@ class SensorController(object):
 
         if setting_name not in self.all_settings:
 
-            self.send_entire_controller_info() # so user can be notified setting didn't take effect.
+            self.send_entire_controller_info(manager) # so user can be notified setting didn't take effect.
             return # don't add new setting
 
         if setting_name in self.core_settings:
@@ -670,7 +787,7 @@ class SensorController(object):
             self.log_message("Controller setting {} does not exist.".format(setting_name), logging.ERROR, manager)
 
         # Notify controller that setting value changed, or that it didn't, either way.
-        self.send_entire_controller_info()
+        self.notify_controller_changed()
 
     def handle_setup_sensor(self, manager, sensor_id, message_body):
 
@@ -689,38 +806,49 @@ class SensorController(object):
             except ValueError:
                 self.log_message('Cannot setup sensor {} since it does not exist'.format(sensor_id), logging.ERROR, manager)
 
+    def handle_subscribe(self, manager, sensor_id, message_type, max_rate):
+
+        self.subscriptions.subscribe(manager.id, sensor_id, message_type, max_rate)
+
+        self.log_message("Manager {} subscribed to {} from {}.".format(manager.id, message_type, sensor_id), logging.DEBUG)
+
+    def handle_unsubscribe(self, manager, sensor_id, message_type):
+
+        self.subscriptions.unsubscribe(manager.id, sensor_id, message_type)
+
     def handle_new_sensor_data(self, sensor, utc_time, sys_time, data, data_ok):
 
-        # TODO manage manager subscriptions
+        # Single samples are sent as soon as they're read so sys_time is also when the message was sent. Sensors run on
+        # this computer so their system time can be compared directly.
+        current_time = time.time()
+        self.loop_monitor.record_message_latency(current_time - sys_time, current_time)
+
+        self.process_sensor_data(sensor, utc_time, sys_time, data, data_ok)
+
+    def process_sensor_data(self, sensor, utc_time, sys_time, data, data_ok):
+        '''Forward, use and log a single data sample from sensor, however it was received.'''
+
         # TODO only send to other controllers if not paused
-        self.manager_interface.send_message_to_all('new_sensor_data', (sensor.sensor_id, utc_time, sys_time, data, data_ok))
+        self.send_to_subscribers(sensor.sensor_id, 'new_sensor_data', (sensor.sensor_id, utc_time, sys_time, data, data_ok))
 
         if not data_ok:
             # Assume data cant be used (ie time information, etc)
             return
 
-        # Now that we know data is ok determine if the sensor is any of our data sources.
-        # TODO - make this more efficient.
-        is_time_source = self.time_source and self.time_source.matches(sensor.sensor_id, self.controller_id)
-        matching_position_sources = [source for source in self.position_sources if source.matches(sensor.sensor_id, self.controller_id)]
-        matching_orientation_sources = [source for source in self.orientation_sources if source.matches(sensor.sensor_id, self.controller_id)]
-        matching_height_sources = [source for source in self.height_sources if source.matches(sensor.sensor_id, self.controller_id)]
-
-        if is_time_source:
-            self.time_source.mark_updated()
-            self.process_time_source_data(utc_time, sys_time)
-
-        for source in matching_position_sources:
-            source.mark_updated()
-            self.process_position_source_data(source, utc_time, sys_time, data)
-
-        for source in matching_orientation_sources:
-            source.mark_updated()
-            self.process_orientation_source_data(source, utc_time, sys_time, data)
+        if self._data_source_table_stale:
+            self.rebuild_data_source_table()
 
-        for source in matching_height_sources:
+        # Now that we know data is ok determine if the sensor is any of our data sources.
+        for role, source in self.data_source_table.lookup(sensor.sensor_id, self.controller_id):
             source.mark_updated()
-            self.process_height_source_data(source, utc_time, sys_time, data)
+            if role == 'time':
+                self.process_time_source_data(utc_time, sys_time)
+            elif role == 'position':
+                self.process_position_source_data(source, utc_time, sys_time, data)
+            elif role == 'orientation':
+                self.process_orientation_source_data(source, utc_time, sys_time, data)
+            elif role == 'height':
+                self.process_height_source_data(source, utc_time, sys_time, data)
 
         # Check if we should log data. This assumes that data is ok.
         need_to_log_data = (not sensor.sensor_paused) and self.session.state == 'started'
@@ -728,7 +856,53 @@ class SensorController(object):
         if need_to_log_data:
             # Write data to corresponding sensor log.
             data.insert(0, utc_time)
-            sensor.output_file.write(data)
+            try:
+                sensor.output_file.write(data)
+            except ValueError:
+                # Binary logs can only store data that matches the sensor metadata. Use the same reason for every sample so
+                # the issue isn't changed (and sent out again) each time, and don't suspend the session since that would
+                # stop logging and the issue could never be resolved.
+                self.try_create_issue(self.controller_id, sensor.sensor_id, 'invalid_log_data',
+                                      "Can't log data that doesn't match sensor metadata.", 'error', escalate_data_sources=False)
+            else:
+                self.try_resolve_issue(sensor.sensor_id, 'invalid_log_data')
+
+    def rebuild_data_source_table(self):
+        '''Update lookup table of which data sources each sensor is. Needs to be called after sources change.'''
+
+        self.data_source_table.rebuild([('time', [self.time_source]),
+                                        ('position', self.position_sources),
+                                        ('orientation', self.orientation_sources),
+                                        ('height', self.height_sources)])
+
+        self._data_source_table_stale = False
+
+    def handle_new_sensor_data_batch(self, sensor, data_batch, send_sys_time=None):
+        '''
+        Unpack batch of samples so each one is handled (and logged) just like a single data message. Samples wait in
+        the batch before it's sent, so latency is measured once from when the batch was sent (if the sensor provides it).
+        '''
+        if send_sys_time is not None:
+            current_time = time.time()
+            self.loop_monitor.record_message_latency(current_time - send_sys_time, current_time)
+
+        for utc_time, sys_time, data, data_ok in data_batch:
+            self.process_sensor_data(sensor, utc_time, sys_time, data, data_ok)
+
+    def handle_new_sensor_data_ready(self, sensor, unused):
+
+        self.read_data_ring_buffer(sensor)
+
+    def read_data_ring_buffer(self, sensor):
+        '''Handle all data samples waiting in sensor's ring buffer (if it has one) just like data messages.'''
+
+        data_ring_buffer = sensor.data_ring_buffer
+        if data_ring_buffer is None:
+            return
+
+        # Samples can wait in the buffer until it's drained so their times don't measure message latency.
+        for utc_time, sys_time, data, data_ok in data_ring_buffer.read_all():
+            self.process_sensor_data(sensor, utc_time, sys_time, data, data_ok)
 
     def handle_data_source_data(self, manager, sensor_id, controller_id, data):
 
@@ -741,13 +915,29 @@ class SensorController(object):
             # Time came from another controller so timestamp when we received it to account for future latency.
             sys_time = time.time()
 
-        new_time = (utc_time, sys_time)
-        for sensor in self.sensors:
-            sensor.send_time(new_time)
+        self.clock_estimator.add_sample(utc_time, sys_time)
+
+        current_sys_time = time.time()
+        if self.clock_estimator.update_due(current_sys_time):
+            self.send_time_estimate(self.sensors, current_sys_time)
+            self.clock_estimator.mark_published(current_sys_time)
 
         self.last_utc_time = utc_time
         self.last_sys_time_update = time.time()
 
+    def send_time_estimate(self, sensors, current_sys_time=None):
+        '''Send current UTC time estimate to each sensor. Does nothing if there's no estimate yet.'''
+
+        if not self.clock_estimator.has_estimate:
+            return
+
+        if current_sys_time is None:
+            current_sys_time = time.time()
+
+        new_time = (self.clock_estimator.utc_time_at(current_sys_time), current_sys_time)
+        for sensor in sensors:
+            sensor.send_time(new_time)
+
     def process_position_source_data(self, source, utc_time, sys_time, data):
 
         x = data[source.position_x_idx]
@@ -755,23 +945,20 @@ class SensorController(object):
         z = data[source.position_z_idx]
         position_data = [x, y, z]
 
-        # TODO just send to local manager.
-        self.manager_interface.send_message_to_all('new_source_data', (source.sensor_id, 'position', utc_time, sys_time, position_data))
+        self.send_to_subscribers(source.sensor_id, 'new_source_data', (source.sensor_id, 'position', utc_time, sys_time, position_data))
 
     def process_orientation_source_data(self, source, utc_time, sys_time, data):
 
         angle = data[source.orientation_idx]
         orientation_data = [source.angle_name[0], angle]
 
-        # TODO just send to local manager.
-        self.manager_interface.send_message_to_all('new_source_data', (source.sensor_id, 'orientation', utc_time, sys_time, orientation_data))
+        self.send_to_subscribers(source.sensor_id, 'new_source_data', (source.sensor_id, 'orientation', utc_time, sys_time, orientation_data))
 
     def process_height_source_data(self, source, utc_time, sys_time, data):
 
         height_data = data[source.height_idx]
 
-        # TODO just send to local manager.
-        self.manager_interface.send_message_to_all('new_source_data', (source.sensor_id, 'height', utc_time, sys_time, height_data))
+        self.send_to_subscribers(source.sensor_id, 'new_source_data', (source.sensor_id, 'height', utc_time, sys_time, height_data))
 
     def handle_controller_command(self, manager, command_name, command_args):
 
@@ -805,6 +992,8 @@ class SensorController(object):
         elif command_name == 'remove_all_extra_settings':
             for extra_setting_name in self.extra_settings.keys():
                 self.remove_extra_controller_setting(extra_setting_name, manager)
+        elif command_name == 'request_connection_stats':
+            manager.send_message('connection_stats', self.connection_stats())
         else:
             self.log_message("Controller command {} not supported".format(command_name), logging.ERROR, manager)
 
@@ -820,7 +1009,7 @@ class SensorController(object):
         self.extra_settings[setting_name] = setting_value
         self.setting_name_to_type[setting_name] = setting_type
         self.send_controller_extra_setting_added_event()
-        self.send_entire_controller_info()
+        self.notify_controller_changed()
 
     def remove_extra_controller_setting(self, setting_name, manager):
 
@@ -832,15 +1021,18 @@ class SensorController(object):
 
         self.setting_name_to_type.pop(setting_name, None)
         self.send_controller_extra_setting_removed_event()
-        self.send_entire_controller_info()
+        self.notify_controller_changed()
 
     def handle_new_sensor_text(self, sensor, text):
 
-        self.manager_interface.send_message_to_all('new_sensor_text', (sensor.sensor_id, text))
-        sensor.text_messages.append(text)
+        for added_text in sensor.text_messages.add(text):
+            self.manager_interface.send_message_to_all('new_sensor_text', (sensor.sensor_id, added_text))
 
     def handle_new_sensor_status(self, sensor, state, health, paused):
 
+        # Data read before status changed (e.g. paused) needs to be handled with the old status.
+        self.read_data_ring_buffer(sensor)
+
         sensor.sensor_state = state
         sensor.sensor_health = health
         sensor.sensor_paused = paused
@@ -854,22 +1046,28 @@ class SensorController(object):
         if event_name == 'closing':
             sensor.update_connection_state('closed')
         if event_name == 'time_test':
+            # Uses the same latency histogram as sensor data so this just generates extra traffic to measure.
             start_time = event_args
-            duration = time.time() - start_time
-            self.time_test_durations.append(duration)
-            if len(self.time_test_durations) == 100:
-                avg_dur = float(sum(self.time_test_durations)) / max(len(self.time_test_durations), 1)
-                max_dur = max(self.time_test_durations)
-                min_dur = min(self.time_test_durations)
-                self.handle_new_sensor_text(sensor, "Avg {} Max {} Min {}".format(avg_dur, max_dur, min_dur))
-                self.time_test_durations = []
+            self.loop_monitor.record_message_latency(time.time() - start_time)
+            self.num_time_test_events += 1
+            if self.num_time_test_events == 100:
+                latency = self.loop_monitor.public_info()['message_latency']
+                self.handle_new_sensor_text(sensor, "Latency avg {:.4f} p99 {:.4f} max {:.4f}".format(latency['mean'], latency['p99'], latency['max']))
+                self.num_time_test_events = 0
+        if event_name == 'loop_lag':
+            lagging, max_lag, loop_info = event_args
+            if lagging:
+                reason = "Driver loop fell behind by {:.0f} ms (p99 iteration {:.0f} ms).".format(max_lag * 1000, loop_info['iteration_time']['p99'] * 1000)
+                # Slow loop doesn't mean data is bad so don't suspend the session even if sensor is a data source.
+                self.try_create_issue(self.controller_id, sensor.sensor_id, 'sensor_loop_lag', reason, 'warning', escalate_data_sources=False)
+            else:
+                self.try_resolve_issue(sensor.sensor_id, 'sensor_loop_lag')
 
     def notify_sensor_changed(self, sensor_id, info_name, value):
-        self.manager_interface.send_message_to_all('sensor_changed', (sensor_id, info_name, value))
+        self.state_changes.mark_sensor_changed(sensor_id, info_name, value)
 
     def notify_session_changed(self, info_name, value):
-        # TODO just send the info that changed...
-        self.send_entire_controller_info()
+        self.notify_controller_changed()
 
         if info_name == 'active':
             if value == True:
@@ -894,6 +1092,19 @@ class SensorController(object):
             self.log_message("Can't start session because the output directory doesn't exist.", logging.ERROR, manager)
             return False
 
+        if self.core_settings['data_log_format'] not in DATA_LOG_FORMATS:
+            self.log_message("Can't start session because data log format must be one of: {}".format(', '.join(DATA_LOG_FORMATS)), logging.ERROR, manager)
+            return False
+
+        if self.core_settings['max_log_segment_size'] < 0 or self.core_settings['max_log_segment_duration'] < 0:
+            self.log_message("Can't start session because max log segment size and duration can't be negative.", logging.ERROR, manager)
+            return False
+
+        for sensor in self.sensors:
+            if not compression_available(sensor.log_compression):
+                self.log_message("Can't start session because compression '{}' for sensor {} isn't one of: {} (zstd requires the zstandard package)".format(sensor.log_compression, sensor.sensor_id, ', '.join(COMPRESSION_TYPES)), logging.ERROR, manager)
+                return False
+
         return True # all settings valid
 
     def send_command_to_all_sensors(self, command_name, command_args=None):
@@ -1056,47 +1267,115 @@ class SensorController(object):
             for source in self.height_sources:
                 self.try_resolve_issue(source.sensor_id, 'lost_height_source')
 
-    def try_create_issue(self, main_id, sub_id, issue_type, reason, level):
+    def connection_stats(self):
+        '''
+        Return dictionary of {'sensors': {sensor_id: stats}, 'managers': {manager_id: stats}} for every connection,
+        along with 'controller_loop' stats from the loop monitor and 'log_writer' stats if a session is active.
+        '''
+
+        stats = {}
+        for group_name, interface in [('sensors', self.sensor_interface), ('managers', self.manager_interface)]:
+            stats[group_name] = {}
+            for connection_id in interface.connection_ids():
+                stats[group_name][connection_id] = interface.lookup_connection(connection_id).public_stats()
+
+        stats['controller_loop'] = self.loop_monitor.public_info()
+
+        if self.session.log_writer is not None:
+            stats['log_writer'] = self.session.log_writer.public_stats()
+
+        return stats
+
+    def update_send_queue_issues(self):
+        '''Create issue for any sensor or manager that messages are being dropped for because it isn't keeping up.'''
+
+        for interface in [self.sensor_interface, self.manager_interface]:
+            for connection_id in interface.connection_ids():
+
+                connection = interface.lookup_connection(connection_id)
+
+                key = (interface, connection_id)
+                num_newly_dropped = connection.num_messages_dropped - self.last_num_messages_dropped.get(key, 0)
+                self.last_num_messages_dropped[key] = connection.num_messages_dropped
+
+                if num_newly_dropped > 0:
+                    reason = "Dropped {} messages ({} total) since {} isn't keeping up.".format(num_newly_dropped, connection.num_messages_dropped, connection_id)
+                    self.try_create_issue(self.controller_id, connection_id, 'send_queue_overflow', reason, 'error', escalate_data_sources=False)
+                elif num_newly_dropped == 0: # negative if connection was reset
+                    self.try_resolve_issue(connection_id, 'send_queue_overflow')
+
+    def update_loop_lag_issue(self):
+        '''Create issue if message loop ran scheduled tasks (e.g. heartbeats) late since this was last called.'''
+
+        max_lag = self.loop_monitor.check_lag()
 
+        if self.loop_monitor.lagging:
+            loop_info = self.loop_monitor.public_info()
+            reason = "Controller loop fell behind by {:.0f} ms (p99 iteration {:.0f} ms, p99 {:.0f} messages per iteration).".format(
+                        max_lag * 1000, loop_info['iteration_time']['p99'] * 1000, loop_info['backlog']['p99'])
+            self.try_create_issue(self.controller_id, self.controller_id, 'loop_lag', reason, 'warning')
+        else:
+            self.try_resolve_issue(self.controller_id, 'loop_lag')
+
+    def update_log_writer_issues(self):
+        '''Create issue if session data logs are being dropped, or if the disk is too slow to keep up with them.'''
+
+        log_writer = self.session.log_writer
+        if log_writer is None:
+            self.try_resolve_issue(self.controller_id, 'log_rows_dropped')
+            self.try_resolve_issue(self.controller_id, 'slow_log_writes')
+            return
+
+        num_dropped, max_queue_depth, max_write_latency = log_writer.check_health()
+
+        if num_dropped > 0:
+            reason = "Dropped {} data log rows since writing isn't keeping up.".format(num_dropped)
+            if log_writer.last_error is not None:
+                reason += " Last error: {}".format(log_writer.last_error)
+            self.try_create_issue(self.controller_id, self.controller_id, 'log_rows_dropped', reason, 'critical')
+        else:
+            self.try_resolve_issue(self.controller_id, 'log_rows_dropped')
+
+        if max_write_latency > self.max_log_write_latency or max_queue_depth > log_writer.max_queue_size / 2:
+            reason = "Disk is slow to write data logs ({:.0f} ms to write, {} rows waiting).".format(max_write_latency * 1000, max_queue_depth)
+            self.try_create_issue(self.controller_id, self.controller_id, 'slow_log_writes', reason, 'warning')
+        else:
+            self.try_resolve_issue(self.controller_id, 'slow_log_writes')
+
+    def try_create_issue(self, main_id, sub_id, issue_type, reason, level, escalate_data_sources=True):
+        '''
+        Create issue or update the existing one. Issues for data source sensors are promoted to critical (which suspends
+        the session) unless escalate_data_sources is false, which should be used for issues that don't mean the source's
+        data is missing or wrong (e.g. a slow driver loop).
+        '''
         # First see if we need to promote the level to critical if this is a data source.
-        # Need to do this before constructing 'sensor_info' below.
-        for data_source in [self.time_source] + self.position_sources + self.orientation_sources + self.height_sources:
-            if data_source and data_source.matches(sensor_id=sub_id, controller_id=main_id):
+        if escalate_data_sources:
+            if self._data_source_table_stale:
+                self.rebuild_data_source_table()
+            if len(self.data_source_table.lookup(sub_id, main_id)) > 0:
                 level = 'critical'
-                break
 
-        issue_info = {'id': main_id, 'sub_id': sub_id, 'type': issue_type, 'reason': reason, 'level': level}
-
-        existing_issue = None
-        for issue in self.active_issues:
-            if issue.matches(issue_info):
-                existing_issue = issue
-                break
+        existing_issue = self.issues.find(main_id, sub_id, issue_type)
 
         if existing_issue:
-            existing_issue.renew()
-            if reason != existing_issue.reason:
-                existing_issue.reason = reason
-                self.send_controller_issue_event('issue_changed', existing_issue)
-                self.send_entire_controller_info()
-            if level != existing_issue.level:
-                existing_issue.level = level
+            self.issues.renew(existing_issue)
+            reason_changed = reason != existing_issue.reason
+            existing_issue.reason = reason
+            level_changed = self.issues.change_level(existing_issue, level)
+            if reason_changed or level_changed:
                 self.send_controller_issue_event('issue_changed', existing_issue)
-                self.send_entire_controller_info()
+                self.notify_controller_changed()
         else:
-            new_issue = Issue(**issue_info)
-            self.active_issues.append(new_issue)
+            new_issue = Issue(id=main_id, sub_id=sub_id, type=issue_type, reason=reason, level=level)
+            self.issues.add(new_issue)
             self.send_controller_issue_event('new_active_issue', new_issue)
-            self.send_entire_controller_info()
+            self.notify_controller_changed()
 
     def try_resolve_issue(self, sub_id, issue_type):
 
-        issue_info = {'id': self.controller_id, 'sub_id': sub_id, 'type': issue_type}
-
-        for issue in self.active_issues:
-            if issue.matches(issue_info):
-                issue.expire()
-                break
+        issue = self.issues.find(self.controller_id, sub_id, issue_type)
+        if issue is not None:
+            self.issues.expire(issue)
 
     def _make_sensor_name_unique(self, sensor_name, sensor_id='none'):
 
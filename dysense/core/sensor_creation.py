@@ -9,6 +9,7 @@ import threading
 import subprocess
 
 from dysense.core.utility import json_dumps_unicode, make_utf8
+from dysense.interfaces.data_ring_buffer import DataRingBuffer
 
 class SensorCloseTimeout(Exception): pass
 
@@ -19,8 +20,11 @@ class SensorDriverFactory(object):
         self.local_endpoint = local_endpoint
         self.remote_endpoint = remote_endpoint
 
-    def create_sensor(self, sensor_type, sensor_id, instrument_id, sensor_settings):
+    def create_sensor(self, sensor_type, sensor_id, instrument_id, sensor_settings, data_layout=None):
         '''
+        Create and run sensor driver. If data_layout (DataRecordLayout) is provided then drivers that run in
+        this process will send their data through a DataRingBuffer instead of over ZMQ. The buffer relies on the
+        GIL to order its index updates, so it's only safe between threads of a CPython process.
         '''
         sensor = None
 
@@ -66,6 +70,9 @@ class SensorDriverFactory(object):
             from dysense.sensors.imu.ner.imu_ner import ImuNer
             sensor = SensorDriverThread(ImuNer, local_startup_args)
 
+        if data_layout is not None:
+            sensor.use_data_ring_buffer(data_layout)
+
         sensor.run()
 
         return sensor
@@ -78,10 +85,16 @@ class SensorDriverThread(object):
         self.startup_args = startup_args
         self.sensor = None
         self.sensor_thread = None
+        self.data_ring_buffer = None
+
+    def use_data_ring_buffer(self, data_layout):
+
+        self.data_ring_buffer = DataRingBuffer(data_layout)
 
     def run(self):
 
         self.sensor = self.driver_class(*self.startup_args)
+        self.sensor.data_ring_buffer = self.data_ring_buffer
 
         # We want it to be a daemon thread so it doesn't keep the process from closing.
         self.sensor_thread = threading.Thread(target=self.sensor.run)
@@ -110,6 +123,13 @@ class SensorDriverProcess(object):
         self.thread = None
         self.process = None
 
+        # Process doesn't share memory with controller so data is always sent over ZMQ.
+        self.data_ring_buffer = None
+
+    def use_data_ring_buffer(self, data_layout):
+
+        return
+
     def run(self):
 
         # We want it to be a daemon thread so it doesn't keep the process from closing.
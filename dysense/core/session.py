@@ -5,9 +5,20 @@ import time
 import logging
 import os
 import datetime
+import functools
 
 from dysense.core.utility import make_filename_unique
 from dysense.core.csv_log import CSVLog
+from dysense.core.binary_log import BinaryLog, BINARY_LOG_EXTENSION, supports_binary_log
+from dysense.core.log_writer import LogWriter
+from dysense.core.segmented_log import SegmentedLog
+from dysense.core.compressed_file import compressed_file_path, is_compressed
+
+# Values of the 'data_log_format' controller setting. Sensors with non-numeric data are always logged as CSV.
+DATA_LOG_FORMATS = ['csv', 'binary']
+
+# How many samples each entry in a data log's time index covers.
+TIME_INDEX_INTERVAL = 1000
 
 class Session(object):
 
@@ -33,6 +44,9 @@ class Session(object):
         self.start_utc = 0.0
         self.start_sys_time = 0.0
 
+        # Thread that writes sensor data logs while session is active so the controller doesn't wait on the disk.
+        self.log_writer = None
+
     @property
     def state(self):
         return self._state
@@ -132,19 +146,12 @@ class Session(object):
             self.state = 'started'
 
         if self.state in ['started', 'paused']:
-            for issue in self.controller.active_issues:
-                if issue.level == 'critical':
-                    self.state = 'suspended'
+            if self.controller.issues.has_level('critical'):
+                self.state = 'suspended'
 
         if self.state == 'suspended':
 
-            still_have_critical_issue = False
-            for issue in self.controller.active_issues:
-                if issue.level == 'critical':
-                    still_have_critical_issue = True
-                    break
-
-            if still_have_critical_issue:
+            if self.controller.issues.has_level('critical'):
                 # Make sure all sensors aren't saving data files because data isn't being logged.
                 self.controller.send_command_to_all_sensors('pause')
             else:
@@ -237,16 +244,45 @@ class Session(object):
 
         self.setup_logging()
 
+        self.log_writer = LogWriter()
+        self.log_writer.start()
+
+        use_binary_logs = settings['data_log_format'] == 'binary'
+
+        # Settings are in MB and seconds where 0 means there's no limit.
+        max_segment_size = int(settings['max_log_segment_size'] * 1024 * 1024)
+        max_segment_duration = settings['max_log_segment_duration']
+
+        # Segmenting is opt-in so by default each sensor has a single log that older readers understand.
+        use_segmented_logs = max_segment_size > 0 or max_segment_duration > 0
+
         for sensor in self.controller.sensors:
 
-            sensor_csv_file_name = "{}_{}_{}_{}.csv".format(sensor.sensor_id,
-                                                            sensor.instrument_type,
-                                                            sensor.instrument_tag,
-                                                            formatted_time)
+            sensor_log_file_name = "{}_{}_{}_{}".format(sensor.sensor_id,
+                                                        sensor.instrument_type,
+                                                        sensor.instrument_tag,
+                                                        formatted_time)
 
-            sensor_csv_file_path = os.path.join(data_logs_path, sensor_csv_file_name)
+            sensor_log_file_path = os.path.join(data_logs_path, sensor_log_file_name)
 
-            sensor.output_file = CSVLog(sensor_csv_file_path, buffer_size=1)
+            # Binary logs are already compact so they're never compressed.
+            if use_binary_logs and supports_binary_log(sensor.metadata['data']):
+                log_extension = BINARY_LOG_EXTENSION
+                create_segment = functools.partial(BinaryLog, data_metadata=sensor.metadata['data'], index_interval=TIME_INDEX_INTERVAL)
+            elif is_compressed(sensor.log_compression):
+                log_extension = compressed_file_path('.csv', sensor.log_compression)
+                create_segment = functools.partial(CSVLog, buffer_size=0, compression=sensor.log_compression)
+            else:
+                log_extension = '.csv'
+                create_segment = functools.partial(CSVLog, buffer_size=0, index_interval=TIME_INDEX_INTERVAL)
+
+            if use_segmented_logs:
+                sensor.output_file = SegmentedLog(sensor_log_file_path, log_extension, create_segment,
+                                                  max_segment_size=max_segment_size,
+                                                  max_segment_duration=max_segment_duration,
+                                                  log_writer=self.log_writer)
+            else:
+                sensor.output_file = create_segment(sensor_log_file_path + log_extension, log_writer=self.log_writer)
 
             # Store the names (e.g. latitude) of the sensor output data in the file.
             # The file will only be created once the sensor starts outputting data.
@@ -269,6 +305,10 @@ class Session(object):
         for sensor in self.controller.sensors:
             sensor.output_file.terminate()
 
+        # Wait for everything to be written and synced to disk.
+        self.log_writer.stop()
+        self.log_writer = None
+
         # Go through and tell every sensor to stop saving data files to the current session.
         for sensor in self.controller.sensors:
             sensor.update_data_file_directory(None)
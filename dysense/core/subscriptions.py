@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+class Subscription(object):
+    '''Interest in one type of message (e.g. 'new_sensor_data') from one sensor, optionally limited to a maximum rate.'''
+
+    def __init__(self, sensor_id, message_type, max_rate=None):
+        '''
+        Constructor.
+
+        :param str sensor_id: sensor to receive messages for, or 'all' for every sensor.
+        :param str message_type: type of message to receive.
+        :param float max_rate: maximum number of messages per second to receive. None or 0 for no limit.
+        '''
+        self.sensor_id = sensor_id
+        self.message_type = message_type
+        self.max_rate = max_rate
+
+        # Minimum time (in seconds) between sent messages.
+        self.min_period = 1.0 / max_rate if max_rate else 0
+
+        # System time that next message is allowed to be sent.
+        self.next_send_time = 0
+
+    @property
+    def public_info(self):
+        return {'sensor_id': self.sensor_id,
+                'message_type': self.message_type,
+                'max_rate': self.max_rate}
+
+    def try_claim(self, current_time):
+        '''Return true if a message can be sent at current_time, and if so then start the next rate limit period.'''
+
+        if current_time < self.next_send_time:
+            return False
+
+        self.next_send_time = current_time + self.min_period
+        return True
+
+class SubscriptionTable(object):
+    '''
+    Track which (sensor_id, message_type) topics each subscriber (e.g. manager) wants to receive.
+
+    Subscribers don't receive any data until they subscribe to it. Sensor data is the bulk of controller traffic
+    so a subscriber that doesn't need it (or hasn't caught up on which sensors exist yet) shouldn't be flooded with it.
+    '''
+    # Sensor ID that matches every sensor.
+    all_sensors = 'all'
+
+    def __init__(self):
+
+        # Associate subscriber ID with dictionary of {(sensor_id, message_type): Subscription}
+        self._subscriber_to_subscriptions = {}
+
+    def subscribe(self, subscriber_id, sensor_id, message_type, max_rate=None):
+        '''Add (or replace) subscription to topic for subscriber.'''
+
+        subscriptions = self._subscriber_to_subscriptions.setdefault(subscriber_id, {})
+        subscriptions[(sensor_id, message_type)] = Subscription(sensor_id, message_type, max_rate)
+
+    def unsubscribe(self, subscriber_id, sensor_id, message_type):
+        '''Remove subscription to topic.'''
+
+        try:
+            self._subscriber_to_subscriptions[subscriber_id].pop((sensor_id, message_type), None)
+        except KeyError:
+            pass # never subscribed to anything
+
+    def remove_subscriber(self, subscriber_id):
+        '''Remove all subscriptions so subscriber stops receiving data until it subscribes again.'''
+
+        self._subscriber_to_subscriptions.pop(subscriber_id, None)
+
+    def subscriptions(self, subscriber_id):
+        '''Return list of subscriptions for subscriber.'''
+
+        return self._subscriber_to_subscriptions.get(subscriber_id, {}).values()
+
+    def recipients(self, subscriber_ids, sensor_id, message_type, current_time):
+        '''Return list of IDs (out of subscriber_ids) that should be sent message from sensor at the current time.'''
+
+        recipient_ids = []
+        for subscriber_id in subscriber_ids:
+
+            try:
+                subscriptions = self._subscriber_to_subscriptions[subscriber_id]
+            except KeyError:
+                continue # hasn't subscribed to anything
+
+            subscription = subscriptions.get((sensor_id, message_type), None)
+            if subscription is None:
+                subscription = subscriptions.get((SubscriptionTable.all_sensors, message_type), None)
+
+            if subscription is not None and subscription.try_claim(current_time):
+                recipient_ids.append(subscriber_id)
+
+        return recipient_ids
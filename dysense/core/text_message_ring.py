@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+import collections
+
+class TextMessageRing(object):
+    '''
+    Fixed-capacity history of text messages (e.g. from a sensor driver) where the oldest messages are dropped once
+    it's full. Can optionally rate limit new messages with a token bucket so a driver that keeps reporting the same
+    error can't flood managers. Messages that are rate limited are counted and replaced with a single
+    "N messages suppressed" message once messages are allowed again.
+    '''
+    def __init__(self, capacity=500, snapshot_size=50, max_rate=None, burst_size=20):
+        '''
+        Constructor.
+
+        :param int capacity: maximum number of messages to keep.
+        :param int snapshot_size: number of newest messages to include in snapshot().
+        :param float max_rate: average messages per second that are allowed. If None then messages aren't rate limited.
+        :param int burst_size: how many messages can be added back to back before rate limiting starts.
+        '''
+        self.snapshot_size = snapshot_size
+        self.max_rate = max_rate
+        self.burst_size = burst_size
+
+        self._messages = collections.deque(maxlen=capacity)
+
+        # Token bucket for rate limiting. Each message uses one token and tokens refill at max_rate.
+        self._tokens = float(burst_size)
+        self._last_refill_time = None
+
+        # How many messages have been rejected since the last one that was accepted.
+        self.num_suppressed = 0
+
+        # How many messages have been rejected in total (not reset by clear).
+        self.total_suppressed = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def add(self, text, current_time=None):
+        '''
+        Add new message unless it's rate limited. Return list of messages that were actually added, which includes
+        a summary of any suppressed messages, so they can be forwarded to whoever is displaying them.
+        '''
+        if not self._take_token(current_time):
+            self.num_suppressed += 1
+            self.total_suppressed += 1
+            return []
+
+        added_messages = []
+        summary = self._pop_suppressed_summary()
+        if summary is not None:
+            self._messages.append(summary)
+            added_messages.append(summary)
+
+        self._messages.append(text)
+        added_messages.append(text)
+
+        return added_messages
+
+    def flush_suppressed(self, current_time=None):
+        '''
+        Add summary of messages that have been suppressed since the last accepted message, so it doesn't have to wait
+        for the next message (which may never come). Return the summary message or None if nothing was added.
+        '''
+        if self.num_suppressed == 0 or not self._take_token(current_time):
+            return None
+
+        summary = self._pop_suppressed_summary()
+        self._messages.append(summary)
+        return summary
+
+    def snapshot(self):
+        '''Return list of the newest messages (up to snapshot_size), oldest first.'''
+
+        num_skipped = max(0, len(self._messages) - self.snapshot_size)
+        return [message for i, message in enumerate(self._messages) if i >= num_skipped]
+
+    def clear(self):
+
+        self._messages.clear()
+        self.num_suppressed = 0
+
+    def _take_token(self, current_time):
+        '''Return true if a message is allowed right now.'''
+
+        if self.max_rate is None:
+            return True
+
+        if current_time is None:
+            current_time = time.time()
+
+        if self._last_refill_time is not None:
+            elapsed_time = max(0, current_time - self._last_refill_time)
+            self._tokens = min(float(self.burst_size), self._tokens + elapsed_time * self.max_rate)
+        self._last_refill_time = current_time
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    def _pop_suppressed_summary(self):
+
+        if self.num_suppressed == 0:
+            return None
+
+        if self.num_suppressed == 1:
+            summary = '1 message suppressed'
+        else:
+            summary = '{} messages suppressed'.format(self.num_suppressed)
+
+        self.num_suppressed = 0
+        return summary
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import csv
+import bisect
+
+# Appended to a log's file path to get the path of its time index.
+TIME_INDEX_EXTENSION = '.idx'
+
+# Column names written on the first line of every time index.
+_index_header = ['#start_row', 'start_offset', 'end_offset', 'min_utc', 'max_utc']
+
+def time_index_path(log_file_path):
+    return log_file_path + TIME_INDEX_EXTENSION
+
+class TimeIndexWriter(object):
+    '''
+    Write a sparse time index for a data log. Rows are grouped into blocks of rows_per_entry and each block is written
+    as one line with its starting row number, the byte range it covers in the log and the earliest and latest
+    utc_time in it. Times don't have to be in order, so a block's time range is tracked separately from its position.
+    '''
+    def __init__(self, index_file_path, rows_per_entry=1000):
+        '''
+        Constructor.
+
+        :param str index_file_path: path of index file to create once the first row is added.
+        :param int rows_per_entry: how many log rows each index entry covers.
+        '''
+        self.index_file_path = index_file_path
+        self.rows_per_entry = max(1, rows_per_entry)
+
+        self.file = None
+
+        # Total number of rows that have been added.
+        self.num_rows = 0
+
+        # Fields of the block that's in progress. Start offset is None if there isn't one.
+        self._block_start_row = 0
+        self._block_start_offset = None
+        self._block_min_utc = 0.0
+        self._block_max_utc = 0.0
+
+    def add_row(self, utc_time, byte_offset, next_byte_offset):
+        '''
+        Add row that was written to the log.
+
+        :param float utc_time: time stamp of row.
+        :param int byte_offset: where row starts in log.
+        :param int next_byte_offset: where row ends in log.
+        '''
+        if self._block_start_offset is None:
+            self._block_start_row = self.num_rows
+            self._block_start_offset = byte_offset
+            self._block_min_utc = utc_time
+            self._block_max_utc = utc_time
+        else:
+            self._block_min_utc = min(self._block_min_utc, utc_time)
+            self._block_max_utc = max(self._block_max_utc, utc_time)
+
+        self.num_rows += 1
+
+        if self.num_rows - self._block_start_row >= self.rows_per_entry:
+            self._write_entry(next_byte_offset)
+
+    def flush(self):
+
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self, end_byte_offset):
+        '''Write entry for partial block that ends at end_byte_offset (end of log) and close index.'''
+
+        if self._block_start_offset is not None:
+            self._write_entry(end_byte_offset)
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _write_entry(self, end_offset):
+
+        if self.file is None:
+            self.file = open(self.index_file_path, 'wb')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow([str(name) for name in _index_header])
+
+        self.writer.writerow([self._block_start_row, self._block_start_offset, end_offset,
+                              repr(self._block_min_utc), repr(self._block_max_utc)])
+
+        self._block_start_offset = None
+
+class TimeIndex(object):
+    '''
+    Time index of a data log that was written by TimeIndexWriter. Finds the byte ranges of the log that could have rows
+    in a time window with two binary searches, rather than reading the entire log.
+    '''
+    def __init__(self, entries):
+        '''
+        Constructor.
+
+        :param list entries: (start_row, start_offset, end_offset, min_utc, max_utc) for each block in the order written.
+        '''
+        self.entries = entries
+
+        # Latest time in each block or any block before it. Never decreases so it can be searched.
+        self._running_max_utc = []
+        latest_utc = float('-inf')
+        for entry in entries:
+            latest_utc = max(latest_utc, entry[4])
+            self._running_max_utc.append(latest_utc)
+
+        # Earliest time in each block or any block after it. Never decreases so it can be searched.
+        self._remaining_min_utc = [0.0] * len(entries)
+        earliest_utc = float('inf')
+        for i in range(len(entries) - 1, -1, -1):
+            earliest_utc = min(earliest_utc, entries[i][3])
+            self._remaining_min_utc[i] = earliest_utc
+
+    @classmethod
+    def load(cls, index_file_path):
+        '''Return TimeIndex read from file. Raise IOError if it doesn't exist.'''
+
+        entries = []
+        with open(index_file_path, 'rb') as index_file:
+            for line in csv.reader(index_file):
+                if len(line) < 5 or line[0].startswith('#'):
+                    continue # header or partially written line.
+                try:
+                    entries.append((int(line[0]), int(line[1]), int(line[2]), float(line[3]), float(line[4])))
+                except ValueError:
+                    break # partially written line from a crash
+
+        return cls(entries)
+
+    @property
+    def indexed_end_offset(self):
+        '''Return log offset where the last indexed block ends. Rows after this (e.g. after a crash) aren't indexed.'''
+        return self.entries[-1][2] if len(self.entries) > 0 else None
+
+    def byte_ranges(self, start_utc, end_utc):
+        '''
+        Return list of (start_offset, end_offset) of consecutive indexed blocks that could contain rows with times
+        between start_utc and end_utc (inclusive). Rows that aren't indexed still need to be checked by the caller.
+        '''
+        # First block that has (or comes after a block that has) a time at or after start.
+        first_idx = bisect.bisect_left(self._running_max_utc, start_utc)
+
+        # Every block from here on only has times after end.
+        last_idx = bisect.bisect_right(self._remaining_min_utc, end_utc)
+
+        ranges = []
+        for entry in self.entries[first_idx:last_idx]:
+            _, start_offset, end_offset, min_utc, max_utc = entry
+            if max_utc < start_utc or min_utc > end_utc:
+                continue # out of order times around this block, but this one doesn't overlap
+            if len(ranges) > 0 and ranges[-1][1] == start_offset:
+                ranges[-1] = (ranges[-1][0], end_offset) # combine with previous block
+            else:
+                ranges.append((start_offset, end_offset))
+
+        return ranges
+
+def load_time_index(log_file_path):
+    '''Return TimeIndex for log at path, or None if it doesn't have one.'''
+
+    index_file_path = time_index_path(log_file_path)
+
+    if not os.path.exists(index_file_path):
+        return None
+
+    return TimeIndex.load(index_file_path)
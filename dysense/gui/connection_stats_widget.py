@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from PyQt4.Qt import *
+from PyQt4 import QtGui
+
+from dysense.core.utility import make_unicode, limit_decimal_places
+
+# How often (in seconds) to request new stats from controller while widget is shown.
+STATS_REQUEST_INTERVAL = 1.0
+
+class ConnectionStatsWidget(QWidget):
+    '''Table of traffic and latency statistics for each connection of the active controller.'''
+
+    # Column header and function to get the displayed value from the connection stats dictionary.
+    columns = [('Connection', None),
+               ('State', lambda stats: stats['connection_state']),
+               ('Msgs In\n(per sec)', lambda stats: limit_decimal_places(stats['messages_in_per_sec'], 1)),
+               ('Bytes In\n(per sec)', lambda stats: int(stats['bytes_in_per_sec'])),
+               ('Msgs Out\n(per sec)', lambda stats: limit_decimal_places(stats['messages_out_per_sec'], 1)),
+               ('Bytes Out\n(per sec)', lambda stats: int(stats['bytes_out_per_sec'])),
+               ('Receive Queue\n(max)', lambda stats: stats['max_receive_queue_depth']),
+               ('Send Queue', lambda stats: stats['messages_queued']),
+               ('Dropped', lambda stats: stats['messages_dropped']),
+               ('Heartbeat RTT\n(ms)', lambda stats: 'N/A' if stats['heartbeat_rtt'] is None else limit_decimal_places(stats['heartbeat_rtt'] * 1000, 2)),
+               ('Top Messages In', lambda stats: _format_top_types(stats['messages_in_per_sec_by_type'])),
+               ]
+
+    def __init__(self, presenter, *args):
+        QWidget.__init__(self, *args)
+
+        self.presenter = presenter
+
+        self.setup_ui()
+
+        # Only request stats while widget is shown since they aren't free for the controller to generate.
+        self.request_timer = QTimer(self)
+        self.request_timer.timeout.connect(self.presenter.request_connection_stats)
+
+    def setup_ui(self):
+
+        table_font = QtGui.QFont()
+        table_font.setPointSize(11)
+
+        self.central_layout = QVBoxLayout(self)
+
+        self.stats_table = QTableWidget()
+        self.stats_table.setFont(table_font)
+        self.stats_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.stats_table.verticalHeader().setVisible(False)
+        self.stats_table.setColumnCount(len(self.columns))
+        self.stats_table.setHorizontalHeaderLabels([header for header, _ in self.columns])
+
+        # Summary of how well the controller's message loop is keeping up.
+        self.loop_stats_label = QLabel()
+        self.loop_stats_label.setFont(table_font)
+
+        self.central_layout.addWidget(self.stats_table)
+        self.central_layout.addWidget(self.loop_stats_label)
+
+    def showEvent(self, event):
+
+        self.presenter.request_connection_stats()
+        self.request_timer.start(STATS_REQUEST_INTERVAL * 1000)
+
+    def hideEvent(self, event):
+
+        self.request_timer.stop()
+
+    def refresh_stats(self, controller_id, stats):
+        '''Replace table contents with stats dictionary sent by controller.'''
+
+        rows = []
+        for group_name, row_prefix in [('managers', 'Manager'), ('sensors', 'Sensor')]:
+            for connection_id, connection_stats in sorted(stats.get(group_name, {}).items()):
+                rows.append(('{}: {}'.format(row_prefix, connection_id), connection_stats))
+
+        self.stats_table.setRowCount(len(rows))
+
+        for row_idx, (row_name, connection_stats) in enumerate(rows):
+            for column_idx, (_, get_value) in enumerate(self.columns):
+
+                if get_value is None:
+                    value = row_name
+                else:
+                    try:
+                        value = get_value(connection_stats)
+                    except KeyError:
+                        value = '' # older controller that doesn't report this stat
+
+                table_item = self.stats_table.item(row_idx, column_idx)
+                if table_item is None:
+                    table_item = QTableWidgetItem()
+                    table_item.setTextAlignment(Qt.AlignHCenter | Qt.AlignVCenter)
+                    self.stats_table.setItem(row_idx, column_idx, table_item)
+
+                table_item.setText(make_unicode(value))
+
+        self.stats_table.resizeColumnsToContents()
+
+        self.loop_stats_label.setText(_format_loop_stats(stats.get('controller_loop', None)) + '\n' +
+                                      _format_log_writer_stats(stats.get('log_writer', None)))
+
+def _format_top_types(message_type_to_rate, max_types=3):
+    '''Return string of the most frequent message types and their rates (e.g. "new_sensor_data 10.0").'''
+
+    top_types = sorted(message_type_to_rate.items(), key=lambda item: item[1], reverse=True)[:max_types]
+    return ', '.join('{} {}'.format(message_type, limit_decimal_places(rate, 1)) for message_type, rate in top_types)
+
+def _format_loop_stats(loop_stats):
+    '''Return string summarizing controller loop stats (in milliseconds), or empty string if controller doesn't report them.'''
+
+    if loop_stats is None:
+        return ''
+
+    def format_ms(summary):
+        return 'p50 {} / p99 {} / max {} ms'.format(*[limit_decimal_places(summary[key] * 1000, 2) for key in ['p50', 'p99', 'max']])
+
+    return 'Controller loop - Iteration: {}   Lag: {}   Data latency: {}'.format(format_ms(loop_stats['iteration_time']),
+                                                                                format_ms(loop_stats['lag']),
+                                                                                format_ms(loop_stats['message_latency']))
+
+def _format_log_writer_stats(writer_stats):
+    '''Return string summarizing session data log writer, or empty string if there's no active session.'''
+
+    if writer_stats is None:
+        return ''
+
+    latency = writer_stats['write_latency']
+    return 'Data logs - Queued: {}   Write: p99 {} / max {} ms   Written: {}   Dropped: {}'.format(writer_stats['queue_depth'],
+                                                                                              limit_decimal_places(latency['p99'] * 1000, 2),
+                                                                                              limit_decimal_places(latency['max'] * 1000, 2),
+                                                                                              writer_stats['rows_written'],
+                                                                                              writer_stats['rows_dropped'])
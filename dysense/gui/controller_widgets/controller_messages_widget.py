@@ -25,6 +25,7 @@ class ControllerMessagesWidget(QWidget):
         self.messages_text_edit.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.messages_text_edit.setFontPointSize(10)
         self.messages_text_edit.setReadOnly(True)
+        self.messages_text_edit.document().setMaximumBlockCount(500)
 
         self.clear_button = QPushButton("Clear Messages")
         self.clear_button.setFont(self.button_font)
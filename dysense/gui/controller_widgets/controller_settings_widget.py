@@ -66,7 +66,8 @@ class ControllerSettingsWidget(QWidget):
                                   'base_out_directory': 'Output Folder'}
 
         # Define what order settings will show up in widget.
-        settings_order = ['id', 'base_out_directory', 'operator_name', 'platform_type', 'platform_tag', 'surveyed']
+        settings_order = ['id', 'base_out_directory', 'operator_name', 'platform_type', 'platform_tag', 'surveyed', 'data_log_format',
+                          'max_log_segment_size', 'max_log_segment_duration']
 
         setting_name_to_tooltip = {'id': 'Name of this computer. Should be unique.',
                                    'base_out_directory': 'Base folder where new session folders will be saved.',
@@ -74,6 +75,9 @@ class ControllerSettingsWidget(QWidget):
                                    'platform_type': 'Name associated with this type of platform.',
                                    'platform_tag': 'Unique ID of platform (e.g. serial number)',
                                    'surveyed': 'If using RTK then set to False if base station location is not surveyed. If not using RTK then always set to True',
+                                   'data_log_format': "Either 'csv' or 'binary'. Binary logs are smaller and faster but only used for sensors with all numeric data.",
+                                   'max_log_segment_size': 'Split data logs into files of up to this many MB. 0 is no limit. Logs are only split if a limit is set.',
+                                   'max_log_segment_duration': 'Split data logs into files that cover up to this many seconds. 0 is no limit. Logs are only split if a limit is set.',
                                    }
 
         # Convert settings to an ordered list so they show up in a consistent order.
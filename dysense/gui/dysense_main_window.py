@@ -17,6 +17,7 @@ from dysense.gui.controller_view_widget import ControllerViewWidget
 from dysense.gui.extras_menu_widget import ExtrasMenuWidget
 from dysense.gui.new_issue_popup import NewIssuePopupWindow
 from dysense.gui.data_table_widget import DataTableWidget
+from dysense.gui.connection_stats_widget import ConnectionStatsWidget
 from dysense.gui.mapping.map_widget import MapWidget
 
 from dysense.core.utility import pretty, make_unicode
@@ -90,9 +91,10 @@ class DysenseMainWindow(QMainWindow, Ui_main_window):
         # These are shown by extras menu, but updated by this main window class.
         self.sensor_data_table = DataTableWidget()
         self.map_widget = MapWidget(self.presenter)
+        self.connection_stats_widget = ConnectionStatsWidget(self.presenter)
 
         # Create menu that includes extra functionality.
-        self.extras_menu = ExtrasMenuWidget(self.presenter, self, self.sensor_data_table, self.map_widget)
+        self.extras_menu = ExtrasMenuWidget(self.presenter, self, self.sensor_data_table, self.map_widget, self.connection_stats_widget)
         self.stacked_widget.addWidget(self.extras_menu)
 
         # Load icons that will be used in sensor list widget.
@@ -385,7 +387,8 @@ class DysenseMainWindow(QMainWindow, Ui_main_window):
         # Remove row from table that shows all sensor data.
         self.sensor_data_table.remove_sensor(sensor_id)
 
-    def show_new_sensor_data(self, controller_id, sensor_id, data):
+    def show_new_sensor_data(self, controller_id, sensor_id, data, num_skipped=0):
+        '''Show newest sensor data. Num skipped is how many samples since the last update were replaced by newer ones.'''
 
         # if the passed sensor is active, call function in sensor_viewer to update data visualization
         # data visualization
@@ -393,7 +396,7 @@ class DysenseMainWindow(QMainWindow, Ui_main_window):
 
             sensor_view = self.sensor_to_widget[(controller_id, sensor_id)]
 
-            sensor_view.update_data_visualization(data)
+            sensor_view.update_data_visualization(data, num_skipped)
 
         # TODO support multiple controllers
         self.sensor_data_table.refresh_sensor_data(sensor_id, data)
@@ -468,6 +471,10 @@ class DysenseMainWindow(QMainWindow, Ui_main_window):
         reply = popup.exec_()
         return reply == QtGui.QMessageBox.Yes
 
+    def show_connection_stats(self, controller_id, stats):
+
+        self.connection_stats_widget.refresh_stats(controller_id, stats)
+
     def update_map(self, controller_id, sensor_id, source_type, utc_time, sys_time, data):
 
         if source_type == 'position':
@@ -13,13 +13,14 @@ from dysense.core.utility import make_unicode, open_directory_in_viewer
 
 class ExtrasMenuWidget(QWidget):
 
-    def __init__(self, presenter, main_window, sensor_data_table, map_widget, *args):
+    def __init__(self, presenter, main_window, sensor_data_table, map_widget, connection_stats_widget, *args):
         QWidget.__init__(self, *args)
 
         self.presenter = presenter
         self.main_window = main_window
         self.sensor_data_table = sensor_data_table
         self.map_widget = map_widget
+        self.connection_stats_widget = connection_stats_widget
 
         self.setup_ui()
 
@@ -38,7 +39,8 @@ class ExtrasMenuWidget(QWidget):
 
         self.button_info = [ButtonInfo('Session Output', 0, 0, self.open_output_clicked, 'open_output_icon'),
                             ButtonInfo('Map', 0, 1, self.view_map_clicked, 'map_icon'),
-                            ButtonInfo('Sensor Data', 0, 2, self.view_sensor_data_clicked, 'view_sensor_data_icon')
+                            ButtonInfo('Sensor Data', 0, 2, self.view_sensor_data_clicked, 'view_sensor_data_icon'),
+                            ButtonInfo('Link Stats', 0, 3, self.view_connection_stats_clicked, None),
                             ]
 
         self.menu_buttons = []
@@ -69,6 +71,7 @@ class ExtrasMenuWidget(QWidget):
 
         self.stacked_widget.addWidget(self.sensor_data_table)
         self.stacked_widget.addWidget(self.map_widget)
+        self.stacked_widget.addWidget(self.connection_stats_widget)
 
         ## ADD WIDGETS / LAYOUTS TO CENTRAL WIDGET
 
@@ -106,6 +109,10 @@ class ExtrasMenuWidget(QWidget):
 
         self.show_stacked_widget(self.sensor_data_table)
 
+    def view_connection_stats_clicked(self):
+
+        self.show_stacked_widget(self.connection_stats_widget)
+
     def open_output_clicked(self):
 
         session_path = self.presenter.local_controller['session_path']
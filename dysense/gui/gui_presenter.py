@@ -9,13 +9,27 @@ import os
 import logging
 import yaml
 
-from PyQt4.QtCore import QObject, QTimer, QCoreApplication
+from PyQt4.QtCore import QObject, QTimer, QCoreApplication, QSocketNotifier
 
 from dysense.core.issue import Issue
+from dysense.core.data_coalescer import LatestValueCoalescer
 from dysense.core.utility import json_dumps_unicode, make_unicode, make_utf8
 from dysense.core.config_file import save_config_file, load_config_file
 
-RECEIVE_TIMER_INTERVAL = 0.1 # seconds
+# Messages are normally received as soon as the manager socket is readable. The timer is only a fallback in case a
+# notification is missed, and it also keeps heartbeats going when no messages are being received.
+RECEIVE_TIMER_INTERVAL = 0.25 # seconds
+MAX_RECEIVE_DURATION = 0.02 # seconds - how long to handle messages before letting the GUI update
+DISPLAY_DATA_RATE = 10 # Hz - how often new data is shown for each sensor
+# Sensor data is already limited to the display rate by the controller, so the presenter only needs to catch bursts
+# (e.g. held messages all arriving at once). Allow some slack so normal network jitter doesn't delay data.
+MAX_DISPLAY_DATA_RATE = 2 * DISPLAY_DATA_RATE # Hz
+
+# Data streams the presenter subscribes to for every sensor it shows, and the max rate (Hz) to receive each at.
+# Sensor data is only shown at the display rate so the controller doesn't need to send it any faster. Source data
+# isn't limited since every position goes on the map, and one sensor can send several source types under one topic.
+SUBSCRIBED_MESSAGE_TYPES = {'new_sensor_data': DISPLAY_DATA_RATE,
+                            'new_source_data': None}
 
 class GUIPresenter(QObject):
 
@@ -45,22 +59,38 @@ class GUIPresenter(QObject):
         # value - dictionary of sensor info.
         self.sensors = {}
 
+        # Backstop so only the newest data from each sensor is shown if it arrives faster than it was subscribed at.
+        # Keys are tuple of (controller id, sensor id).
+        self.sensor_data_coalescer = LatestValueCoalescer(MAX_DISPLAY_DATA_RATE)
+
+        # Set to true when a call has been queued up in the event loop so it doesn't get queued up multiple times.
+        self._receive_scheduled = False
+        self._show_data_scheduled = False
+
+        # Associate manager socket file descriptor with the QSocketNotifier watching it.
+        self._fd_to_socket_notifier = {}
+
         self.message_callbacks = { # From Manager
                                   'entire_sensor_update': self.handle_entire_sensor_update,
                                   'sensor_changed': self.handle_sensor_changed,
+                                  'sensor_changes': self.handle_sensor_changes,
                                   'sensor_removed': self.handle_sensor_removed,
                                   'new_sensor_data': self.handle_new_sensor_data,
                                   'new_sensor_text': self.handle_new_sensor_text,
                                   'entire_controller_update': self.handle_entire_controller_update,
+                                  'controller_changes': self.handle_controller_changes,
                                   'controller_event': self.handle_controller_event,
                                   'controller_removed': self.handle_controller_removed,
                                   'error_message': self.handle_error_message,
                                   'new_controller_text': self.handle_new_controller_text,
                                   'new_source_data': self.handle_new_source_data,
+                                  'connection_stats': self.handle_connection_stats,
                                   }
 
         self.manager_interface.register_callbacks(self.message_callbacks)
+        self.manager_interface.max_drain_duration = MAX_RECEIVE_DURATION
         self.manager_interface.setup()
+        self._refresh_socket_notifiers()
 
     def setup_view(self, view):
 
@@ -101,6 +131,7 @@ class GUIPresenter(QObject):
     def connect_endpoint(self, manager_endpoint):
 
         self.manager_interface.connect_to_endpoint('manager', manager_endpoint)
+        self._refresh_socket_notifiers()
 
     def update_active_sensor(self, active_controller_id, active_sensor_id):
         self.active_controller_id = active_controller_id
@@ -256,12 +287,58 @@ class GUIPresenter(QObject):
         self.view.show_user_message(message, level)
 
     def receive_messages(self):
-        ''''''
-        self.manager_interface.process_new_messages()
+        '''Fallback for receiving messages in case a socket notification is missed. Only needs to be called once.'''
+
+        self._receive_waiting_messages()
 
         # Constantly reschedule timer to avoid overlapping calls
         QTimer.singleShot(RECEIVE_TIMER_INTERVAL * 1000, self.receive_messages)
 
+    def _handle_socket_activated(self, fd):
+        '''Called by socket notifier when manager socket may have new messages.'''
+
+        self._receive_waiting_messages()
+
+    def _receive_waiting_messages(self):
+        '''
+        Handle waiting messages until they run out or the receive duration is used up. If there are still messages
+        waiting then queue up another call so the GUI gets a chance to update in between.
+        '''
+        self._receive_scheduled = False
+
+        self.manager_interface.process_new_messages()
+
+        self._refresh_socket_notifiers()
+
+        # Socket notifications only happen when something changes, so need to make sure there's nothing left waiting.
+        self._schedule_receive_if_waiting()
+
+    def _schedule_receive_if_waiting(self):
+
+        if self._receive_scheduled:
+            return
+
+        if self.manager_interface.has_waiting_messages():
+            self._receive_scheduled = True
+            QTimer.singleShot(0, self._receive_waiting_messages)
+
+    def _refresh_socket_notifiers(self):
+        '''Make sure there's a socket notifier for every manager socket (and only those sockets).'''
+
+        fds = self.manager_interface.socket_file_descriptors()
+
+        for fd in self._fd_to_socket_notifier.keys():
+            if fd not in fds:
+                notifier = self._fd_to_socket_notifier.pop(fd)
+                notifier.setEnabled(False)
+                notifier.deleteLater()
+
+        for fd in fds:
+            if fd not in self._fd_to_socket_notifier:
+                notifier = QSocketNotifier(fd, QSocketNotifier.Read, self)
+                notifier.activated.connect(self._handle_socket_activated)
+                self._fd_to_socket_notifier[fd] = notifier
+
     #def change_sensor_parameter(self, parameter_name, value):
     #   self._send_message_to_active_sensor('parameter_name', (parameter_name, value))
 
@@ -277,6 +354,11 @@ class GUIPresenter(QObject):
         else:
             self.view.update_all_sensor_info(controller_id, sensor_id, sensor_info)
 
+        # Only data from sensors that are shown needs to be sent from the controller. Subscribe every time since
+        # the controller drops subscriptions (and resends all sensor info) when the manager reconnects.
+        for message_type, max_rate in SUBSCRIBED_MESSAGE_TYPES.iteritems():
+            self._send_message_to_controller('subscribe', (sensor_id, message_type, max_rate), controller_id)
+
     def handle_sensor_changed(self, connection, controller_id, sensor_id, info_name, value): #this also applies to 'settings' where value = its dictionary
         #update the dictionary of sensors
         sensor_info = self.sensors[(controller_id, sensor_id)]
@@ -284,6 +366,14 @@ class GUIPresenter(QObject):
 
         self.view.update_sensor_info(controller_id, sensor_id, info_name, value)
 
+    def handle_sensor_changes(self, connection, controller_id, sensor_id, changes):
+
+        if (controller_id, sensor_id) not in self.sensors:
+            return # haven't received entire sensor info yet
+
+        for info_name, value in changes.iteritems():
+            self.handle_sensor_changed(connection, controller_id, sensor_id, info_name, value)
+
     def handle_sensor_removed(self, connection, controller_id, sensor_id):
 
         try:
@@ -291,10 +381,37 @@ class GUIPresenter(QObject):
         except KeyError:
             pass
 
+        for message_type in SUBSCRIBED_MESSAGE_TYPES:
+            self._send_message_to_controller('unsubscribe', (sensor_id, message_type), controller_id)
+
+        self.sensor_data_coalescer.discard(lambda key: key == (controller_id, sensor_id))
+
         self.view.remove_sensor(controller_id, sensor_id)
 
     def handle_new_sensor_data(self, connection, controller_id, sensor_id, utc_time, sys_time, data, data_ok):
-        self.view.show_new_sensor_data(controller_id, sensor_id, data)
+        self.sensor_data_coalescer.add((controller_id, sensor_id), data)
+        self._show_ready_sensor_data()
+
+    def num_coalesced_sensor_data(self, controller_id, sensor_id):
+        '''Return how many data samples from sensor were never shown because newer data replaced them.'''
+        return self.sensor_data_coalescer.key_to_total_coalesced.get((controller_id, sensor_id), 0)
+
+    def _show_ready_sensor_data(self):
+
+        current_time = time.time()
+        for (controller_id, sensor_id), data, num_coalesced in self.sensor_data_coalescer.pop_ready(current_time):
+            self.view.show_new_sensor_data(controller_id, sensor_id, data, num_coalesced)
+
+        # Make sure any data that was held back gets shown once it's allowed to be.
+        next_show_time = self.sensor_data_coalescer.next_emit_time()
+        if next_show_time is not None and not self._show_data_scheduled:
+            self._show_data_scheduled = True
+            QTimer.singleShot(int(max(0, next_show_time - current_time) * 1000), self._handle_show_data_timer)
+
+    def _handle_show_data_timer(self):
+
+        self._show_data_scheduled = False
+        self._show_ready_sensor_data()
 
     def handle_new_sensor_text(self, connection, controller_id, sensor_id, text):
         self.view.append_sensor_message(controller_id, sensor_id, text)
@@ -321,6 +438,17 @@ class GUIPresenter(QObject):
 
         self.view.update_all_controller_info(controller_info['id'], controller_info)
 
+    def handle_controller_changes(self, connection, controller_id, changes):
+
+        try:
+            controller_info = self.controllers[controller_id]
+        except KeyError:
+            return # haven't received entire controller info yet
+
+        controller_info.update(changes)
+
+        self.view.update_all_controller_info(controller_id, controller_info)
+
     def handle_controller_event(self, connection, controller_id, event_type, event_args):
 
         if event_type == 'session_started':
@@ -381,6 +509,7 @@ class GUIPresenter(QObject):
             QCoreApplication.exit(1)
 
     def handle_controller_removed(self, connection, controller_id):
+        self.sensor_data_coalescer.discard(lambda key: key[0] == controller_id)
         self.view.remove_sensor(controller_id)
 
     def handle_error_message(self, connection, message, level):
@@ -395,6 +524,18 @@ class GUIPresenter(QObject):
         if source_type == 'position':
             self.view.update_map(controller_id, sensor_id, source_type, utc_time, sys_time, data)
 
+    def handle_connection_stats(self, connection, controller_id, stats):
+
+        self.view.show_connection_stats(controller_id, stats)
+
+    def request_connection_stats(self):
+        '''Ask active controller to send back traffic/latency stats for all of its connections.'''
+
+        if self.active_controller_id is None:
+            return
+
+        self.send_controller_command('request_connection_stats')
+
     def send_sensor_command(self, command_name, command_args=None):
 
         self._send_message_to_active_sensor('send_sensor_command', (command_name, command_args))
@@ -421,8 +562,9 @@ class GUIPresenter(QObject):
         self._send_message_to_controller(message_type, message_body, 'all')
 
     def _send_message_to_controller(self, controller_message_type, controller_message_body, controller_id):
+        '''Have manager forward message to the controller with the specified ID, or to every controller if the ID is 'all'.'''
         controller_message = {'type': controller_message_type, 'body': controller_message_body}
-        message_body = (self.active_controller_id, controller_message)
+        message_body = (controller_id, controller_message)
         self._send_message('forward_to_controller', message_body)
 
     def _send_message(self, message_type, message_body):
@@ -430,7 +572,14 @@ class GUIPresenter(QObject):
         # TODO don't hardcode manager ID
         self.manager_interface.send_message('manager', message_type, message_body)
 
+        # Sending can use up the socket notification for messages that arrived in the meantime.
+        self._schedule_receive_if_waiting()
+
     def close(self):
 
+        for notifier in self._fd_to_socket_notifier.values():
+            notifier.setEnabled(False)
+        self._fd_to_socket_notifier = {}
+
         self.manager_interface.close()
 
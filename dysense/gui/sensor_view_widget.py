@@ -73,6 +73,9 @@ class SensorViewWidget(QWidget, Ui_sensor_view):
         self.sensor_type_line_edit.setReadOnly(True)
         self.sensor_name_line_edit.setReadOnly(True)
 
+        # Only keep newest messages so a sensor that keeps reporting errors can't use up memory.
+        self.sensor_message_center_text_edit.document().setMaximumBlockCount(500)
+
         # Connect User Changes
         self.sensor_id_line_edit.editingFinished.connect(self.instrument_id_changed)
         self.forward_position_line_edit.editingFinished.connect(self.position_offset_changed)
@@ -215,7 +218,12 @@ class SensorViewWidget(QWidget, Ui_sensor_view):
 
             b.clicked.connect(self.special_command_clicked)
 
-    def update_data_visualization(self, data):
+    def update_data_visualization(self, data, num_skipped=0):
+
+        # Sensors can output faster than the display rate so let user know how much data isn't being shown.
+        total_skipped = self.presenter.num_coalesced_sensor_data(self.controller_id, self.sensor_id)
+        self.data_group_box.setToolTip("{} sample(s) since last update weren't shown ({} total) because sensor outputs faster than display refreshes."
+                                       .format(num_skipped, total_skipped))
 
         for n, line_edit in enumerate(self.data_line_edits):
 
@@ -5,6 +5,7 @@ import zmq
 import json
 
 from dysense.interfaces.component_interface import ComponentInterface
+from dysense.interfaces.message_codec import decode_message
 from dysense.interfaces.component_connection import ComponentConnection
 
 class ClientInterface(ComponentInterface):
@@ -24,6 +25,14 @@ class ClientInterface(ComponentInterface):
         # This should only be used to hold valid sockets (i.e. the values should never be None).
         self._server_id_to_socket = {}
 
+        # Only used to find which server sockets have messages waiting.  Any pollers registered by the
+        # user are separate since they're used to block until any interface has new messages.
+        self._receive_poller = zmq.Poller()
+
+        # Index into server sockets to start receiving from next time so each server gets a fair share
+        # of the drain limit when messages are left waiting.
+        self._next_receive_index = 0
+
         self._wired_local_server_info = None
         self._wired_remote_server_info = []
         self._wired_endpoint_info = []
@@ -74,9 +83,19 @@ class ClientInterface(ComponentInterface):
         for server_id, endpoint in self._wired_endpoint_info:
             self.connect_to_endpoint(server_id, endpoint)
 
+    def register_poller(self, poller):
+        '''Register poller with any sockets that already exist. Sockets created later will be registered automatically.'''
+
+        ComponentInterface.register_poller(self, poller)
+
+        for socket in self._server_id_to_socket.values():
+            poller.register(socket, zmq.POLLIN)
+
     def close_connection(self, component_id):
 
-        self._server_id_to_socket.pop(component_id, None)
+        socket = self._server_id_to_socket.pop(component_id, None)
+        if socket is not None:
+            self._unregister_receive_socket(socket)
 
         ComponentInterface.close_connection(self, component_id)
 
@@ -84,6 +103,7 @@ class ClientInterface(ComponentInterface):
         '''Close the socket used to talk to each server.'''
 
         for _, socket in self._server_id_to_socket.iteritems():
+            self._unregister_receive_socket(socket)
             socket.close()
 
         self._server_id_to_socket = {}
@@ -93,6 +113,33 @@ class ClientInterface(ComponentInterface):
 
         return len(self._server_id_to_socket) == 0
 
+    def is_readable(self, poll_result):
+
+        for socket in self._server_id_to_socket.values():
+            if poll_result.get(socket, 0) & zmq.POLLIN:
+                return True
+        return False
+
+    def socket_file_descriptors(self):
+        '''
+        Return list of file descriptors (one for each server socket) that can be watched by an event loop to find
+        out when there may be new messages. They're edge-triggered, see has_waiting_messages() for how to handle that.
+        '''
+        return [socket.getsockopt(zmq.FD) for socket in self._server_id_to_socket.values()]
+
+    def has_waiting_messages(self):
+        '''
+        Return true if any server socket has a message waiting to be received.
+
+        ZMQ only signals the socket file descriptors when the socket events change, not while messages are waiting.
+        So this needs to be checked after processing (or sending) messages, otherwise messages that are already
+        waiting may never cause another signal. Checking the socket events also re-arms the signal.
+        '''
+        for socket in self._server_id_to_socket.values():
+            if socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                return True
+        return False
+
     def connect_to_endpoint(self, server_id, endpoint):
         '''
         Connect client to server with that is bound to the specified endpoint.
@@ -101,12 +148,15 @@ class ClientInterface(ComponentInterface):
         if server_id in self._server_id_to_socket:
             # TODO log message that socket to server_id already created.
             existing_socket = self._server_id_to_socket[server_id]
+            self._unregister_receive_socket(existing_socket)
             existing_socket.close()
             self._server_id_to_socket.pop(server_id)
 
         socket = self._context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.SNDHWM, self.send_hwm)
         socket.connect(endpoint)
         self._server_id_to_socket[server_id] = socket
+        self._receive_poller.register(socket, zmq.POLLIN)
 
         # Register socket with pollers
         for poller in self._pollers:
@@ -124,27 +174,72 @@ class ClientInterface(ComponentInterface):
 
         self._send_introduction_message(server_id)
 
-    def _receive_new_message(self):
-        '''Return one new message from one of the servers.  If no new messages then raise ZMQError.'''
-        for server_id, server_socket in self._server_id_to_socket.iteritems():
-            try:
-                new_message = json.loads(server_socket.recv(zmq.NOBLOCK))
-                return new_message, server_id
-            except zmq.ZMQError:
-                # Server didn't have a message waiting so try next one.
-                pass
+    def _receive_new_messages(self, drain_start_time):
+        '''
+        Yield (message, server_id, num_bytes) for messages waiting from any server.  Only sockets that the poller reports
+        as readable are received from. They're drained round-robin (one message from each socket per pass) until
+        they're all empty or the drain limit (number of messages or time since drain_start_time) is reached, so one
+        chatty server can't starve the others.
+        '''
+        readable_sockets = dict(self._receive_poller.poll(0))
+        if len(readable_sockets) == 0:
+            return # no messages for any server.
+
+        server_ids = self._server_id_to_socket.keys()
+
+        # Rotate starting server so leftover messages from each server get handled first next time.
+        start_index = self._next_receive_index % len(server_ids)
+        server_ids = server_ids[start_index:] + server_ids[:start_index]
+
+        readable_servers = [(server_id, self._server_id_to_socket[server_id]) for server_id in server_ids
+                            if self._server_id_to_socket[server_id] in readable_sockets]
+
+        num_received = 0
+        while len(readable_servers) > 0:
+            for server_id, server_socket in readable_servers[:]:
+
+                if self._drain_limit_reached(num_received, drain_start_time):
+                    self._next_receive_index = start_index + server_ids.index(server_id)
+                    return
+
+                try:
+                    frames = server_socket.recv_multipart(zmq.NOBLOCK)
+                except zmq.ZMQError:
+                    # No more messages waiting (or socket was closed by a callback) so stop receiving from this server.
+                    readable_servers.remove((server_id, server_socket))
+                    continue
 
-        # No messages for any server.
-        raise zmq.ZMQError
+                num_received += 1
+                num_bytes = sum(len(frame) for frame in frames)
 
-    def _send_formatted_message(self, server_id, message):
-        '''Send message to the specified server.'''
+                if len(frames) == 2:
+                    # Message has a routing header so don't decode it yet, it may just be forwarded.
+                    yield self._unpack_routed_message(frames[0], frames[1]), server_id, num_bytes
+                else:
+                    yield decode_message(frames[0]), server_id, num_bytes
+
+    def _unregister_receive_socket(self, socket):
+        '''Stop polling socket for new messages.'''
 
+        try:
+            self._receive_poller.unregister(socket)
+        except KeyError:
+            pass # socket wasn't registered
+
+    def _send_formatted_message(self, server_id, frames):
+        '''
+        Send message frames to the specified server. Return true if sent, or false if it can't be sent
+        (e.g. haven't connected to server). Raise zmq.Again if the server's send queue is full.
+        '''
         try:
             socket = self._server_id_to_socket[server_id]
-            socket.send(message, zmq.NOBLOCK)
+            socket.send_multipart(frames, zmq.NOBLOCK)
         except KeyError:
             # TODO log some kind of error message
-            return # haven't connected to the server yet
+            return False # haven't connected to the server yet
+        except zmq.Again:
+            raise
         except zmq.ZMQError:
-            return # can't send message
+            return False # can't send message
+
+        return True
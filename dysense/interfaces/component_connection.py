@@ -4,6 +4,10 @@ from __future__ import unicode_literals
 import zmq
 import json
 import time
+import collections
+
+from dysense.interfaces.message_codec import default_codec
+from dysense.interfaces.connection_stats import ConnectionStats
 
 class ComponentConnection(object):
     '''
@@ -44,6 +48,21 @@ class ComponentConnection(object):
         # Set to true when the connected component reports that it's closing down.
         self._closing = False
 
+        # Codec used to encode messages sent to component. Negotiated when introduction message is received.
+        self.codec = default_codec
+
+        # True if messages to/from component include a routing header frame. Negotiated like the codec.
+        self.use_routing_headers = False
+
+        # True if component echoes heartbeats back so the round trip time can be measured. Negotiated like the codec.
+        self.echo_heartbeats = False
+
+        # How often (in seconds) to send a heartbeat to measure round trip time, even if link isn't idle.
+        self.heartbeat_rtt_period = 2.0
+
+        # Rolling traffic and latency statistics.
+        self.stats = ConnectionStats()
+
         # Set to a default value that can be overridden once receive introduction message.
         self.update_heartbeat_period(0.5)
 
@@ -56,7 +75,11 @@ class ComponentConnection(object):
         # Last system time that we received a new message from component.
         self._last_received_message_time = 0
 
-        # Last time we sent out a heartbeat message.
+        # Last time we sent any message to component. Every message counts as a heartbeat so an
+        # explicit heartbeat only needs to be sent when nothing else has been sent recently.
+        self._last_sent_message_time = 0
+
+        # Last time we sent an explicit heartbeat message.
         self._last_sent_heartbeat_time = 0
 
         # Time that interface was connected to component.
@@ -65,6 +88,13 @@ class ComponentConnection(object):
         # How many message have been received from component.
         self._num_messages_received = 0
 
+        # Messages (lists of frames) waiting to be sent because ZMQ's queue for component was full.
+        self.send_queue = collections.deque()
+
+        # How many messages have been handed to ZMQ, and how many were dropped because the send queue overflowed.
+        self.num_messages_sent = 0
+        self.num_messages_dropped = 0
+
         # Register with interface.
         self._interface.register_connection(self)
 
@@ -76,6 +106,10 @@ class ComponentConnection(object):
     def num_messages_received(self):
         return self._num_messages_received
 
+    @property
+    def num_messages_queued(self):
+        return len(self.send_queue)
+
     @property
     def id(self):
         return self._connected_component_id
@@ -98,11 +132,19 @@ class ComponentConnection(object):
 
         self.update_connection_state('closed')
         self._closing = False
+        self.codec = default_codec
+        self.use_routing_headers = False
+        self.echo_heartbeats = False
+        self.stats = ConnectionStats()
         self._last_message_processing_time = 0
         self._last_received_message_time = 0
+        self._last_sent_message_time = 0
         self._last_sent_heartbeat_time = 0
         self._connection_setup_time = 0
         self._num_messages_received = 0
+        self.send_queue.clear()
+        self.num_messages_sent = 0
+        self.num_messages_dropped = 0
 
         # Make sure component is registered in case in was removed when closed.
         self._interface.register_connection(self)
@@ -160,11 +202,34 @@ class ComponentConnection(object):
 
         return
 
+    def update_for_sent_message(self):
+        '''Update time tracking fields for when a message is sent to component. Called automatically by interface.'''
+
+        self._last_sent_message_time = time.time()
+
     def send_heartbeat(self):
-        '''Send heartbeat message to client.'''
+        '''Send heartbeat message to client. If it will be echoed back then include the send time to measure round trip time.'''
+
+        current_time = time.time()
+        # Interface updates the last sent message time once the heartbeat actually goes out.
+        self.send_message('heartbeat', current_time if self.echo_heartbeats else '')
+        self._last_sent_heartbeat_time = current_time
+
+    def handle_heartbeat_echo(self, heartbeat_sent_time):
+        '''Called by interface when component echoes back a heartbeat that was sent at the specified time.'''
 
-        self.send_message('heartbeat', '')
-        self._last_sent_heartbeat_time = time.time()
+        self.stats.record_heartbeat_rtt(time.time() - heartbeat_sent_time)
+
+    def public_stats(self):
+        '''Return dictionary of traffic and latency statistics for connection.'''
+
+        stats = self.stats.public_info(time.time())
+        stats['connection_state'] = self._connection_state
+        stats['messages_sent'] = self.num_messages_sent
+        stats['messages_dropped'] = self.num_messages_dropped
+        stats['messages_queued'] = self.num_messages_queued
+        stats['messages_received'] = self._num_messages_received
+        return stats
 
     def stopped_responding(self):
         '''Return true if it's been too long since we've received a new message from the component.'''
@@ -185,8 +250,44 @@ class ComponentConnection(object):
         time_since_last_message = self._last_message_processing_time - self._last_received_message_time
         return time_since_last_message > self._component_timeout_thresh
 
+    def next_refresh_time(self):
+        '''Return the earliest system time that refresh_state() could need to send a heartbeat or detect a time out.'''
+
+        current_time = time.time()
+
+        if self._connection_state == 'timed_out':
+            # Already timed out so heartbeats aren't being sent. Just check occasionally in case it recovers.
+            return current_time + self._interface.heartbeat_period
+
+        refresh_times = [self._last_sent_message_time + self._interface.heartbeat_period]
+
+        if self.echo_heartbeats:
+            refresh_times.append(max(self._last_sent_heartbeat_time, self._connection_setup_time) + self.heartbeat_rtt_period)
+
+        if self._connection_state != 'closed' and self._connection_setup_time != 0:
+            if self._num_messages_received == 0:
+                refresh_times.append(self._connection_setup_time + self._max_time_to_receive_message)
+            else:
+                refresh_times.append(self._last_received_message_time + self._component_timeout_thresh)
+
+        return min(refresh_times)
+
     def need_to_send_heartbeat(self):
-        '''Return true if it's time to send a heartbeat message to component.'''
+        '''
+        Return true if it's time to send a heartbeat message to component because the link has been idle, or
+        because it's time to measure the round trip time again.
+        '''
+        current_time = time.time()
+
+        if self.echo_heartbeats:
+            # Don't measure right away since the link is likely busy with setup messages.
+            last_measure_time = max(self._last_sent_heartbeat_time, self._connection_setup_time)
+            if (current_time - last_measure_time) > self.heartbeat_rtt_period:
+                return True
+
+        if len(self.send_queue) > 0:
+            # Held messages will refresh the link once they go out, so queueing a heartbeat behind them won't help.
+            return False
 
-        time_since_last_heartbeat = time.time() - self._last_sent_heartbeat_time
-        return time_since_last_heartbeat > self._interface.heartbeat_period
\ No newline at end of file
+        time_since_last_message = current_time - self._last_sent_message_time
+        return time_since_last_message > self._interface.heartbeat_period
\ No newline at end of file
@@ -5,8 +5,8 @@ import zmq
 import json
 import time
 
-from dysense.core.utility import json_dumps_unicode
 from dysense.interfaces.component_connection import ComponentConnection
+from dysense.interfaces.message_codec import default_codec, choose_codec, decode_message
 
 class ComponentInterface(object):
     '''
@@ -45,6 +45,16 @@ class ComponentInterface(object):
     functionality such as formatting message, processing new messages, etc.  It also tracks each
     connection that is made through the interface using ComponentConnection objects.  Part of this
     connection tracking is using a heartbeat message to ensure the other component hasn't crashed.
+    Every message counts as a heartbeat, so explicit heartbeats are only sent on otherwise idle connections.
+
+    Messages are encoded as JSON by default. If both components list another codec (e.g. 'msgpack')
+    in the 'codecs' field of their introduction message then that codec is used for the rest of the
+    connection. Components that don't list any codecs (e.g. older C# drivers) will only be sent JSON.
+
+    If both components enable routing headers then every message is sent with a small header frame holding
+    the message type and a 'route' (list of IDs, e.g. the controller that originally sent the message).
+    This lets a component relay high-volume messages with forward_message() without decoding/re-encoding
+    them.  When the message is finally handled the route is prepended to the message body arguments.
     '''
     def __init__(self, context, component_id, version):
         '''
@@ -59,15 +69,66 @@ class ComponentInterface(object):
         self.heartbeat_period = 0.5 # (seconds) how quickly heartbeat messages should be sent out.
         self.max_closing_duration = 3 # (seconds) how much time connected component needs to close down on its own.
 
+        # Maximum number of messages to receive each time process_new_messages() is called so that a flood
+        # of messages can't keep the caller from doing anything else. If None then all waiting messages are received.
+        self.max_messages_per_drain = 1000
+
+        # Maximum time (in seconds) to spend handling messages each time process_new_messages() is called.
+        # Useful for event loops (e.g. GUI) that need to stay responsive. If None then there's no time limit.
+        self.max_drain_duration = None
+
+        # Maximum number of messages ZMQ will hold for each connection before it stops accepting new ones.
+        self.send_hwm = 1000
+
+        # Once ZMQ stops accepting messages for a connection, up to this many messages are held (in order) until it
+        # can take them again. After that the overflow policy decides what happens:
+        #   'drop_newest' - drop the message being sent.
+        #   'drop_oldest' - drop the oldest held message to make room for the new one.
+        # Sending never waits for room since one slow component would then hold up every other connection (and
+        # heartbeats) handled by the same thread.
+        self.max_send_queue_size = 1000
+        self.send_overflow_policy = 'drop_newest'
+
+        # Names of the codecs this component is willing to encode messages with, in order of preference.
+        self.codecs = [default_codec.name]
+
+        # Set to true to send/receive routing header frames with components that also enable them.
+        self.use_routing_headers = False
+
         # Dictionary holding user-defined callbacks for when a certain type of message is received.
         self._message_type_to_callback = {}
 
+        # Dictionary holding callbacks for message types that should be passed on without being decoded.
+        self._message_type_to_forwarder = {}
+
+        # Associate encoded routing header with (message_type, route). Headers repeat constantly so
+        # caching them avoids encoding/decoding the same header for every message.
+        self._routing_header_to_info = {}
+        self._routing_info_to_header = {}
+
         # Associate connected component ID with it's corresponding ComponetConnection object.
         self._component_id_to_connection = {}
 
         # List of pollers that new sockets will automatically be registered with.
         self._pollers = []
 
+        # Optional DeadlineScheduler used to refresh each connection only when it could need a heartbeat or time out,
+        # instead of refreshing every connection each time refresh_connection_states() is called.
+        self._scheduler = None
+
+        # Associate component ID with the ScheduledCall that will next refresh its connection.
+        self._component_id_to_refresh_call = {}
+
+        # Minimum time (in seconds) between scheduled refreshes of the same connection.
+        self.min_connection_refresh_interval = 0.05
+
+        # Connections with messages in their send queue, and the scheduled call that will try to send them again.
+        self._connections_with_held_messages = set()
+        self._send_retry_call = None
+
+        # How long (in seconds) to wait before trying to send held messages again when using a scheduler.
+        self.send_retry_interval = 0.01
+
     def register_callbacks(self, callbacks):
         '''Register each item {message_type: callback} in specified dictionary.'''
 
@@ -79,6 +140,14 @@ class ComponentInterface(object):
 
         self._message_type_to_callback[message_type] = callback
 
+    def register_forwarder(self, message_type, forwarder):
+        '''
+        Register forwarder to be called instead of the message callback when a message with a routing header
+        is received.  Forwarder is called as forwarder(connection, message_type, route, raw_message) where
+        raw_message is still encoded so it can be passed to forward_message().
+        '''
+        self._message_type_to_forwarder[message_type] = forwarder
+
     def register_connection(self, connection):
         '''
         Register the connection object for a component that is expected to connect.  This is
@@ -86,29 +155,93 @@ class ComponentInterface(object):
         '''
         self._component_id_to_connection[connection.id] = connection
 
+        if self._scheduler is not None:
+            self._schedule_connection_refresh(connection)
+
+    def use_scheduler(self, scheduler):
+        '''
+        Refresh connections (send heartbeats and detect time outs) from scheduler instead of refresh_connection_states().
+        Once this is called the owner must call scheduler.run_expired() regularly, e.g. after processing messages.
+        '''
+        self._scheduler = scheduler
+
+        for connection in self._component_id_to_connection.values():
+            self._schedule_connection_refresh(connection)
+
     def register_poller(self, poller):
 
         self._pollers.append(poller)
 
     def close_connection(self, component_id):
 
-        self._component_id_to_connection.pop(component_id, None)
+        connection = self._component_id_to_connection.pop(component_id, None)
+        self._connections_with_held_messages.discard(connection)
+
+        refresh_call = self._component_id_to_refresh_call.pop(component_id, None)
+        if refresh_call is not None:
+            refresh_call.cancel()
 
     def lookup_connection(self, component_id):
 
         return self._component_id_to_connection[component_id]
 
-    def process_new_messages(self):
-        '''Receive all buffered messages and call their associated callback.'''
+    def connection_ids(self):
+        '''Return IDs of every component with a registered connection.'''
 
-        while True:
-            try:
-                message, sender_id = self._receive_new_message()
-                self._process_new_message(message, sender_id)
-            except zmq.ZMQError:
-                break # no more messages
+        return self._component_id_to_connection.keys()
+
+    def process_new_messages(self, refresh_connections=True):
+        '''
+        Receive buffered messages (up to max_messages_per_drain or max_drain_duration) and call their associated callback.
+        Any messages that aren't received are left waiting for the next call.
+
+        If refresh_connections is false then held messages aren't flushed and connection states (e.g. heartbeats and
+        timeouts) aren't updated.  In that case the caller must call refresh_connection_states() on its own schedule.
+
+        Return number of messages that were received.
+        '''
+        # Associate sender ID with how many messages were received from it.
+        sender_id_to_num_received = {}
+
+        # Receivers check the drain limits themselves so they can remember where to resume next time.
+        for message, sender_id, num_bytes in self._receive_new_messages(time.time()):
+            self._process_new_message(message, sender_id, num_bytes)
+            sender_id_to_num_received[sender_id] = sender_id_to_num_received.get(sender_id, 0) + 1
 
-        self._refresh_connection_states()
+        # Record every connection (even ones with nothing waiting) so idle connections don't keep a stale queue depth.
+        for connection in self._component_id_to_connection.values():
+            connection.stats.record_receive_queue_depth(sender_id_to_num_received.get(connection.id, 0))
+
+        if refresh_connections:
+            self.refresh_connection_states()
+
+        return sum(sender_id_to_num_received.itervalues())
+
+    def _drain_limit_reached(self, num_received, drain_start_time):
+        '''
+        Return true if no more messages should be received in the current drain. At least one message is always
+        allowed so a slow callback can't stop messages from being received entirely.
+        '''
+        if self.max_messages_per_drain is not None and num_received >= self.max_messages_per_drain:
+            return True
+
+        return (self.max_drain_duration is not None and num_received > 0 and
+                (time.time() - drain_start_time) >= self.max_drain_duration)
+
+    def refresh_connection_states(self):
+        '''
+        Try to send any held messages and update the state of every connection, sending heartbeats if needed.
+        If using a scheduler then connections are refreshed by it instead, so this only sends held messages.
+        '''
+        self._flush_send_queues()
+
+        if self._scheduler is None:
+            self._refresh_connection_states()
+
+    def is_readable(self, poll_result):
+        '''Return true if any socket of this interface is in the result (dictionary of {socket: events}) of a registered poller.'''
+
+        raise NotImplementedError
 
     def send_message(self, recipient_id, message_type, message_body):
         '''
@@ -121,11 +254,38 @@ class ComponentInterface(object):
         '''
         message = {'type': message_type, 'body': message_body}
 
+        codec = self._lookup_codec_for_recipient(recipient_id, message_type)
+
+        try:
+            encoded_message = codec.encode(message)
+            if message_type != 'introduction' and self._uses_routing_headers(recipient_id):
+                frames = [self._make_routing_header(message_type, []), encoded_message]
+            else:
+                frames = [encoded_message]
+            sent = self._send_frames(recipient_id, frames)
+        except AttributeError:
+            return # socket isn't created so can't send message
+
+        self._update_for_sent_message(recipient_id, message_type, frames, sent)
+
+    def forward_message(self, recipient_id, message_type, route, raw_message):
+        '''
+        Send already encoded message to recipient without decoding it. The route (list of IDs) is prepended
+        to the message body arguments when the recipient handles the message.
+        '''
+        if not self._uses_routing_headers(recipient_id):
+            # Recipient doesn't understand routing headers so need to fall back to re-encoding entire message.
+            message = decode_message(raw_message)
+            self.send_message(recipient_id, message_type, list(route) + _body_as_list(message['body']))
+            return
+
+        frames = [self._make_routing_header(message_type, route), raw_message]
         try:
-            json_message = json_dumps_unicode(message)
-            self._send_formatted_message(recipient_id, json_message)
+            sent = self._send_frames(recipient_id, frames)
         except AttributeError:
-            pass # socket isn't created so can't send message
+            return # socket isn't created so can't send message
+
+        self._update_for_sent_message(recipient_id, message_type, frames, sent)
 
     def send_message_to_all(self, message_type, message_body):
         '''Send message to every connected component.'''
@@ -133,13 +293,179 @@ class ComponentInterface(object):
         for component_id in self._component_id_to_connection.keys():
             self.send_message(component_id, message_type, message_body)
 
+    def _send_frames(self, recipient_id, frames):
+        '''
+        Send message frames to recipient, holding them in the connection's send queue if ZMQ can't take them right now.
+        If the send queue is full then the overflow policy is applied. Return true only if the frames were actually sent.
+        '''
+        try:
+            connection = self._component_id_to_connection[recipient_id]
+        except KeyError:
+            # No connection to track queue with so just try to send it.
+            try:
+                return self._send_formatted_message(recipient_id, frames)
+            except zmq.Again:
+                return False
+
+        # Need to send any held messages first so messages stay in order.
+        if self._flush_send_queue(connection):
+            try:
+                if self._send_formatted_message(recipient_id, frames):
+                    connection.num_messages_sent += 1
+                    return True
+                return False
+            except zmq.Again:
+                pass # ZMQ queue is full
+
+        if len(connection.send_queue) < self.max_send_queue_size:
+            connection.send_queue.append(frames)
+            self._hold_messages_for(connection)
+            return False
+
+        if self.send_overflow_policy == 'drop_oldest' and len(connection.send_queue) > 0:
+            connection.send_queue.popleft()
+            connection.send_queue.append(frames)
+
+        connection.num_messages_dropped += 1
+
+        return False
+
+    def _flush_send_queues(self):
+        '''Try to send messages that are being held for any connection.'''
+
+        for connection in list(self._connections_with_held_messages):
+            self._flush_send_queue(connection)
+
+    def _hold_messages_for(self, connection):
+        '''Remember that connection has held messages, and if using a scheduler make sure they'll be sent again.'''
+
+        self._connections_with_held_messages.add(connection)
+
+        if self._scheduler is not None and self._send_retry_call is None:
+            self._send_retry_call = self._scheduler.call_later(self.send_retry_interval, self._retry_held_messages)
+
+    def _retry_held_messages(self):
+        '''Called by scheduler to send held messages, rescheduling itself until they've all been sent.'''
+
+        self._send_retry_call = None
+
+        self._flush_send_queues()
+
+        if len(self._connections_with_held_messages) > 0:
+            self._send_retry_call = self._scheduler.call_later(self.send_retry_interval, self._retry_held_messages)
+
+    def _flush_send_queue(self, connection):
+        '''Send as many held messages as ZMQ will take. Return true if there are none left.'''
+
+        while len(connection.send_queue) > 0:
+            try:
+                if self._send_formatted_message(connection.id, connection.send_queue[0]):
+                    connection.num_messages_sent += 1
+                    # Held message is only now going out so this is what keeps the link from being idle.
+                    connection.update_for_sent_message()
+            except zmq.Again:
+                return False # ZMQ queue is still full
+            except AttributeError:
+                return False # socket isn't created
+            connection.send_queue.popleft()
+
+        self._connections_with_held_messages.discard(connection)
+
+        return True
+
+    def _update_for_sent_message(self, recipient_id, message_type, frames, sent):
+        '''
+        Update connection stats for a message passed to the interface. Only if it was actually sent (rather than held
+        or dropped) does the connection get told it doesn't need to send a heartbeat.
+        '''
+        try:
+            connection = self._component_id_to_connection[recipient_id]
+        except KeyError:
+            return # no connection yet
+
+        if sent:
+            connection.update_for_sent_message()
+        connection.stats.record_sent(message_type, sum(len(frame) for frame in frames), time.time())
+
+    def _lookup_codec_for_recipient(self, recipient_id, message_type):
+        '''Return codec negotiated with recipient. Introduction messages are always JSON so any component can read them.'''
+
+        if message_type == 'introduction':
+            return default_codec
+
+        try:
+            return self._component_id_to_connection[recipient_id].codec
+        except KeyError:
+            return default_codec # no connection yet so haven't negotiated a codec
+
+    def _uses_routing_headers(self, component_id):
+        '''Return true if routing headers were negotiated with component.'''
+
+        try:
+            return self._component_id_to_connection[component_id].use_routing_headers
+        except KeyError:
+            return False
+
+    def _make_routing_header(self, message_type, route):
+        '''Return encoded routing header frame.'''
+
+        routing_info = (message_type, tuple(route))
+        try:
+            return self._routing_info_to_header[routing_info]
+        except KeyError:
+            header = default_codec.encode([message_type, list(route)])
+            self._routing_info_to_header[routing_info] = header
+            return header
+
+    def _unpack_routed_message(self, header, raw_message):
+        '''
+        Return a routed message for the header and (still encoded) message. It has the same 'type' field as
+        a normal message, so it can be handled the same way until it needs to be decoded.
+        '''
+        try:
+            message_type, route = self._routing_header_to_info[header]
+        except KeyError:
+            message_type, route = default_codec.decode(header)
+            self._routing_header_to_info[header] = (message_type, route)
+
+        return {'type': message_type, 'route': route, 'raw': raw_message}
+
     def _refresh_connection_states(self):
         '''Update the state (e.g. timed-out, opened, etc) of each connection.'''
 
         for connection in self._component_id_to_connection.values():
             connection.refresh_state()
 
-    def _process_new_message(self, message, sender_id):
+    def _schedule_connection_refresh(self, connection):
+        '''Schedule connection to be refreshed at the next time it could need to send a heartbeat or time out.'''
+
+        old_refresh_call = self._component_id_to_refresh_call.get(connection.id, None)
+        if old_refresh_call is not None:
+            old_refresh_call.cancel()
+
+        refresh_time = max(connection.next_refresh_time(), time.time() + self.min_connection_refresh_interval)
+
+        self._component_id_to_refresh_call[connection.id] = self._scheduler.call_at(refresh_time, lambda: self._run_scheduled_refresh(connection))
+
+    def _run_scheduled_refresh(self, connection):
+
+        if self._component_id_to_connection.get(connection.id, None) is not connection:
+            return # connection was closed or replaced
+
+        connection.refresh_state()
+
+        self._schedule_connection_refresh(connection)
+
+    def _update_for_received_message(self, connection):
+        '''Let connection know a message was received.'''
+
+        connection.update_for_new_message()
+
+        if self._scheduler is not None and connection.connection_state != 'opened':
+            # Don't wait for the next scheduled refresh to notice that the connection is open.
+            connection.refresh_state()
+
+    def _process_new_message(self, message, sender_id, num_bytes=0):
         '''
         Invoke the callback corresponding to the new message. If the callback arguments are
         a list or tuple then they'll automatically be expanded when calling the callback.
@@ -162,10 +488,23 @@ class ComponentInterface(object):
             # with the same name as an old one, it might accidentally receive the old messages.
             return
 
+        component.stats.record_received(message['type'], num_bytes, time.time())
+
+        route = []
+        if 'route' in message:
+            forwarder = self._message_type_to_forwarder.get(message['type'], None)
+            if forwarder is not None:
+                # Relay message without decoding it.
+                forwarder(component, message['type'], message['route'], message['raw'])
+                self._update_for_received_message(component)
+                return
+            route = message['route']
+            message = decode_message(message['raw'])
+
         try:
             message_callback = self._message_type_to_callback[message['type']]
         except KeyError:
-            if is_introduction_message or message['type'] == 'heartbeat':
+            if is_introduction_message or message['type'] in ['heartbeat', 'heartbeat_echo']:
                 # Introduction messages are optional for user to handle and so are
                 # heartbeats.  Nothing special needs to be done when receiving heartbeats
                 # since every received messages is essentially treated like a heartbeat.
@@ -173,15 +512,24 @@ class ComponentInterface(object):
             else:
                 raise Exception("No callback registered for message type '{}'".format(message['type']))
 
+        if message['type'] == 'heartbeat' and component.echo_heartbeats and message['body'] != '':
+            # Send back so component can measure round trip time.
+            component.send_message('heartbeat_echo', message['body'])
+        elif message['type'] == 'heartbeat_echo':
+            component.handle_heartbeat_echo(message['body'])
+
         if message_callback is not None:
             message_body = message['body']
-            if isinstance(message_body, (tuple, list)):
+            if len(route) > 0:
+                # Components the message was routed through are passed as the first arguments.
+                message_callback(component, *(route + _body_as_list(message_body)))
+            elif isinstance(message_body, (tuple, list)):
                 # Expand arguments for convenience.
                 message_callback(component, *message_body)
             else:
                 message_callback(component, message_body)
 
-        component.update_for_new_message()
+        self._update_for_received_message(component)
 
     def _send_introduction_message(self, recipient_id):
         '''This is the first message that must be sent when connecting to a new component.'''
@@ -189,7 +537,9 @@ class ComponentInterface(object):
         if self.heartbeat_period is None:
             raise Exception("Setup error: Heartbeat period not set.")
 
-        message_body = {'sender_id': self.component_id, 'heartbeat_period': self.heartbeat_period, 'max_closing_duration': self.max_closing_duration, 'version': self.version}
+        message_body = {'sender_id': self.component_id, 'heartbeat_period': self.heartbeat_period, 'max_closing_duration': self.max_closing_duration,
+                        'version': self.version, 'codecs': self.codecs, 'routing_headers': self.use_routing_headers,
+                        'heartbeat_echo': True}
 
         self.send_message(recipient_id, 'introduction', message_body)
 
@@ -214,8 +564,23 @@ class ComponentInterface(object):
         connection.update_heartbeat_period(heartbeat_period)
         connection.received_introduction = True
 
+        # Components that don't list any codecs only understand JSON.
+        connection.codec = choose_codec(self.codecs, message['body'].get('codecs', None))
+
+        connection.use_routing_headers = self.use_routing_headers and message['body'].get('routing_headers', False)
+
+        # Older components (e.g. C# drivers) don't echo heartbeats so round trip time can't be measured.
+        connection.echo_heartbeats = message['body'].get('heartbeat_echo', False)
+
         self._post_introduction_hook(message)
 
     def _post_introduction_hook(self, message):
         '''Subclass can override to execute code after introduction message is received.'''
         return
+
+def _body_as_list(message_body):
+    '''Return message body as a list of callback arguments.'''
+
+    if isinstance(message_body, (tuple, list)):
+        return list(message_body)
+    return [message_body]
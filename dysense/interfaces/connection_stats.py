@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import collections
+
+class RollingRate(object):
+    '''Sum amounts (e.g. messages or bytes) over a rolling window of whole seconds to report an average per-second rate.'''
+
+    def __init__(self, window=5):
+        '''
+        Constructor.
+
+        :param int window: number of seconds to average over.
+        '''
+        self.window = max(1, int(window))
+
+        # List of [second, total amount added during that second] with the oldest second first.
+        self._buckets = collections.deque()
+
+    def add(self, amount, current_time):
+
+        second = int(current_time)
+        if len(self._buckets) > 0 and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += amount
+        else:
+            self._buckets.append([second, amount])
+            self._remove_old_buckets(second)
+
+    def rate(self, current_time):
+        '''Return average amount per second over the window ending at current_time.'''
+
+        self._remove_old_buckets(int(current_time))
+        return sum(amount for _, amount in self._buckets) / float(self.window)
+
+    def _remove_old_buckets(self, current_second):
+
+        while len(self._buckets) > 0 and self._buckets[0][0] <= current_second - self.window:
+            self._buckets.popleft()
+
+class ConnectionStats(object):
+    '''Rolling traffic and latency statistics for a single connection.'''
+
+    def __init__(self, window=5):
+        '''
+        Constructor.
+
+        :param int window: number of seconds that rates are averaged over.
+        '''
+        self.window = window
+
+        self.messages_in = RollingRate(window)
+        self.bytes_in = RollingRate(window)
+        self.messages_out = RollingRate(window)
+        self.bytes_out = RollingRate(window)
+
+        # Associate message type with RollingRate of how many of them are received/sent.
+        self._message_type_to_in_rate = {}
+        self._message_type_to_out_rate = {}
+
+        # Number of messages that were waiting from the connection the last time the interface received messages,
+        # and the most that have been waiting since stats were last reported.  A growing depth means the receiving
+        # loop isn't keeping up with the connection.
+        self.receive_queue_depth = 0
+        self.max_receive_queue_depth = 0
+
+        # Most recent heartbeat round trip time (in seconds), or None if it hasn't been measured.
+        self.heartbeat_rtt = None
+
+    def record_received(self, message_type, num_bytes, current_time):
+
+        self.messages_in.add(1, current_time)
+        self.bytes_in.add(num_bytes, current_time)
+        _rate_for_type(self._message_type_to_in_rate, message_type, self.window).add(1, current_time)
+
+    def record_sent(self, message_type, num_bytes, current_time):
+
+        self.messages_out.add(1, current_time)
+        self.bytes_out.add(num_bytes, current_time)
+        _rate_for_type(self._message_type_to_out_rate, message_type, self.window).add(1, current_time)
+
+    def record_receive_queue_depth(self, num_messages):
+
+        self.receive_queue_depth = num_messages
+        self.max_receive_queue_depth = max(self.max_receive_queue_depth, num_messages)
+
+    def record_heartbeat_rtt(self, rtt):
+
+        self.heartbeat_rtt = rtt
+
+    def public_info(self, current_time):
+        '''Return dictionary of current stats. This also starts tracking a new maximum receive queue depth.'''
+
+        info = {'messages_in_per_sec': self.messages_in.rate(current_time),
+                'bytes_in_per_sec': self.bytes_in.rate(current_time),
+                'messages_out_per_sec': self.messages_out.rate(current_time),
+                'bytes_out_per_sec': self.bytes_out.rate(current_time),
+                'messages_in_per_sec_by_type': _rates_by_type(self._message_type_to_in_rate, current_time),
+                'messages_out_per_sec_by_type': _rates_by_type(self._message_type_to_out_rate, current_time),
+                'receive_queue_depth': self.receive_queue_depth,
+                'max_receive_queue_depth': self.max_receive_queue_depth,
+                'heartbeat_rtt': self.heartbeat_rtt,
+                }
+
+        self.max_receive_queue_depth = self.receive_queue_depth
+
+        return info
+
+def _rate_for_type(message_type_to_rate, message_type, window):
+
+    try:
+        return message_type_to_rate[message_type]
+    except KeyError:
+        rate = RollingRate(window)
+        message_type_to_rate[message_type] = rate
+        return rate
+
+def _rates_by_type(message_type_to_rate, current_time):
+    '''Return dictionary of {message_type: rate} for every type that's been sent/received within window.'''
+
+    rates = {}
+    for message_type, rate in message_type_to_rate.iteritems():
+        value = rate.rate(current_time)
+        if value > 0:
+            rates[message_type] = value
+    return rates
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import struct
+
+class DataRecordLayout(object):
+    '''
+    Fixed binary layout of a single data sample. Each record holds utc_time, sys_time and data_ok
+    followed by one field for each data item described in the sensor metadata.
+    '''
+    # Associate metadata data type with the struct format character used to store it.
+    # Other types (e.g. strings) don't have a fixed size so they can't be stored in a record.
+    type_to_format = {'int': 'q', 'float': 'd'}
+
+    def __init__(self, data_types):
+        '''
+        Constructor.
+
+        :param list data_types: metadata type (e.g. 'float') of each data item.
+        '''
+        self.data_types = list(data_types)
+
+        formats = ''.join(DataRecordLayout.type_to_format[data_type] for data_type in self.data_types)
+        self._struct = struct.Struct(str('<dd?' + formats))
+
+        # Number of bytes in each record.
+        self.size = self._struct.size
+
+    def pack_into(self, buffer, offset, utc_time, sys_time, data, data_ok):
+        '''
+        Write sample to buffer starting at offset.  Raise ValueError if the data doesn't match the layout.
+        Ints are checked explicitly since struct would otherwise silently truncate a float stored in an int field.
+        '''
+        check_record_data(data, self.data_types)
+
+        try:
+            self._struct.pack_into(buffer, offset, utc_time, sys_time, data_ok, *data)
+        except struct.error as e:
+            raise ValueError("Can't pack data sample. {}".format(e))
+
+    def unpack_from(self, buffer, offset):
+        '''Return (utc_time, sys_time, data, data_ok) read from buffer starting at offset.'''
+
+        values = self._struct.unpack_from(buffer, offset)
+        return values[0], values[1], list(values[3:]), values[2]
+
+def check_record_data(data, data_types):
+    '''Raise ValueError if data doesn't have one number of the right type (e.g. 'int') for each of the data types.'''
+
+    if len(data) != len(data_types):
+        raise ValueError("Expected {} data items but got {}".format(len(data_types), len(data)))
+
+    for value, data_type in zip(data, data_types):
+        if isinstance(value, bool) or not isinstance(value, (int, long, float)):
+            raise ValueError("Data value {} isn't a number".format(repr(value)))
+        if data_type == 'int' and isinstance(value, float):
+            raise ValueError("Data value {} isn't an int".format(value))
+
+def make_record_layout(data_metadata):
+    '''
+    Return DataRecordLayout for the 'data' section of a sensor's metadata, or None if any
+    of the data items aren't numeric (or there aren't any data items) so a fixed layout can't be used.
+    '''
+    data_types = [data_info.get('type', None) for data_info in data_metadata]
+
+    if len(data_types) == 0:
+        return None
+
+    for data_type in data_types:
+        if data_type not in DataRecordLayout.type_to_format:
+            return None
+
+    return DataRecordLayout(data_types)
+
+class DataRingBuffer(object):
+    '''
+    Single-producer / single-consumer ring buffer of fixed layout data records.  Used to pass data samples
+    from a sensor driver thread to the controller thread in the same process without encoding each sample
+    as a message.
+
+    It's lock-free: only the producer updates the write count and only the consumer updates the read count.
+    The counts only ever increase, and the slot for a record is its count modulo the capacity. There are no memory
+    barriers, so this relies on the GIL making each count update visible to the other thread as a whole, and only
+    after the record it publishes has been written. It must not be shared without the GIL (e.g. between processes
+    or from a C extension that releases it). It's off by default and sensors opt in with 'use_data_ring_buffer'.
+
+    Since the consumer may be blocked waiting for messages the producer should notify it (e.g. with a ZMQ
+    message) when claim_notification() returns true.  That only happens once per read so a busy consumer
+    isn't sent a notification for every sample.
+    '''
+    def __init__(self, layout, capacity=4096):
+        '''
+        Constructor.
+
+        :param DataRecordLayout layout: format of each record.
+        :param int capacity: maximum number of records that can be waiting to be read.
+        '''
+        self.layout = layout
+        self.capacity = max(1, int(capacity))
+
+        self._buffer = bytearray(self.capacity * layout.size)
+
+        # Total number of records written by producer and read by consumer.
+        self._write_count = 0
+        self._read_count = 0
+
+        # Set by producer when consumer has been notified and cleared by consumer before reading.
+        self._notified = False
+
+        # Number of records producer couldn't write because the buffer was full.
+        self.num_dropped = 0
+
+    @property
+    def num_waiting(self):
+        '''Return number of records that have been written but not read yet.'''
+        return self._write_count - self._read_count
+
+    def write(self, utc_time, sys_time, data, data_ok):
+        '''
+        Called by producer to add sample. Return false (and count it as dropped) if the buffer is full.
+        Raise ValueError if the sample doesn't match the record layout.
+        '''
+        write_count = self._write_count
+        if write_count - self._read_count >= self.capacity:
+            self.num_dropped += 1
+            return False
+
+        offset = (write_count % self.capacity) * self.layout.size
+        self.layout.pack_into(self._buffer, offset, utc_time, sys_time, data, data_ok)
+
+        # Only publish record once it's completely written.
+        self._write_count = write_count + 1
+        return True
+
+    def claim_notification(self):
+        '''Called by producer after writing. Return true if consumer needs to be notified that there are records waiting.'''
+
+        if self._notified:
+            return False # consumer hasn't read since last notification
+
+        self._notified = True
+        return True
+
+    def read_all(self, max_records=None):
+        '''Called by consumer to return list of (utc_time, sys_time, data, data_ok) for waiting records, oldest first.'''
+
+        # Clear before checking for records so any record written after this will cause a new notification.
+        self._notified = False
+
+        read_count = self._read_count
+        num_records = self._write_count - read_count
+        if max_records is not None:
+            num_records = min(num_records, max_records)
+
+        records = []
+        for count in xrange(read_count, read_count + num_records):
+            offset = (count % self.capacity) * self.layout.size
+            records.append(self.layout.unpack_from(self._buffer, offset))
+
+        # Only free up slots once they've been completely read.
+        self._read_count = read_count + num_records
+
+        return records
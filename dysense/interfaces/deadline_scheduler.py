@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+import heapq
+
+class ScheduledCall(object):
+    '''Callback that's waiting in a DeadlineScheduler. Returned when scheduling so the call can be cancelled.'''
+
+    def __init__(self, deadline, callback, interval=None):
+        '''
+        Constructor.
+
+        :param float deadline: system time to run callback.
+        :param callback: function that takes no arguments.
+        :param float interval: if not None then callback is repeated this often (in seconds).
+        '''
+        self.deadline = deadline
+        self.callback = callback
+        self.interval = interval
+
+        # Set to true once cancelled so it's skipped (instead of searching the heap to remove it).
+        self.cancelled = False
+
+    def cancel(self):
+
+        self.cancelled = True
+
+class DeadlineScheduler(object):
+    '''
+    Run one-shot and periodic callbacks at their deadlines. Calls are kept in a heap ordered by deadline so
+    checking for expired calls is O(1) when nothing is due, and running them is O(expired * log(calls)) rather
+    than scanning everything that could be due (e.g. every connection) on every loop.  The time until the next
+    deadline can be used as a poll timeout so a loop only wakes up when there's something to do.
+    '''
+    def __init__(self):
+
+        # Heap of (deadline, sequence, ScheduledCall). The sequence number keeps calls with the same deadline
+        # in the order they were scheduled and means the calls themselves never need to be compared.
+        self._heap = []
+
+        self._next_sequence = 0
+
+    def __len__(self):
+        '''Return number of calls waiting in heap, including any that have been cancelled but not removed yet.'''
+        return len(self._heap)
+
+    def call_at(self, deadline, callback):
+        '''Run callback once at system time deadline. Return ScheduledCall.'''
+
+        return self._push(ScheduledCall(deadline, callback))
+
+    def call_later(self, delay, callback):
+        '''Run callback once after delay seconds. Return ScheduledCall.'''
+
+        return self.call_at(time.time() + delay, callback)
+
+    def call_every(self, interval, callback, first_delay=0):
+        '''Run callback every interval seconds, starting after first_delay seconds. Return ScheduledCall.'''
+
+        if interval <= 0:
+            raise ValueError("Interval must be positive, not {}".format(interval))
+
+        return self._push(ScheduledCall(time.time() + first_delay, callback, interval))
+
+    def next_deadline(self):
+        '''Return system time of the earliest call that hasn't been cancelled, or None if there aren't any.'''
+
+        self._remove_cancelled_head()
+
+        if len(self._heap) == 0:
+            return None
+
+        return self._heap[0][0]
+
+    def time_until_next(self, max_wait=None):
+        '''
+        Return how many seconds until the next deadline (0 if it's already passed).
+        If there aren't any calls then return max_wait.
+        '''
+        next_deadline = self.next_deadline()
+
+        if next_deadline is None:
+            return max_wait
+
+        time_until_next = max(0, next_deadline - time.time())
+        if max_wait is not None:
+            time_until_next = min(time_until_next, max_wait)
+
+        return time_until_next
+
+    def time_overdue(self, current_time=None):
+        '''Return how many seconds the earliest call is past its deadline (0 if nothing is due). Used to measure loop lag.'''
+
+        next_deadline = self.next_deadline()
+
+        if next_deadline is None:
+            return 0.0
+
+        if current_time is None:
+            current_time = time.time()
+
+        return max(0.0, current_time - next_deadline)
+
+    def run_expired(self, current_time=None):
+        '''
+        Run every call with a deadline at or before current_time (defaults to now). Return number of calls that were run.
+
+        Calls scheduled by a callback aren't run until the next time this is called, even if they're already due,
+        so a callback that keeps rescheduling itself can't block the loop.
+        '''
+        if current_time is None:
+            current_time = time.time()
+
+        # Take all the due calls off the heap first so any calls that are scheduled while running them have to wait.
+        due_calls = []
+        while len(self._heap) > 0 and self._heap[0][0] <= current_time:
+            due_calls.append(heapq.heappop(self._heap)[2])
+
+        num_run = 0
+        for call in due_calls:
+
+            if call.cancelled:
+                continue # may have been cancelled by an earlier callback
+
+            if call.interval is not None:
+                # Keep a fixed rate, but if the loop fell behind then skip the missed runs instead of running them back to back.
+                call.deadline += call.interval
+                if call.deadline <= current_time:
+                    call.deadline = current_time + call.interval
+                self._push(call)
+
+            call.callback()
+            num_run += 1
+
+        return num_run
+
+    def _push(self, call):
+
+        heapq.heappush(self._heap, (call.deadline, self._next_sequence, call))
+        self._next_sequence += 1
+        return call
+
+    def _remove_cancelled_head(self):
+
+        while len(self._heap) > 0 and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import math
+import time
+
+class Histogram(object):
+    '''
+    Count values (e.g. durations in seconds) in logarithmic buckets so percentiles can be reported without keeping
+    every value. Each bucket covers about 19% more than the one before it, which is the most a percentile can be off by.
+    '''
+    # How many buckets per doubling of the value.
+    buckets_per_doubling = 4
+
+    def __init__(self, min_value=0.0001, max_value=100.0):
+        '''
+        Constructor.
+
+        :param float min_value: values smaller than this are all counted in the first bucket.
+        :param float max_value: values larger than this are all counted in the last bucket.
+        '''
+        self.min_value = float(min_value)
+        self.num_buckets = self._bucket_index(max_value) + 1
+
+        self.reset()
+
+    def reset(self):
+
+        self._counts = [0] * self.num_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+
+        self._counts[min(self._bucket_index(value), self.num_buckets - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        '''Add all values counted by other histogram, which must have been created with the same arguments.'''
+
+        self._counts = [count + other_count for count, other_count in zip(self._counts, other._counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def percentile(self, fraction):
+        '''Return upper bound of the bucket containing the specified fraction (0 - 1) of values, or 0 if there aren't any.'''
+
+        if self.count == 0:
+            return 0.0
+
+        needed_count = max(1, int(math.ceil(fraction * self.count)))
+        running_count = 0
+        for i, count in enumerate(self._counts):
+            running_count += count
+            if running_count >= needed_count:
+                return min(self._bucket_upper_bound(i), self.max)
+
+        return self.max
+
+    def summary(self):
+        '''Return dictionary of count, mean, 50th/90th/99th percentiles and max.'''
+
+        return {'count': self.count,
+                'mean': self.mean,
+                'p50': self.percentile(0.5),
+                'p90': self.percentile(0.9),
+                'p99': self.percentile(0.99),
+                'max': self.max,
+                }
+
+    def _bucket_index(self, value):
+
+        if value <= self.min_value:
+            return 0
+
+        return int(math.log(value / self.min_value, 2) * self.buckets_per_doubling) + 1
+
+    def _bucket_upper_bound(self, index):
+
+        return self.min_value * 2 ** (index / float(self.buckets_per_doubling))
+
+class LoopMonitor(object):
+    '''
+    Measure how a message loop is keeping up: how long each iteration takes, how late it is running scheduled work
+    (its lag), how many messages it receives per iteration (its inbound backlog) and how long messages took to arrive.
+    Histograms cover a rolling window so reported percentiles reflect recent behavior rather than the whole run.
+    '''
+    def __init__(self, max_lag=0.5, window=10):
+        '''
+        Constructor.
+
+        :param float max_lag: loop is lagging if scheduled work runs more than this many seconds late.
+        :param float window: number of seconds that each set of histograms covers.
+        '''
+        self.max_lag = max_lag
+        self.window = window
+
+        # Histograms for the window that's in progress and the last one that finished.
+        self._current = _make_histograms()
+        self._previous = _make_histograms()
+        self._window_start_time = None
+
+        # Largest lag since check_lag() was last called.
+        self._max_lag_since_check = 0.0
+
+        # True if the last call to check_lag() found the loop was lagging.
+        self.lagging = False
+
+    def record_iteration(self, duration, lag, num_messages, current_time=None):
+        '''
+        Record one loop iteration.
+
+        :param float duration: seconds spent doing work (not waiting for messages).
+        :param float lag: seconds that the most overdue scheduled work was late by.
+        :param int num_messages: how many messages were received.
+        '''
+        self._roll_window(current_time)
+
+        self._current['iteration_time'].add(duration)
+        self._current['lag'].add(lag)
+        self._current['backlog'].add(num_messages)
+
+        self._max_lag_since_check = max(self._max_lag_since_check, lag)
+
+    def record_message_latency(self, latency, current_time=None):
+        '''Record how many seconds a message took from when it was created to when it was handled.'''
+
+        self._roll_window(current_time)
+
+        self._current['message_latency'].add(max(0, latency))
+
+    def check_lag(self):
+        '''
+        Return largest lag since this was last called. Also updates the lagging flag.
+        This is meant to be called periodically so the loop doesn't stay lagging because of one old stall.
+        '''
+        max_lag = self._max_lag_since_check
+        self._max_lag_since_check = 0.0
+        self.lagging = max_lag > self.max_lag
+        return max_lag
+
+    def public_info(self, current_time=None):
+        '''Return dictionary of {histogram_name: summary} over the last full window and the one in progress.'''
+
+        self._roll_window(current_time)
+
+        info = {}
+        for name, histogram in self._current.iteritems():
+            combined = _make_histograms()[name]
+            combined.merge(self._previous[name])
+            combined.merge(histogram)
+            info[name] = combined.summary()
+
+        return info
+
+    def _roll_window(self, current_time):
+
+        if current_time is None:
+            current_time = time.time()
+
+        if self._window_start_time is None:
+            self._window_start_time = current_time
+
+        if current_time - self._window_start_time < self.window:
+            return
+
+        if current_time - self._window_start_time < self.window * 2:
+            self._previous = self._current
+        else:
+            self._previous = _make_histograms() # nothing recorded during the last full window
+
+        self._current = _make_histograms()
+        self._window_start_time = current_time
+
+def _make_histograms():
+
+    return {'iteration_time': Histogram(),
+            'lag': Histogram(),
+            'backlog': Histogram(min_value=1, max_value=100000),
+            'message_latency': Histogram(),
+            }
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None # binary codec is optional so only JSON will be offered.
+
+from dysense.core.utility import json_dumps_unicode
+
+class JsonCodec(object):
+    '''
+    Default wire format.  Every component (including the C# drivers) understands it, so it's
+    always used for introduction messages and for any component that doesn't advertise a codec.
+    '''
+    name = 'json'
+
+    def encode(self, message):
+        return json_dumps_unicode(message)
+
+    def decode(self, raw_message):
+        return json.loads(raw_message)
+
+    def detect(self, raw_message):
+        '''Return true if raw message was encoded with this codec. Messages are always JSON objects.'''
+        return raw_message[:1] == b'{'
+
+class MsgpackCodec(object):
+    '''
+    Compact binary wire format.  Only available if the msgpack package is installed.
+    Note the msgpack C extension is required for this to be faster than JSON, the pure python fallback is not.
+    '''
+
+    name = 'msgpack'
+
+    def encode(self, message):
+        # Pack py2 str and unicode the same way (as msgpack strings) so they both decode to unicode like JSON does.
+        return msgpack.packb(message, use_bin_type=False)
+
+    def decode(self, raw_message):
+        return msgpack.unpackb(raw_message, raw=False)
+
+    def detect(self, raw_message):
+        '''Return true if raw message was encoded with this codec. Messages are always maps (dictionaries).'''
+        if len(raw_message) == 0:
+            return False
+        first_byte = ord(raw_message[:1])
+        # fixmap, map 16 or map 32
+        return (0x80 <= first_byte <= 0x8f) or first_byte in (0xde, 0xdf)
+
+# Associate codec name with the codec instance used to encode/decode messages.
+_name_to_codec = {JsonCodec.name: JsonCodec()}
+if msgpack is not None:
+    _name_to_codec[MsgpackCodec.name] = MsgpackCodec()
+
+default_codec = _name_to_codec[JsonCodec.name]
+
+def available_codec_names():
+    '''Return names of every codec that can be used in this process.'''
+    return _name_to_codec.keys()
+
+def preferred_codec_names():
+    '''Return names of every codec that can be used in this process, fastest first.'''
+    return [codec_name for codec_name in [MsgpackCodec.name, JsonCodec.name] if codec_name in _name_to_codec]
+
+def lookup_codec(codec_name):
+    '''Return codec with specified name or raise KeyError if it's not available.'''
+    return _name_to_codec[codec_name]
+
+def choose_codec(preferred_names, offered_names):
+    '''
+    Return the first codec in preferred_names that's also in offered_names and is available
+    in this process. If there isn't one (e.g. other component only speaks JSON) then return the default codec.
+    '''
+    if offered_names is None:
+        return default_codec
+
+    for codec_name in preferred_names:
+        if codec_name in offered_names and codec_name in _name_to_codec:
+            return _name_to_codec[codec_name]
+
+    return default_codec
+
+def decode_message(raw_message):
+    '''
+    Return decoded message dictionary. The codec is detected from the message itself so that messages
+    sent before and after codec negotiation (or sent by older components) can be mixed on the same socket.
+    Raise ValueError if no codec recognizes the message.
+    '''
+    for codec in _name_to_codec.values():
+        if codec.detect(raw_message):
+            return codec.decode(raw_message)
+
+    raise ValueError("Message not encoded with a supported codec.")
@@ -5,6 +5,7 @@ import zmq
 import json
 
 from dysense.interfaces.component_interface import ComponentInterface
+from dysense.interfaces.message_codec import decode_message
 
 class ServerInterface(ComponentInterface):
     '''
@@ -48,6 +49,10 @@ class ServerInterface(ComponentInterface):
         '''Setup the socket and bind to the default endpoints.'''
 
         self._socket = self._context.socket(zmq.ROUTER)
+        self._socket.setsockopt(zmq.SNDHWM, self.send_hwm)
+
+        # Report when a client's queue is full (or client is unknown) instead of silently dropping messages.
+        self._socket.setsockopt(zmq.ROUTER_MANDATORY, 1)
 
         for poller in self._pollers:
             poller.register(self._socket, zmq.POLLIN)
@@ -74,21 +79,45 @@ class ServerInterface(ComponentInterface):
 
         return self._socket is None
 
+    def is_readable(self, poll_result):
+
+        return bool(poll_result.get(self._socket, 0) & zmq.POLLIN)
+
     def bind_to_endpoint(self, endpoint):
         '''Bind the server socket to the specified endpoint.'''
 
         self._socket.bind(endpoint)
 
+    def _receive_new_messages(self, drain_start_time):
+        '''
+        Yield (message, client_id, num_bytes) for each waiting message until there are none left or the drain limit
+        (number of messages or time since drain_start_time) is reached.
+        '''
+        num_received = 0
+        while not self._drain_limit_reached(num_received, drain_start_time):
+            try:
+                yield self._receive_new_message()
+            except zmq.ZMQError:
+                return # no more messages
+            num_received += 1
+
     def _receive_new_message(self):
         '''
-        Return next waiting message if available, otherwise raise ZMQError
+        Return (message, client_id, num_bytes) for next waiting message if available, otherwise raise ZMQError
 
         If message isn't an introduction message and no router ID exists for it,
         for example the connection just closed down, then a client_id of '_n/a' will be returned.
         '''
 
-        router_id, message = self._socket.recv_multipart(zmq.NOBLOCK)
-        message = json.loads(message)
+        frames = self._socket.recv_multipart(zmq.NOBLOCK)
+        router_id = frames[0]
+        num_bytes = sum(len(frame) for frame in frames[1:])
+
+        if len(frames) == 3:
+            # Message has a routing header so don't decode it yet, it may just be forwarded.
+            message = self._unpack_routed_message(frames[1], frames[2])
+        else:
+            message = decode_message(frames[1])
 
         if message['type'] == 'introduction':
             client_id = message['body']['sender_id']
@@ -100,18 +129,24 @@ class ServerInterface(ComponentInterface):
             except KeyError:
                 client_id = '_n/a' # don't have a connection for this message
 
-        return message, client_id
-
-    def _send_formatted_message(self, client_id, message):
-        '''Send the already formatted message to specified client.'''
+        return message, client_id, num_bytes
 
+    def _send_formatted_message(self, client_id, frames):
+        '''
+        Send the already formatted message frames to specified client. Return true if sent, or false if it can't
+        be sent (e.g. client isn't connected). Raise zmq.Again if the client's send queue is full.
+        '''
         try:
             router_id = self._client_id_to_router_id[client_id]
-            self._socket.send_multipart([router_id, message], zmq.NOBLOCK)
+            self._socket.send_multipart([router_id] + frames, zmq.NOBLOCK)
         except KeyError:
-            return  # haven't received message from component yet so don't know how to address it.
+            return False # haven't received message from component yet so don't know how to address it.
+        except zmq.Again:
+            raise
         except zmq.ZMQError:
-            return # can't send message
+            return False # can't send message
+
+        return True
 
     def _bind_to_first_open_endpoint(self):
         '''Connect to the first remote endpoint that's not already occupied. Raise Exception if cannot bind to any.'''
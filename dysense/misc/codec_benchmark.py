@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+'''
+Compare message codecs by sending typical 'new_sensor_data' messages from a client (sensor)
+interface to a server (controller) interface. Reports messages/sec and bytes/message for each
+codec over both the inproc and TCP transports.
+
+Usage: python codec_benchmark.py [num_messages]
+'''
+
+import sys
+import time
+
+import zmq
+
+from dysense.interfaces.server_interface import ServerInterface
+from dysense.interfaces.client_interface import ClientInterface
+from dysense.interfaces.message_codec import available_codec_names, lookup_codec
+
+example_message_body = (1467822315.123456, 1467822311.654321, ['1234', 57, 0.3762823462, 1467822311.654321], True)
+
+def run_benchmark(codec_name, remote, num_messages):
+
+    context = zmq.Context()
+    version = '1.0.0'
+
+    ports = [61150] if remote else None
+    server = ServerInterface(context, 'benchmark_server', 'benchmark_' + codec_name, version, ports, all_addresses=False)
+    client = ClientInterface(context, 'benchmark_client', version)
+    server.codecs = [codec_name]
+    client.codecs = [codec_name]
+
+    if remote:
+        client.wire_remotely_to(server, '127.0.0.1')
+    else:
+        client.wire_locally_to(server)
+
+    received = [0]
+    def handle_new_sensor_data(connection, utc_time, sys_time, data, data_ok):
+        received[0] += 1
+    server.register_callback('new_sensor_data', handle_new_sensor_data)
+
+    server.setup()
+    client.setup()
+
+    # Let introduction messages go back and forth so the codec is negotiated.
+    while client.lookup_connection('benchmark_server').num_messages_received == 0:
+        server.process_new_messages()
+        client.process_new_messages()
+        time.sleep(0.01)
+
+    start_time = time.time()
+    for _ in range(num_messages):
+        client.send_message('benchmark_server', 'new_sensor_data', example_message_body)
+        if received[0] < num_messages:
+            server.process_new_messages()
+    while received[0] < num_messages:
+        server.process_new_messages()
+    duration = time.time() - start_time
+
+    server.close()
+    client.close()
+    context.term()
+
+    encoded_size = len(lookup_codec(codec_name).encode({'type': 'new_sensor_data', 'body': example_message_body}))
+
+    return num_messages / duration, encoded_size
+
+if __name__ == '__main__':
+
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print '{:<10} {:<8} {:>14} {:>14}'.format('codec', 'transport', 'messages/sec', 'bytes/message')
+    for codec_name in sorted(available_codec_names()):
+        for remote in [False, True]:
+            messages_per_sec, bytes_per_message = run_benchmark(codec_name, remote, num_messages)
+            print '{:<10} {:<8} {:>14.0f} {:>14}'.format(codec_name, 'tcp' if remote else 'inproc', messages_per_sec, bytes_per_message)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import struct
+
+import numpy as np
+
+from dysense.core.binary_log import BINARY_LOG_MAGIC, BINARY_LOG_FORMAT_VERSION
+from dysense.core.csv_log import CSVLog
+
+# Associate struct format character with the matching numpy type.
+_format_to_numpy_type = {'d': '<f8', 'q': '<i8'}
+
+def is_binary_log(file_path):
+    '''Return true if file at path starts with the binary log magic bytes.'''
+
+    with open(file_path, 'rb') as log_file:
+        return log_file.read(len(BINARY_LOG_MAGIC)) == BINARY_LOG_MAGIC
+
+def read_binary_log_header(log_file):
+    '''Read header from start of open binary log file. Return (header dictionary, offset of first record).'''
+
+    magic = log_file.read(len(BINARY_LOG_MAGIC))
+    if magic != BINARY_LOG_MAGIC:
+        raise ValueError("{} is not a binary log.".format(log_file.name))
+
+    header_length = struct.unpack(str('<I'), log_file.read(4))[0]
+    header = json.loads(log_file.read(header_length).decode('utf8'))
+
+    if header['format_version'] > BINARY_LOG_FORMAT_VERSION:
+        raise ValueError("Binary log format version {} isn't supported. Latest supported is {}.".format(header['format_version'], BINARY_LOG_FORMAT_VERSION))
+
+    return header, len(BINARY_LOG_MAGIC) + 4 + header_length
+
+def binary_log_dtype(header):
+    '''Return numpy structured dtype with one field for each column in header.'''
+
+    # Skip byte order character at start.
+    field_formats = header['record_format'][1:]
+
+    # Use index for field name since column names (which come from sensor metadata) aren't guaranteed to be unique.
+    fields = [(str('f{}'.format(i)), _format_to_numpy_type[field_format]) for i, field_format in enumerate(field_formats)]
+
+    return np.dtype(fields)
+
+def read_binary_log_records(file_path):
+    '''
+    Read entire binary log. Return (header, records) where records is a numpy structured array (see binary_log_dtype).
+    A partial record at the end of the file (e.g. from losing power while writing) is ignored.
+    '''
+    with open(file_path, 'rb') as log_file:
+        header, data_offset = read_binary_log_header(log_file)
+        log_file.seek(data_offset)
+        records = np.fromfile(log_file, dtype=binary_log_dtype(header))
+
+    return header, records
+
+def read_binary_log(file_path):
+    '''
+    Read entire binary log. Return (header, utc_times, data) where utc_times is a 1D float array and data is a
+    2D array with one row per record and one column for each data item. If all data items are ints then data
+    is an int array, otherwise it's a float array.
+    '''
+    header, records = read_binary_log_records(file_path)
+
+    utc_times = records['f0'].astype(np.float64)
+
+    data_field_names = records.dtype.names[1:]
+    if all(header_column['type'] == 'int' for header_column in header['columns'][1:]):
+        data_type = np.int64
+    else:
+        data_type = np.float64
+
+    data = np.empty((len(records), len(data_field_names)), dtype=data_type)
+    for column_idx, field_name in enumerate(data_field_names):
+        data[:, column_idx] = records[field_name]
+
+    return header, utc_times, data
+
+def convert_binary_log_to_csv(binary_file_path, csv_file_path):
+    '''Write binary log out as a CSV log with the same layout CSVLog would have created. Return number of records.'''
+
+    header, records = read_binary_log_records(binary_file_path)
+
+    csv_log = CSVLog(csv_file_path, buffer_size=0)
+    csv_log.handle_metadata([column['name'] for column in header['columns']])
+
+    # Convert to python types so floats are written with the same precision as CSVLog normally uses.
+    csv_log.write_rows([list(record) for record in records.tolist()])
+    csv_log.close()
+
+    return len(records)
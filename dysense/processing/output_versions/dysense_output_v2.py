@@ -3,23 +3,35 @@ from __future__ import unicode_literals
 
 import os
 import copy
+import multiprocessing
 from collections import defaultdict
 
+import numpy as np
+
 from dysense.core.utility import yaml_load_unicode, validate_type
+from dysense.core.binary_log import BINARY_LOG_EXTENSION
+from dysense.core.segmented_log import SEGMENT_MANIFEST_SUFFIX, read_segment_manifest
+from dysense.core.compressed_file import COMPRESSION_EXTENSIONS, open_log_file
+from dysense.processing.output_versions.binary_log_reader import read_binary_log, read_binary_log_records
+from dysense.processing.output_versions.log_window_reader import read_csv_log_window, read_binary_log_window
 from dysense.processing.utility import unicode_csv_reader
 from dysense.processing.utility import StampedAngle, StampedPosition, StampedHeight
 from dysense.processing.log import log
 
+# Extensions of sensor data logs that aren't segmented. CSV logs can also be compressed.
+SENSOR_LOG_EXTENSIONS = ['.csv', BINARY_LOG_EXTENSION] + ['.csv' + extension for extension in COMPRESSION_EXTENSIONS.values()]
+
 class SessionOutputV2(object):
     '''
     Provide interface for reading different parts of a DySense session directory.
     Before using data user should verify that session_valid property is True.
     All files are assumed to be saved in UTF8 format.
     '''
-    def __init__(self, session_path, version):
-        '''Constructor'''
+    def __init__(self, session_path, version, num_reader_processes=1):
+        '''Constructor. If num_reader_processes is more than 1 then log segments are read in parallel.'''
         self.session_path = session_path
         self.version = version
+        self.num_reader_processes = num_reader_processes
 
         self.sources = self._read_data_source_info()
 
@@ -277,66 +289,131 @@ class SessionOutputV2(object):
 
         return sensor_info_list
 
-    def _read_sensor_log_data(self, sensor_info):
-        ''''''
+    def read_sensor_log_arrays(self, sensor_info):
+        '''
+        Return (utc_times, data) numpy arrays of sensor log sorted by time, where data has one row per sample.
+        Binary logs are read directly into the arrays. CSV logs are parsed first so all data must be numeric.
+        '''
+        segments = self.log_segments(sensor_info)
+
+        if all(segment['file_name'].endswith(BINARY_LOG_EXTENSION) for segment in segments):
+            segment_arrays = [read_binary_log(segment['file_path'])[1:] for segment in segments]
+            utc_times = np.concatenate([utc_times for utc_times, _ in segment_arrays])
+            data = np.concatenate([data for _, data in segment_arrays])
+            sorted_indices = np.argsort(utc_times, kind='mergesort')
+            return utc_times[sorted_indices], data[sorted_indices]
+
+        sensor_log_data, _ = self._read_sensor_log_data(sensor_info)
+
+        utc_times = np.array([data_entry['time'] for data_entry in sensor_log_data], dtype=np.float64)
+        data = np.array([data_entry['data'] for data_entry in sensor_log_data], dtype=np.float64)
+
+        return utc_times, data
+
+    def read_sensor_log_window(self, sensor_info, start_utc, end_utc):
+        '''
+        Return list of log data entries (same as get_complete_sensors) with a time between start_utc and end_utc,
+        sorted by time. Only reads segments that overlap the window, and uses each segment's time index to only
+        read the part of it in that window.
+        '''
+        conversion_types = self._lookup_conversion_types(sensor_info)
+
+        sensor_log_data = []
+        for segment in self.log_segments(sensor_info):
+
+            if segment['start_utc'] is not None and (segment['end_utc'] < start_utc or segment['start_utc'] > end_utc):
+                continue # segment doesn't overlap window
+
+            if segment['file_name'].endswith(BINARY_LOG_EXTENSION):
+                _, records = read_binary_log_window(segment['file_path'], start_utc, end_utc)
+                sensor_log_data += [{'time': record[0], 'data': list(record[1:])} for record in records.tolist()]
+            else:
+                sensor_log_data += [{'time': utc_time, 'data': convert_log_data(log_data_entry, conversion_types)}
+                                    for utc_time, log_data_entry in read_csv_log_window(segment['file_path'], start_utc, end_utc)]
+
+        return sorted(sensor_log_data, key=lambda data: data['time'])
 
+    def log_segments(self, sensor_info):
+        '''
+        Return list of segments that make up sensor log, in the order they were written. Each segment is a dictionary
+        from the log's manifest (see SegmentedLog) with an added 'file_path'. Logs that aren't segmented are returned
+        as a single closed segment with a start and end time of None. Segments whose file was never created are skipped.
+
+        Closed segments don't change, so they can be processed (e.g. in parallel) while the session is still running.
+        '''
+        log_file_name, segments = self._find_sensor_log(sensor_info)
+
+        if segments is None:
+            segments = [{'file_name': log_file_name, 'start_utc': None, 'end_utc': None, 'num_rows': None, 'closed': True}]
+
+        existing_segments = []
+        for segment in segments:
+            segment = dict(segment, file_path=os.path.join(self.data_logs_directory_path, segment['file_name']))
+            if os.path.exists(segment['file_path']):
+                existing_segments.append(segment)
+
+        return existing_segments
+
+    def _find_sensor_log(self, sensor_info):
+        '''
+        Return (log file name, segments) for sensor. If the log is segmented then the name is its manifest and
+        segments is the list from the manifest, otherwise the name is the CSV or binary log and segments is None.
+        Raise Exception if there isn't exactly one log.
+        '''
         # The beginning part of the filename that we expect based on provided sensor info.
         log_file_name_start = '{}_{}_{}'.format(sensor_info['sensor_id'], sensor_info['instrument_type'], sensor_info['instrument_tag'])
 
         matching_file_names = []
+        matching_manifest_names = []
         for fname in os.listdir(self.data_logs_directory_path):
-            file_name_without_ext, extension = os.path.splitext(fname)
-            if log_file_name_start in fname and 'csv' in extension:
+            if log_file_name_start not in fname:
+                continue
+            if fname.endswith(SEGMENT_MANIFEST_SUFFIX):
+                matching_manifest_names.append(fname)
+            elif any(fname.endswith(log_extension) for log_extension in SENSOR_LOG_EXTENSIONS):
                 matching_file_names.append(fname)
 
+        if len(matching_manifest_names) > 1:
+            raise Exception("More than one segmented log starting with {}".format(log_file_name_start))
+        elif len(matching_manifest_names) == 1:
+            manifest_name = matching_manifest_names[0]
+            manifest = read_segment_manifest(os.path.join(self.data_logs_directory_path, manifest_name))
+            return manifest_name, manifest['segments']
+
         if len(matching_file_names) == 0:
             raise Exception("No matching log starting with {}".format(log_file_name_start))
         elif len(matching_file_names) > 1:
             raise Exception("More than one log starting with {}".format(log_file_name_start))
-        else:
-            matching_file_name = matching_file_names[0]
+
+        return matching_file_names[0], None
+
+    def _read_sensor_log_data(self, sensor_info):
+        '''Return (list of log data entries sorted by time, log file name). Segments are read in parallel if num_reader_processes > 1.'''
+
+        log_file_name, _ = self._find_sensor_log(sensor_info)
 
         full_id = (sensor_info['sensor_id'], sensor_info['controller_id'])
 
         if full_id in self.sensor_to_data:
             # Data has already been read in earlier, so don't do it again.
             sensor_log_data = self.sensor_to_data[full_id]
-            return sensor_log_data, matching_file_name
+            return sensor_log_data, log_file_name
 
-        # Look up what types line up which pieces of data.
-        if sensor_info['metadata'] is None:
-            raise Exception("Cannot convert sensor data since no metadata could be found.")
-
-        conversion_types = [setting_metadata['type'] for setting_metadata in sensor_info['metadata']['data']]
-
-        file_path = os.path.join(self.data_logs_directory_path, matching_file_name)
-
-        sensor_log_data = []
-        with open(file_path, 'rb') as log_file:
-            file_reader = unicode_csv_reader(log_file)
-            for line_num, line in enumerate(file_reader):
-
-                if len(line) == 0:
-                    continue # blank
-
-                # UTC time is always first column.
-                time_entry = line[0].strip()
-
-                if time_entry == "" or time_entry.startswith('#'):
-                    continue # invalid or comment line
+        conversion_types = self._lookup_conversion_types(sensor_info)
 
-                utc_time = float(time_entry)
+        segment_file_paths = [segment['file_path'] for segment in self.log_segments(sensor_info)]
 
-                log_data_entry = line[1:]
-
-                # Convert each piece of data to the correct type.
-                for element_idx, element_value in enumerate(log_data_entry):
-                    try:
-                        log_data_entry[element_idx] = validate_type(element_value, conversion_types[element_idx])
-                    except ValueError:
-                        raise ValueError("{} cannot be converted into the expected type '{}'".format(element_value, conversion_types[element_idx]))
+        if self.num_reader_processes > 1 and len(segment_file_paths) > 1:
+            pool = multiprocessing.Pool(min(self.num_reader_processes, len(segment_file_paths)))
+            try:
+                segments_data = pool.map(_read_sensor_log_file_star, [(file_path, conversion_types) for file_path in segment_file_paths])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            segments_data = [read_sensor_log_file(file_path, conversion_types) for file_path in segment_file_paths]
 
-                sensor_log_data.append({'time': utc_time, 'data': log_data_entry})
+        sensor_log_data = [data_entry for segment_data in segments_data for data_entry in segment_data]
 
         # Sort data by time stamp.
         sensor_log_data = sorted(sensor_log_data, key=lambda data: data['time'])
@@ -344,7 +421,15 @@ class SessionOutputV2(object):
         # Save data to avoid reading it in again.
         self.sensor_to_data[full_id] = sensor_log_data
 
-        return sensor_log_data, matching_file_name
+        return sensor_log_data, log_file_name
+
+    def _lookup_conversion_types(self, sensor_info):
+        '''Return list of types that line up with each piece of data in sensor log.'''
+
+        if sensor_info['metadata'] is None:
+            raise Exception("Cannot convert sensor data since no metadata could be found.")
+
+        return [setting_metadata['type'] for setting_metadata in sensor_info['metadata']['data']]
 
     def _read_angle(self, source):
 
@@ -373,3 +458,51 @@ def _matches_source(sensor, source):
 
     return sensor['sensor_id'] == source['sensor_id'] and sensor['controller_id'] == source['controller_id']
 
+def convert_log_data(log_data_entry, conversion_types):
+    '''Convert each piece of data read from CSV log to the correct type. Return converted list.'''
+
+    for element_idx, element_value in enumerate(log_data_entry):
+        try:
+            log_data_entry[element_idx] = validate_type(element_value, conversion_types[element_idx])
+        except ValueError:
+            raise ValueError("{} cannot be converted into the expected type '{}'".format(element_value, conversion_types[element_idx]))
+
+    return log_data_entry
+
+def read_sensor_log_file(file_path, conversion_types):
+    '''
+    Return list of log data entries ({'time': utc_time, 'data': list}) for every sample in a single CSV or binary log
+    (or log segment), in the order they were logged. Compressed CSV logs are decompressed.
+    This is a module function so it can be run in other processes.
+    '''
+    if file_path.endswith(BINARY_LOG_EXTENSION):
+        # Values are already the right type so don't need to convert them.
+        _, records = read_binary_log_records(file_path)
+        return [{'time': record[0], 'data': list(record[1:])} for record in records.tolist()]
+
+    sensor_log_data = []
+    with open_log_file(file_path) as log_file:
+        file_reader = unicode_csv_reader(log_file)
+        for line_num, line in enumerate(file_reader):
+
+            if len(line) == 0:
+                continue # blank
+
+            # UTC time is always first column.
+            time_entry = line[0].strip()
+
+            if time_entry == "" or time_entry.startswith('#'):
+                continue # invalid or comment line
+
+            utc_time = float(time_entry)
+
+            log_data_entry = convert_log_data(line[1:], conversion_types)
+
+            sensor_log_data.append({'time': utc_time, 'data': log_data_entry})
+
+    return sensor_log_data
+
+def _read_sensor_log_file_star(args):
+    '''Call read_sensor_log_file() with a tuple of arguments, since Pool.map() only passes one.'''
+    return read_sensor_log_file(*args)
+
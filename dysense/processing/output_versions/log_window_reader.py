@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import numpy as np
+
+from dysense.core.time_index import load_time_index
+from dysense.core.compressed_file import open_log_file
+from dysense.processing.output_versions.binary_log_reader import read_binary_log_header, binary_log_dtype
+from dysense.processing.utility import unicode_csv_reader
+
+def log_byte_ranges(log_file_path, start_utc, end_utc, data_offset=0):
+    '''
+    Return list of (start_offset, end_offset) byte ranges of log that could have rows between start_utc and end_utc,
+    where an end_offset of None means the end of the file. If the log doesn't have a time index then the entire
+    log (starting at data_offset) is returned.
+    '''
+    time_index = load_time_index(log_file_path)
+
+    if time_index is None:
+        return [(data_offset, None)]
+
+    byte_ranges = time_index.byte_ranges(start_utc, end_utc)
+
+    # Rows written after the last index entry (e.g. if the session crashed) always have to be checked.
+    # If the log was closed normally then this is the end of the file so nothing extra is read.
+    unindexed_offset = time_index.indexed_end_offset
+    if unindexed_offset is None:
+        unindexed_offset = data_offset
+
+    if len(byte_ranges) > 0 and byte_ranges[-1][1] == unindexed_offset:
+        byte_ranges[-1] = (byte_ranges[-1][0], None)
+    else:
+        byte_ranges.append((unindexed_offset, None))
+
+    return byte_ranges
+
+def _read_byte_range(log_file, start_offset, end_offset):
+
+    log_file.seek(start_offset)
+
+    if end_offset is None:
+        return log_file.read()
+
+    return log_file.read(max(0, end_offset - start_offset))
+
+def read_csv_log_window(log_file_path, start_utc, end_utc):
+    '''
+    Return list of (utc_time, data) for every row in CSV log with a time between start_utc and end_utc (inclusive),
+    in the order they were logged. Data is a list of unicode strings. Only the parts of the log listed in its time
+    index are read. Compressed logs don't have an index so they're decompressed and searched entirely.
+    '''
+    rows = []
+    with open_log_file(log_file_path) as log_file:
+        for start_offset, end_offset in log_byte_ranges(log_file_path, start_utc, end_utc):
+
+            lines = _read_byte_range(log_file, start_offset, end_offset).splitlines()
+
+            for line in unicode_csv_reader(lines):
+
+                if len(line) == 0:
+                    continue # blank
+
+                time_entry = line[0].strip()
+                if time_entry == "" or time_entry.startswith('#'):
+                    continue # invalid or comment line
+
+                utc_time = float(time_entry)
+                if start_utc <= utc_time <= end_utc:
+                    rows.append((utc_time, line[1:]))
+
+    return rows
+
+def read_binary_log_window(log_file_path, start_utc, end_utc):
+    '''
+    Return (header, records) for every record in binary log with a time between start_utc and end_utc (inclusive),
+    in the order they were logged. Records is a numpy structured array (see binary_log_dtype). Only the parts of the
+    log listed in its time index are read.
+    '''
+    with open(log_file_path, 'rb') as log_file:
+        header, data_offset = read_binary_log_header(log_file)
+        dtype = binary_log_dtype(header)
+
+        record_chunks = []
+        for start_offset, end_offset in log_byte_ranges(log_file_path, start_utc, end_utc, data_offset):
+            if end_offset is None:
+                count = -1
+            else:
+                count = (end_offset - start_offset) // dtype.itemsize
+            log_file.seek(start_offset)
+            record_chunks.append(np.fromfile(log_file, dtype=dtype, count=count))
+
+    records = np.concatenate(record_chunks) if len(record_chunks) > 0 else np.empty(0, dtype=dtype)
+
+    in_window = (records['f0'] >= start_utc) & (records['f0'] <= end_utc)
+
+    return header, records[in_window]
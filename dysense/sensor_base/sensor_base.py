@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 import os
+import math
 import time
 import zmq
 import json
@@ -11,6 +12,9 @@ import sys
 from dysense.core.utility import make_unicode
 from dysense.interfaces.client_interface import ClientInterface
 from dysense.interfaces.component_connection import ComponentConnection
+from dysense.interfaces.deadline_scheduler import DeadlineScheduler
+from dysense.interfaces.loop_monitor import LoopMonitor
+from dysense.interfaces.message_codec import preferred_codec_names
 from dysense.core.version import s2c_version
 
 class SensorBase(object):
@@ -33,7 +37,8 @@ class SensorBase(object):
                        }
 
     def __init__(self, sensor_id, instrument_id, context, connect_endpoint, desired_read_period=0.25, max_closing_time=2,
-                 heartbeat_period=0.5, wait_for_valid_time=True, throttle_sensor_read=True, decide_timeout=True):
+                 heartbeat_period=0.5, wait_for_valid_time=True, throttle_sensor_read=True, decide_timeout=True,
+                 max_data_batch_size=1, max_data_batch_age=0.02, max_loop_lag=0.5, codecs=None):
         '''
         Base constructor.
 
@@ -43,6 +48,13 @@ class SensorBase(object):
             max_closing_time - maximum number of seconds sensor needs to wrap up before being force closed.
             heartbeat_period - How often (in seconds) we should receive a new message from controller and
                                  how often we should send one back.
+            max_data_batch_size - how many data samples to send to controller in a single message.  If 1 then
+                                  batching is disabled and every sample is sent as soon as it's handled.
+            max_data_batch_age - maximum number of seconds a data sample can be held in a batch before it's sent.
+            max_loop_lag - report to controller if the main loop runs more than this many seconds behind schedule.
+            codecs - names of codecs to offer the controller for encoding messages, in order of preference. If None
+                     then every installed codec is offered (fastest first). The controller only uses one if it
+                     offers it too.
         '''
         self.sensor_id = make_unicode(sensor_id)
         self.instrument_id = make_unicode(instrument_id)
@@ -112,11 +124,35 @@ class SensorBase(object):
         # How many message 'data' messages have been sent to controller.
         self.num_data_messages_sent = 0
 
+        # Data samples are buffered and sent together once either limit is reached.  Useful for high-rate sensors.
+        # Sensor driver can assign directly to these fields.
+        self.max_data_batch_size = max(1, max_data_batch_size)
+        self.max_data_batch_age = max(0, max_data_batch_age)
+
+        # Samples (utc_time, sys_time, data, data_ok) waiting to be sent in the next batch.
+        self._data_batch = []
+
+        # System time that the oldest sample in the current batch was handled.
+        self._data_batch_start_time = 0
+
         # System time when sensor was setup.
         self.sensor_setup_sys_time = 0
 
+        # Shared memory buffer for passing data to controller.  Only assigned by the controller when the driver runs
+        # in the same process and the sensor data is all numeric. Commands, status, etc are still sent over ZMQ.
+        self.data_ring_buffer = None
+
+        # How many data samples were dropped because the data ring buffer was full.
+        self.num_data_samples_dropped = 0
+
+        # Iteration time and lag of the main loop.  Controller is notified when the loop starts or stops lagging.
+        self.loop_monitor = LoopMonitor(max_lag=max_loop_lag)
+        self.loop_lag_check_period = 1.0
+        self._next_loop_lag_check_time = 0
+
         # Setup interface used for communicating with controller.
         self.interface = ClientInterface(context, sensor_id, s2c_version)
+        self.interface.codecs = preferred_codec_names() if codecs is None else codecs
         self.interface.register_callbacks(self.message_callbacks)
         self.interface.heartbeat_period = heartbeat_period
         self.interface.max_closing_duration = self.max_closing_time
@@ -201,58 +237,11 @@ class SensorBase(object):
             self.setup()
             self.sensor_setup_sys_time = self.sys_time
 
-            while True:
-
-                if self._need_to_run_processing_loop():
-
-                    # Save off time so we can limit how fast the loop runs.
-                    self.next_processing_loop_start_time = self.sys_time + self.main_loop_processing_period
-
-                    # Handle any messages received over ZMQ socket.
-                    self.interface.process_new_messages()
-
-                    if self.controller_connection.connection_state == 'timed_out':
-                        raise Exception("Controller connection timed out.")
-
-                    if self.received_close_request:
-                        break # end main loop
-
-                if self._need_to_run_sensor_loop():
-
-                    if not self.still_waiting_for_data:
-                        self.request_new_data()
-
-                        # Save off time so we can limit how fast the loop runs.
-                        self.next_sensor_loop_start_time = self.sys_time + self.desired_read_period
-
-                    reported_state = self.read_new_data()
-
-                    if reported_state == 'timed_out':
-                        if self.should_have_new_reading() or not self.decide_timeout:
-                            # Sensor actually did time out so we want to request new data.
-                            self.still_waiting_for_data = False
-                        else:
-                            # Didn't actually time out.. just returned to process new controller messages.
-                            reported_state = self.state
-                            self.still_waiting_for_data = True
-                    else:
-                        # Not timed-out so not still waiting for data.
-                        self.still_waiting_for_data = False
-
-                    # If sensor is ok then override state if we're still waiting for a valid time.
-                    reported_bad_state = SensorBase.possible_states[reported_state] == 'bad'
-                    waiting_for_time = self.wait_for_valid_time and self.utc_time == 0
-                    if not reported_bad_state and waiting_for_time:
-                        reported_state = 'waiting_for_time'
-
-                    self.state = reported_state
-
-                # Figure out how long to wait before one of the loops needs to run again.
-                # If not throttling sensor then the read_new_data() is in charge of waiting.
-                if self.throttle_sensor_read and not self.still_waiting_for_data:
-                    next_time_to_run = min(self.next_processing_loop_start_time, self.next_sensor_loop_start_time)
-                    time_to_wait = next_time_to_run - self.sys_time
-                    time.sleep(max(0, time_to_wait))
+            device_fd = self.device_file_descriptor()
+            if device_fd is None:
+                self._run_timed_loop()
+            else:
+                self._run_polled_loop(device_fd)
 
         except Exception as e:
             # Get information about exception
@@ -272,12 +261,159 @@ class SensorBase(object):
                 # The closed state is only for when things closed down on request... not because an error occurred.
                 self.state = 'closed'
             self.received_close_request = False
+            self.flush_data_batch()
             self.send_event('closing')
             self.paused = True
             self.pause()
             self.close()
             self.interface.close()
 
+    def _run_timed_loop(self):
+        '''
+        Alternate between processing controller messages and reading sensor data, sleeping in between.
+        The read_new_data() method is in charge of not blocking too long.
+        '''
+        while True:
+
+            iteration_start_time = self.sys_time
+            num_messages = 0
+            loop_lag = 0
+
+            if self._need_to_run_processing_loop():
+
+                # How late the processing loop is running compared to when it was supposed to (start time is 0 the first time).
+                if self.next_processing_loop_start_time > 0:
+                    loop_lag = iteration_start_time - self.next_processing_loop_start_time
+
+                # Save off time so we can limit how fast the loop runs.
+                self.next_processing_loop_start_time = self.sys_time + self.main_loop_processing_period
+
+                # Handle any messages received over ZMQ socket.
+                num_messages = self.interface.process_new_messages()
+
+                if self.controller_connection.connection_state == 'timed_out':
+                    raise Exception("Controller connection timed out.")
+
+                if self.received_close_request:
+                    break # end main loop
+
+            if self._need_to_run_sensor_loop():
+
+                if not self.still_waiting_for_data:
+                    self.request_new_data()
+
+                    # Save off time so we can limit how fast the loop runs.
+                    self.next_sensor_loop_start_time = self.sys_time + self.desired_read_period
+
+                reported_state = self.read_new_data()
+
+                self._handle_reported_state(reported_state)
+
+            if self._data_batch_expired():
+                self.flush_data_batch()
+
+            self._record_loop_iteration(iteration_start_time, loop_lag, num_messages)
+
+            # Figure out how long to wait before one of the loops needs to run again.
+            # If not throttling sensor then the read_new_data() is in charge of waiting.
+            if self.throttle_sensor_read and not self.still_waiting_for_data:
+                next_time_to_run = min(self.next_processing_loop_start_time, self.next_sensor_loop_start_time)
+                if len(self._data_batch) > 0:
+                    next_time_to_run = min(next_time_to_run, self._data_batch_start_time + self.max_data_batch_age)
+                time_to_wait = next_time_to_run - self.sys_time
+                time.sleep(max(0, time_to_wait))
+
+    def _run_polled_loop(self, device_fd):
+        '''
+        Block in a single poller over the controller socket and the device file descriptor. Controller messages are
+        handled as soon as they're received, read_new_data() is only called when the device has data waiting, and no
+        CPU is used while waiting for either one.
+        '''
+        poller = zmq.Poller()
+        self.interface.register_poller(poller)
+        poller.register(device_fd, zmq.POLLIN)
+
+        # Heartbeats and controller time outs are scheduled instead of checked every loop.
+        scheduler = DeadlineScheduler()
+        self.interface.use_scheduler(scheduler)
+
+        # How long sensor can go without sending data before reporting that it timed out.  Same as should_have_new_reading().
+        max_time_without_data = self.desired_read_period * 1.2
+
+        while True:
+
+            # Need to wake up in time for heartbeats, requesting data, sending batched data and detecting sensor time outs.
+            wake_times = [self.next_sensor_loop_start_time]
+            next_deadline = scheduler.next_deadline()
+            if next_deadline is not None:
+                wake_times.append(next_deadline)
+            if len(self._data_batch) > 0:
+                wake_times.append(self._data_batch_start_time + self.max_data_batch_age)
+            data_timeout_time = max(self.last_received_data_time, self.sensor_setup_sys_time) + max_time_without_data
+            if data_timeout_time > self.sys_time:
+                wake_times.append(data_timeout_time) # otherwise already timed out so no need to wake up for it.
+            wake_time = min(wake_times)
+            time_to_wait = max(0, wake_time - self.sys_time)
+
+            # Round up to whole milliseconds so a deadline less than 1 ms away isn't busy-waited on.
+            readable = dict(poller.poll(int(math.ceil(time_to_wait * 1000))))
+
+            iteration_start_time = self.sys_time
+
+            # How late the loop is running compared to when something was supposed to be done. Wake time is 0 the first
+            # time since the sensor loop should run right away.
+            loop_lag = max(0, iteration_start_time - wake_time) if wake_time > 0 else 0
+
+            num_messages = 0
+            if self.interface.is_readable(readable):
+                num_messages = self.interface.process_new_messages(refresh_connections=False)
+
+            scheduler.run_expired()
+
+            if self.controller_connection.connection_state == 'timed_out':
+                raise Exception("Controller connection timed out.")
+
+            if self.received_close_request:
+                break # end main loop
+
+            if self.sys_time >= self.next_sensor_loop_start_time:
+                # Only matters for sensors that need to be asked for each reading.
+                self.request_new_data()
+                self.next_sensor_loop_start_time = self.sys_time + self.desired_read_period
+
+            if device_fd in readable:
+                self._handle_reported_state(self.read_new_data())
+            elif self.sys_time >= data_timeout_time:
+                self._handle_reported_state('timed_out')
+
+            if self._data_batch_expired():
+                self.flush_data_batch()
+
+            self._record_loop_iteration(iteration_start_time, loop_lag, num_messages)
+
+    def _handle_reported_state(self, reported_state):
+        '''Update sensor state using the state reported by read_new_data().'''
+
+        if reported_state == 'timed_out':
+            if self.should_have_new_reading() or not self.decide_timeout:
+                # Sensor actually did time out so we want to request new data.
+                self.still_waiting_for_data = False
+            else:
+                # Didn't actually time out.. just returned to process new controller messages.
+                reported_state = self.state
+                self.still_waiting_for_data = True
+        else:
+            # Not timed-out so not still waiting for data.
+            self.still_waiting_for_data = False
+
+        # If sensor is ok then override state if we're still waiting for a valid time.
+        reported_bad_state = SensorBase.possible_states[reported_state] == 'bad'
+        waiting_for_time = self.wait_for_valid_time and self.utc_time == 0
+        if not reported_bad_state and waiting_for_time:
+            reported_state = 'waiting_for_time'
+
+        self.state = reported_state
+
     def close(self):
         '''Stop reading sensor data and close down any resources. Sensor must override.'''
         raise NotImplementedError
@@ -294,6 +430,15 @@ class SensorBase(object):
         '''Try to read in new data from sensor. This must not take longer than max_read_new_data_period. Sensor must override.'''
         raise NotImplementedError
 
+    def device_file_descriptor(self):
+        '''
+        Driver can override to return a file descriptor (e.g. serial port or socket) that's readable when the sensor
+        has new data.  Called once after setup().  If a descriptor is returned then run() waits on it and the
+        controller socket at the same time, and read_new_data() is only called when there's data waiting.
+        Note on Windows only socket descriptors can be polled.
+        '''
+        return None
+
     def setup(self):
         '''Called before collection loop starts. Driver can override to make connection to sensor.'''
         return
@@ -343,15 +488,69 @@ class SensorBase(object):
 
     def _send_message(self, message_type, message_body):
         '''Send message to controller.'''
+        if len(self._data_batch) > 0 and message_type != 'new_sensor_data_batch':
+            # Send any batched data first so the controller receives messages in the order they were created.
+            # For example, data handled before a pause needs to arrive before the new paused status.
+            self.flush_data_batch()
         self.controller_connection.send_message(message_type, message_body)
 
     def handle_data(self, utc_time, sys_time, data, data_ok=True):
         '''Send data to controller.  If data_ok is false then that indicates the data shouldn't be trusted or logged.'''
         self.last_received_data_time = self.sys_time
-        # Make sure data is sent as a tuple.
-        self._send_message('new_sensor_data', (utc_time, sys_time, data, data_ok))
+
+        if self.data_ring_buffer is not None and self._write_to_data_ring_buffer(utc_time, sys_time, data, data_ok):
+            return
+
+        if self.max_data_batch_size <= 1:
+            # Make sure data is sent as a tuple.
+            self._send_message('new_sensor_data', (utc_time, sys_time, data, data_ok))
+            self.num_data_messages_sent += 1
+            return
+
+        if len(self._data_batch) == 0:
+            self._data_batch_start_time = self.last_received_data_time
+
+        self._data_batch.append((utc_time, sys_time, data, data_ok))
+
+        if len(self._data_batch) >= self.max_data_batch_size or self._data_batch_expired():
+            self.flush_data_batch()
+
+    def flush_data_batch(self):
+        '''Send all batched data samples to controller in a single message.'''
+        if len(self._data_batch) == 0:
+            return
+
+        data_batch = self._data_batch
+        self._data_batch = []
+
+        # Include when batch was sent so the controller can measure latency without the time samples spent waiting.
+        self._send_message('new_sensor_data_batch', (data_batch, self.sys_time))
+        self.num_data_messages_sent += len(data_batch)
+
+    def _write_to_data_ring_buffer(self, utc_time, sys_time, data, data_ok):
+        '''
+        Try to pass data sample to controller through the data ring buffer. Return false if the sample
+        doesn't fit the record layout (e.g. a value is None) so it needs to be sent as a message instead.
+        '''
+        try:
+            written = self.data_ring_buffer.write(utc_time, sys_time, data, data_ok)
+        except ValueError:
+            return False
+
+        if not written:
+            if self.num_data_samples_dropped == 0:
+                self.send_text("Controller isn't keeping up with data so some samples are being dropped.")
+            self.num_data_samples_dropped += 1
+            return True
+
         self.num_data_messages_sent += 1
 
+        if self.data_ring_buffer.claim_notification():
+            # Controller may be waiting for messages so let it know there's data to read.
+            self._send_message('new_sensor_data_ready', '')
+
+        return True
+
     def handle_command(self, connection, command_name, command_args):
         '''
         Deal with a new command (e.g. 'close') received from controller.
@@ -389,6 +588,29 @@ class SensorBase(object):
         # Allow driver a chance to deal with setting.
         self.driver_handle_new_setting(setting_name, setting_value)
 
+    def _record_loop_iteration(self, iteration_start_time, loop_lag, num_messages):
+        '''Add main loop iteration to loop monitor and periodically let controller know if the loop is lagging.'''
+
+        current_time = self.sys_time
+        self.loop_monitor.record_iteration(current_time - iteration_start_time, max(0, loop_lag), num_messages, current_time)
+
+        if current_time < self._next_loop_lag_check_time:
+            return
+
+        self._next_loop_lag_check_time = current_time + self.loop_lag_check_period
+
+        was_lagging = self.loop_monitor.lagging
+        max_lag = self.loop_monitor.check_lag()
+        if self.loop_monitor.lagging or was_lagging:
+            # Keep sending while lagging so the controller's issue has the latest numbers.
+            self.send_event('loop_lag', (self.loop_monitor.lagging, max_lag, self.loop_monitor.public_info(current_time)))
+
+    def _data_batch_expired(self):
+        '''Return true if the oldest sample in the current data batch has been waiting too long to be sent.'''
+        if len(self._data_batch) == 0:
+            return False
+        return (self.sys_time - self._data_batch_start_time) >= self.max_data_batch_age
+
     def _need_to_run_processing_loop(self):
         '''Return true if it's time to run interface processing loop.'''
         return self.sys_time >= self.next_processing_loop_start_time
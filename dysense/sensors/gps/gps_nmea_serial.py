@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import os
 import serial
 
 from dysense.sensors.gps.gps_nmea import GpsNmea
@@ -32,10 +33,12 @@ class GpsNmeaSerial(GpsNmea):
             self.required_fix = make_unicode(settings['required_fix'])
             self.required_latlon_error = float(settings['required_error'])
             self.min_sats = int(settings['min_sats'])
+            # Older sensor configs don't have compression setting.
+            self.raw_compression = make_unicode(settings.get('compression', 'none'))
         except (KeyError, ValueError, ZeroDivisionError) as e:
             raise ValueError("Bad sensor setting.  Exception {}".format(e))
 
-        GpsNmea.__init__(self, self.required_fix, self.required_latlon_error, self.min_sats,
+        GpsNmea.__init__(self, self.required_fix, self.required_latlon_error, self.min_sats, raw_compression=self.raw_compression,
                          sensor_id=sensor_id, instrument_id=instrument_id,
                          context=context, connect_endpoint=connect_endpoint,
                          throttle_sensor_read=False)
@@ -69,6 +72,12 @@ class GpsNmeaSerial(GpsNmea):
                                         timeout=read_timeout,
                                         writeTimeout=2)
 
+    def device_file_descriptor(self):
+        '''Serial port can be polled directly on posix systems, so don't need to wait in readline() between messages.'''
+        if os.name == 'posix':
+            return self.connection.fileno()
+        return None
+
     def read_new_data(self):
         '''Read in new data from sensor.'''
 
@@ -9,6 +9,7 @@ from dysense.sensors.gps.nmea_parser import parse_nmea_sentence
 from dysense.sensors.gps.checksum_utils import check_nmea_checksum
 from dysense.sensor_base.sensor_base import SensorBase
 from dysense.core.utility import utf_8_encoder
+from dysense.core.compressed_file import open_output_file, compressed_file_path, is_compressed
 
 rad2deg = 180.0 / math.pi
 deg2rad = math.pi / 180.0
@@ -18,7 +19,7 @@ yaw_offset = 90 * deg2rad
 
 class GpsTrimble(SensorBase):
 
-    def __init__(self, required_fix, min_sats, **kargs):
+    def __init__(self, required_fix, min_sats, raw_compression='none', **kargs):
         SensorBase.__init__(self, wait_for_valid_time=False, **kargs)
 
         # Fix types reported by GGK message.
@@ -88,6 +89,9 @@ class GpsTrimble(SensorBase):
         # File that's kept open to write NMEA strings to.
         self.raw_nmea_out_file = None
 
+        # How raw NMEA file is compressed ('none', 'gzip' or 'zstd'). Takes effect next time file is opened.
+        self.raw_compression = raw_compression
+
         # Keep track if data file directory changes (for example when session starts) so we can create it if we need to write files to it.
         self.last_data_file_directory = None
 
@@ -312,6 +316,9 @@ class GpsTrimble(SensorBase):
     def driver_handle_new_setting(self, setting_name, setting_value):
         '''Update settings to match new output data file directory.'''
 
+        if setting_name == 'compression':
+            self.raw_compression = setting_value
+
         if setting_name == 'data_file_directory':
             output_directory = setting_value
 
@@ -330,7 +337,12 @@ class GpsTrimble(SensorBase):
                 self.close_open_files()
 
                 raw_nmea_out_file_path = os.path.join(output_directory, 'raw_nmea_output.txt')
-                self.raw_nmea_out_file = open(raw_nmea_out_file_path, 'w')
+                if is_compressed(self.raw_compression):
+                    # Compressed in blocks so a crash only loses the last couple seconds of messages.
+                    raw_nmea_out_file_path = compressed_file_path(raw_nmea_out_file_path, self.raw_compression)
+                    self.raw_nmea_out_file = open_output_file(raw_nmea_out_file_path, self.raw_compression)
+                else:
+                    self.raw_nmea_out_file = open(raw_nmea_out_file_path, 'w')
 
     def _write_raw_string_to_file(self, nmea_string):
 
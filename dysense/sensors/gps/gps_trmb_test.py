@@ -18,12 +18,14 @@ class GpsTrimbleTest(GpsTrimble):
             self.output_rate = make_unicode(settings['output_rate'])
             self.required_fix = make_unicode(settings['required_fix'])
             self.min_sats = int(settings['min_sats'])
+            # Older sensor configs don't have compression setting.
+            self.raw_compression = make_unicode(settings.get('compression', 'none'))
             self.output_rate = float(settings['output_rate'])
             self.output_period = 1.0 / self.output_rate
         except (KeyError, ValueError, ZeroDivisionError) as e:
             raise ValueError("Bad sensor setting.  Exception {}".format(repr(e)))
 
-        GpsTrimble.__init__(self, self.required_fix, self.min_sats,
+        GpsTrimble.__init__(self, self.required_fix, self.min_sats, raw_compression=self.raw_compression,
                             sensor_id=sensor_id, instrument_id=instrument_id,
                             context=context, connect_endpoint=connect_endpoint)
 
@@ -2,9 +2,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import argparse
+
 from dysense.core.dysense_main import dysense_main
+from dysense.interfaces.message_codec import preferred_codec_names
 
 if __name__ == '__main__':
 
-    # TODO take command line arguments
-    dysense_main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Run DySense.')
+    parser.add_argument('--msgpack', action='store_true',
+                        help='Encode messages with msgpack (if installed) when the other component supports it.')
+    args = parser.parse_args()
+
+    dysense_main(message_codecs=preferred_codec_names() if args.msgpack else None)
\ No newline at end of file
@@ -27,4 +27,7 @@ if __name__ == "__main__":
               'numpy'
 			  #'pyqt4' PyQt needs to be installed separately
           ],
+          extras_require={
+              'msgpack': ['msgpack>=0.5.2'], # optional binary message codec
+          },
           zip_safe=False)
\ No newline at end of file
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.core.change_tracker import ChangeTracker
+
+class TestChangeTracker(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tracker = ChangeTracker()
+
+    def test_sensor_changes_coalesced(self):
+
+        self.tracker.mark_sensor_changed('gps', 'sensor_state', 'setup')
+        self.tracker.mark_sensor_changed('lidar', 'sensor_state', 'normal')
+        self.tracker.mark_sensor_changed('gps', 'sensor_state', 'normal')
+        self.tracker.mark_sensor_changed('gps', 'sensor_paused', False)
+
+        self.assertEqual(self.tracker.pop_sensor_changes(), [('gps', {'sensor_state': 'normal', 'sensor_paused': False}),
+                                                             ('lidar', {'sensor_state': 'normal'})])
+        self.assertEqual(self.tracker.pop_sensor_changes(), [])
+
+    def test_forget_sensor(self):
+
+        self.tracker.mark_sensor_changed('gps', 'sensor_state', 'setup')
+        self.tracker.forget_sensor('gps')
+
+        self.assertEqual(self.tracker.pop_sensor_changes(), [])
+
+    def test_controller_changes(self):
+
+        settings = {'operator_name': 'a'}
+        info = {'id': 'ctrl', 'session_state': 'closed', 'settings': settings}
+
+        self.tracker.mark_controller_changed()
+        self.assertTrue(self.tracker.controller_changed)
+        self.assertEqual(self.tracker.pop_controller_changes(info), info)
+        self.assertFalse(self.tracker.controller_changed)
+
+        self.assertIsNone(self.tracker.pop_controller_changes(info))
+
+        # Mutating a dictionary value is still detected.
+        settings['operator_name'] = 'b'
+        self.assertEqual(self.tracker.pop_controller_changes(info), {'id': 'ctrl', 'settings': {'operator_name': 'b'}})
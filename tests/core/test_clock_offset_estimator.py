@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.core.clock_offset_estimator import ClockOffsetEstimator
+
+class TestClockOffsetEstimator(unittest.TestCase):
+
+    def setUp(self):
+
+        self.estimator = ClockOffsetEstimator(bin_duration=0.5, window_duration=30, min_fit_duration=5)
+
+    def test_ignores_delayed_samples(self):
+
+        # True offset is 100 seconds but every other sample is delayed by 50 ms.
+        for i in range(20):
+            sys_time = 1000.0 + i * 0.25
+            delay = 0.05 if i % 2 else 0.0
+            self.estimator.add_sample(sys_time + 100.0 - delay, sys_time)
+
+        self.assertAlmostEqual(self.estimator.offset_at(1005.0), 100.0, places=6)
+        self.assertAlmostEqual(self.estimator.utc_time_at(1006.0), 1106.0, places=6)
+
+    def test_drift(self):
+
+        # Offset grows by 50 microseconds every second.
+        for i in range(20):
+            sys_time = 1000.0 + i
+            self.estimator.add_sample(sys_time + 100.0 + i * 50e-6, sys_time)
+
+        self.assertAlmostEqual(self.estimator.drift, 50e-6, places=9)
+        self.assertAlmostEqual(self.estimator.offset_at(1030.0), 100.0 + 30 * 50e-6, places=6)
+
+    def test_reset_on_jump(self):
+
+        self.estimator.add_sample(1100.0, 1000.0)
+        self.estimator.add_sample(1101.0, 1001.0)
+        self.estimator.add_sample(1502.0, 1002.0)
+
+        self.assertEqual(self.estimator.num_samples, 1)
+        self.assertAlmostEqual(self.estimator.offset_at(1002.0), 500.0)
+
+    def test_update_due(self):
+
+        self.assertFalse(self.estimator.update_due(1000.0))
+
+        self.estimator.add_sample(1100.0, 1000.0)
+        self.assertTrue(self.estimator.update_due(1000.0))
+        self.estimator.mark_published(1000.0)
+
+        # Same estimate so it's not sent again until the update period.
+        self.estimator.add_sample(1101.0, 1001.0)
+        self.assertFalse(self.estimator.update_due(1001.0))
+        self.assertTrue(self.estimator.update_due(1000.0 + self.estimator.update_period))
+
+        # Estimate changed meaningfully.
+        self.estimator.add_sample(1101.51, 1001.5)
+        self.assertTrue(self.estimator.update_due(1001.5))
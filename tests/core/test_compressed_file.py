@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from dysense.core.compressed_file import (zstandard, compressed_file_path, open_output_file, detect_compression,
+                                          read_compressed_file, open_log_file)
+from dysense.core.csv_log import CSVLog
+from dysense.processing.output_versions.dysense_output_v2 import SessionOutputV2, read_sensor_log_file
+
+class TestCompressedFile(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.blocks = [b''.join(b'$GPGGA,block{},line{}\n'.format(i, j) for j in range(50)) for i in range(3)]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def write_blocks(self, compression):
+
+        file_path = compressed_file_path(os.path.join(self.directory, 'raw_nmea_output.txt'), compression)
+        compressed_file = open_output_file(file_path, compression)
+        for block in self.blocks:
+            compressed_file.write(block)
+            compressed_file.flush()
+        compressed_file.close()
+
+        return file_path
+
+    def check_round_trip(self, compression):
+
+        file_path = self.write_blocks(compression)
+
+        self.assertEqual(detect_compression(file_path), compression)
+        self.assertEqual(read_compressed_file(file_path), b''.join(self.blocks))
+        self.assertLess(os.path.getsize(file_path), len(b''.join(self.blocks)))
+
+        # Last block is cut off like the program crashed while writing it.
+        with open(file_path, 'rb') as compressed_file:
+            data = compressed_file.read()
+        with open(file_path, 'wb') as compressed_file:
+            compressed_file.write(data[:-10])
+
+        self.assertEqual(read_compressed_file(file_path), b''.join(self.blocks[:-1]))
+
+    def test_gzip(self):
+
+        file_path = self.write_blocks('gzip')
+
+        # Should be readable by standard tools.
+        self.assertTrue(file_path.endswith('.gz'))
+        self.assertEqual(gzip.open(file_path).read(), b''.join(self.blocks))
+
+        self.check_round_trip('gzip')
+
+    @unittest.skipIf(zstandard is None, 'zstandard package not installed')
+    def test_zstd(self):
+
+        self.check_round_trip('zstd')
+
+    def test_not_compressed(self):
+
+        file_path = self.write_blocks('none')
+        self.assertEqual(detect_compression(file_path), 'none')
+        self.assertEqual(open_log_file(file_path).read(), b''.join(self.blocks))
+
+    def test_compressed_csv_log(self):
+
+        log_path = compressed_file_path(os.path.join(self.directory, 'imu.csv'), 'gzip')
+        csv_log = CSVLog(log_path, 1, compression='gzip')
+        csv_log.handle_metadata(['utc_time', 'roll'])
+        for i in range(20):
+            csv_log.write([1000.5 + i, i * 0.25])
+        csv_log.terminate()
+
+        log_data = read_sensor_log_file(log_path, ['float'])
+        self.assertEqual([(data_entry['time'], data_entry['data']) for data_entry in log_data],
+                         [(1000.5 + i, [i * 0.25]) for i in range(20)])
+
+        self.assertRaises(ValueError, CSVLog, log_path, 1, index_interval=10, compression='gzip')
+
+    def test_find_session_logs(self):
+
+        logs_directory = os.path.join(self.directory, 'data_logs')
+        os.makedirs(logs_directory)
+        os.makedirs(os.path.join(self.directory, 'sensor_info'))
+        with open(os.path.join(self.directory, 'source_info.yaml'), 'w') as source_file:
+            source_file.write('{}')
+
+        # Time index next to uncompressed log shouldn't be mistaken for another log.
+        for file_name in ['gps_test_1_20161017.csv', 'gps_test_1_20161017.csv.idx', 'imu_test_1_20161017.csv.gz']:
+            open(os.path.join(logs_directory, file_name), 'wb').close()
+
+        session = SessionOutputV2(self.directory, '2.0.0')
+        gps_info = {'sensor_id': 'gps', 'instrument_type': 'test', 'instrument_tag': '1'}
+        imu_info = {'sensor_id': 'imu', 'instrument_type': 'test', 'instrument_tag': '1'}
+
+        self.assertEqual(session._find_sensor_log(gps_info), ('gps_test_1_20161017.csv', None))
+        self.assertEqual(session._find_sensor_log(imu_info), ('imu_test_1_20161017.csv.gz', None))
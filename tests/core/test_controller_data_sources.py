@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.core.controller_data_sources import DataSourceTable, TimeDataSource, HeightDataSource
+
+class TestDataSourceTable(unittest.TestCase):
+
+    def setUp(self):
+
+        self.table = DataSourceTable()
+
+        self.time_source = TimeDataSource(None, sensor_id='gps', controller_id='ctrl')
+        self.height_sources = [HeightDataSource(None, sensor_id='gps', controller_id='ctrl'),
+                               HeightDataSource(None, sensor_id='lidar', controller_id='ctrl')]
+
+        self.table.rebuild([('time', [self.time_source]), ('height', self.height_sources)])
+
+    def test_multiple_roles(self):
+
+        roles = self.table.lookup('gps', 'ctrl')
+        self.assertEqual(roles, (('time', self.time_source), ('height', self.height_sources[0])))
+
+    def test_not_a_source(self):
+
+        self.assertEqual(self.table.lookup('camera', 'ctrl'), ())
+        self.assertEqual(self.table.lookup('lidar', 'other_ctrl'), ())
+
+    def test_rebuild_without_sources(self):
+
+        self.table.rebuild([('time', [None]), ('height', [])])
+        self.assertEqual(self.table.lookup('gps', 'ctrl'), ())
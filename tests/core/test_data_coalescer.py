@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.core.data_coalescer import LatestValueCoalescer
+
+class TestLatestValueCoalescer(unittest.TestCase):
+
+    def setUp(self):
+
+        self.coalescer = LatestValueCoalescer(max_rate=10)
+
+    def test_first_value_emitted_right_away(self):
+
+        self.coalescer.add('sensor_1', 1)
+        self.assertEqual(self.coalescer.pop_ready(100.0), [('sensor_1', 1, 0)])
+        self.assertEqual(self.coalescer.pop_ready(100.0), [])
+
+    def test_newest_value_kept_during_rate_limit(self):
+
+        self.coalescer.add('sensor_1', 1)
+        self.coalescer.pop_ready(100.0)
+
+        for value in [2, 3, 4]:
+            self.coalescer.add('sensor_1', value)
+
+        self.assertEqual(self.coalescer.pop_ready(100.05), [])
+        self.assertEqual(self.coalescer.pop_ready(100.1), [('sensor_1', 4, 2)])
+        self.assertEqual(self.coalescer.key_to_total_coalesced['sensor_1'], 2)
+
+    def test_keys_limited_separately(self):
+
+        self.coalescer.add('sensor_1', 1)
+        self.coalescer.pop_ready(100.0)
+        self.coalescer.add('sensor_1', 2)
+        self.coalescer.add('sensor_2', 5)
+
+        self.assertEqual(self.coalescer.pop_ready(100.01), [('sensor_2', 5, 0)])
+
+    def test_next_emit_time(self):
+
+        self.assertIsNone(self.coalescer.next_emit_time())
+
+        self.coalescer.add('sensor_1', 1)
+        self.coalescer.pop_ready(100.0)
+        self.coalescer.add('sensor_1', 2)
+
+        self.assertAlmostEqual(self.coalescer.next_emit_time(), 100.1)
+
+    def test_discard(self):
+
+        self.coalescer.add('sensor_1', 1)
+        self.coalescer.add('sensor_1', 2)
+        self.coalescer.discard(lambda key: key == 'sensor_1')
+
+        self.assertEqual(self.coalescer.pop_ready(100.0), [])
+        self.assertNotIn('sensor_1', self.coalescer.key_to_total_coalesced)
+
+if __name__ == '__main__':
+
+    unittest.main()
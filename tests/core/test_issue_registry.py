@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.core.issue import Issue
+from dysense.core.issue_registry import IssueRegistry
+
+class TestIssueRegistry(unittest.TestCase):
+
+    def setUp(self):
+
+        self.registry = IssueRegistry()
+        self.issue = Issue(id='ctrl', sub_id='gps', type='lost_time_source', level='error')
+        self.registry.add(self.issue)
+
+    def test_find(self):
+
+        self.assertIs(self.registry.find('ctrl', 'gps', 'lost_time_source'), self.issue)
+        self.assertIsNone(self.registry.find('ctrl', 'gps', 'unhealthy_sensor'))
+        self.assertRaises(ValueError, self.registry.add, Issue(id='ctrl', sub_id='gps', type='lost_time_source'))
+
+    def test_level_counts(self):
+
+        self.assertTrue(self.registry.has_level('error'))
+        self.assertFalse(self.registry.has_level('critical'))
+
+        self.assertTrue(self.registry.change_level(self.issue, 'critical'))
+        self.assertFalse(self.registry.change_level(self.issue, 'critical'))
+        self.assertEqual(self.registry.count('critical'), 1)
+        self.assertEqual(self.registry.count('error'), 0)
+
+    def test_resolve_expired(self):
+
+        self.registry.expire(self.issue)
+        self.assertEqual(self.registry.resolve_expired(), []) # not expired yet
+
+        self.registry.renew(self.issue)
+        self.registry.expire_all_for('ctrl', 'gps', force_expire=True)
+
+        self.assertEqual(self.registry.resolve_expired(), [self.issue])
+        self.assertEqual(len(self.registry), 0)
+        self.assertEqual(self.registry.resolved_issues, [self.issue])
+        self.assertFalse(self.registry.has_level('error'))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from dysense.core.csv_log import CSVLog
+from dysense.core.log_writer import LogWriter
+
+class TestLogWriter(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.writer = LogWriter(flush_interval=0.05)
+        self.writer.start()
+
+    def tearDown(self):
+
+        if self.writer.is_alive():
+            self.writer.stop()
+        shutil.rmtree(self.directory)
+
+    def test_writes_and_closes_logs(self):
+
+        log_paths = [os.path.join(self.directory, name) for name in ['a.csv', 'b.csv']]
+        logs = [CSVLog(path, 1, log_writer=self.writer) for path in log_paths]
+
+        for log in logs:
+            log.handle_metadata(['utc_time', 'value'])
+
+        for i in range(100):
+            for log in logs:
+                log.write([1000.5 + i, i])
+
+        for log in logs:
+            log.terminate()
+
+        self.writer.stop()
+
+        for path in log_paths:
+            with open(path, 'rb') as log_file:
+                lines = log_file.read().splitlines()
+            self.assertEqual(len(lines), 101)
+            self.assertEqual(lines[0], b'#utc_time,value')
+            self.assertEqual(lines[-1], b'1099.5,99')
+
+        stats = self.writer.public_stats()
+        self.assertEqual(stats['rows_written'], 200)
+        self.assertEqual(stats['rows_dropped'], 0)
+        self.assertGreater(stats['write_latency']['count'], 0)
+
+    def test_write_error_counts_as_dropped(self):
+
+        log = CSVLog(os.path.join(self.directory, 'missing_directory', 'a.csv'), 1, log_writer=self.writer)
+        log.write([1, 2])
+        log.terminate()
+        self.writer.stop()
+
+        num_dropped, _, _ = self.writer.check_health()
+        self.assertEqual(num_dropped, 1)
+        self.assertIsNotNone(self.writer.last_error)
+
+    def test_submit_never_waits_when_full(self):
+
+        # Writer that's never started so the queue can't drain, like a stalled disk.
+        stalled_writer = LogWriter(max_queue_size=10)
+        log = CSVLog(os.path.join(self.directory, 'a.csv'), 1, log_writer=stalled_writer)
+
+        start_time = time.time()
+        results = [stalled_writer.submit(log, [1000.5 + i, i]) for i in range(1000)]
+        submit_duration = time.time() - start_time
+
+        self.assertLess(submit_duration, 0.5)
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(stalled_writer.public_stats()['rows_dropped'], 990)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import functools
+
+import yaml
+
+from dysense.core.binary_log import BinaryLog
+from dysense.core.csv_log import CSVLog
+from dysense.core.log_writer import LogWriter
+from dysense.core.segmented_log import SegmentedLog, read_segment_manifest, segment_manifest_path
+from dysense.processing.output_versions.dysense_output_v2 import SessionOutputV2
+from tests.log_test_case import LogTestCase
+
+class TestSegmentedLog(LogTestCase):
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+
+        self.logs_directory = os.path.join(self.directory, 'data_logs')
+        os.makedirs(self.logs_directory)
+        self.base_path = os.path.join(self.logs_directory, 'gps_test_1_20161017')
+
+    def write_segmented_log(self, extension, create_segment, log_writer=None, **kwargs):
+        '''Write samples to new segmented log and return its manifest.'''
+
+        self.write_log(SegmentedLog(self.base_path, extension, create_segment, log_writer=log_writer, **kwargs), log_writer)
+
+        return read_segment_manifest(segment_manifest_path(self.base_path))
+
+    def test_rotate_by_duration(self):
+
+        manifest = self.write_segmented_log('.csv', functools.partial(CSVLog, buffer_size=0), max_segment_duration=29)
+
+        self.assertTrue(manifest['complete'])
+        self.assertEqual([segment['num_rows'] for segment in manifest['segments']], [30, 30, 30, 10])
+        self.assertEqual(manifest['segments'][1]['start_utc'], 1030.5)
+        self.assertEqual(manifest['segments'][1]['end_utc'], 1059.5)
+        self.assertTrue(all(segment['closed'] for segment in manifest['segments']))
+
+        # Every segment should have column names at the top.
+        for segment in manifest['segments']:
+            with open(os.path.join(self.logs_directory, segment['file_name']), 'rb') as segment_file:
+                self.assertEqual(segment_file.readline().strip(), b'#utc_time,latitude,count')
+
+    def test_rotate_by_size(self):
+
+        create_segment = functools.partial(BinaryLog, data_metadata=self.data_metadata)
+        log_writer = LogWriter()
+        log_writer.start()
+        manifest = self.write_segmented_log('.dlog', create_segment, log_writer, max_segment_size=1000)
+
+        self.assertGreater(len(manifest['segments']), 1)
+        self.assertEqual(sum(segment['num_rows'] for segment in manifest['segments']), len(self.samples))
+
+    def test_read_segmented_session(self):
+
+        self.write_segmented_log('.csv', functools.partial(CSVLog, buffer_size=0, index_interval=10), max_segment_duration=29)
+
+        # Leave last segment open like the session is still running.
+        manifest_path = segment_manifest_path(self.base_path)
+        manifest = read_segment_manifest(manifest_path)
+        manifest['complete'] = False
+        manifest['segments'][-1]['closed'] = False
+        with open(manifest_path, 'w') as manifest_file:
+            manifest_file.write(yaml.safe_dump(manifest))
+
+        os.makedirs(os.path.join(self.directory, 'sensor_info'))
+        with open(os.path.join(self.directory, 'source_info.yaml'), 'w') as source_file:
+            source_file.write('{}')
+
+        session = SessionOutputV2(self.directory, '2.0.0', num_reader_processes=2)
+        sensor_info = {'sensor_id': 'gps', 'instrument_type': 'test', 'instrument_tag': '1', 'controller_id': 'c',
+                       'metadata': {'data': self.data_metadata}}
+
+        segments = session.log_segments(sensor_info)
+        self.assertEqual([segment['closed'] for segment in segments], [True, True, True, False])
+
+        sensor_log_data, log_file_name = session._read_sensor_log_data(sensor_info)
+        self.assertEqual(log_file_name, os.path.basename(manifest_path))
+        self.assertEqual([[data_entry['time']] + data_entry['data'] for data_entry in sensor_log_data], self.samples)
+
+        window_data = session.read_sensor_log_window(sensor_info, 1025.5, 1034.5)
+        self.assertEqual([data_entry['time'] for data_entry in window_data], [1025.5 + i for i in range(10)])
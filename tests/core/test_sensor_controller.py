@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import zmq
+
+from dysense.core.binary_log import BinaryLog
+from dysense.core.csv_log import CSVLog
+from dysense.core.sensor_controller import SensorController
+from dysense.interfaces.server_interface import ServerInterface
+
+class FakeSensor(object):
+    '''Minimal sensor connection that logs to a CSV file.'''
+
+    def __init__(self, sensor_id, log_path):
+        self.sensor_id = sensor_id
+        self.sensor_paused = False
+        self.output_file = CSVLog(log_path, 0)
+
+class TestSensorDataBatch(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+
+        context = zmq.Context()
+        sensor_interface = ServerInterface(context, 'controller', 'c2s_controller_batch', '1.0.0')
+        manager_interface = ServerInterface(context, 'controller', 'c2m_controller_batch', '1.0.0')
+        metadata = {'sensors': {}}
+
+        self.controller = SensorController(context, metadata, 'controller_1', sensor_interface, manager_interface)
+        self.controller.session.state = 'started'
+
+        # utc_time, sys_time, data, data_ok
+        self.samples = [(1476700000.123456 + i * 0.01, 1000.5 + i * 0.01, [i, 35.25 + i, 'ok'], i != 3) for i in range(10)]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def test_batch_logged_like_single_samples(self):
+
+        single_sensor = FakeSensor('single', os.path.join(self.directory, 'single.csv'))
+        batch_sensor = FakeSensor('batch', os.path.join(self.directory, 'batch.csv'))
+
+        for utc_time, sys_time, data, data_ok in self.samples:
+            self.controller.handle_new_sensor_data(single_sensor, utc_time, sys_time, list(data), data_ok)
+
+        data_batch = [[utc_time, sys_time, list(data), data_ok] for utc_time, sys_time, data, data_ok in self.samples]
+        self.controller.handle_new_sensor_data_batch(batch_sensor, data_batch)
+
+        # Latency is recorded once for each message, not for every sample in the batch.
+        latency_sensor = FakeSensor('latency', os.path.join(self.directory, 'latency.csv'))
+        self.controller.handle_new_sensor_data_batch(latency_sensor, data_batch[:2], time.time())
+        latency_info = self.controller.loop_monitor.public_info()['message_latency']
+        self.assertEqual(latency_info['count'], len(self.samples) + 1)
+        latency_sensor.output_file.close()
+
+        single_sensor.output_file.close()
+        batch_sensor.output_file.close()
+
+        with open(single_sensor.output_file.file_path, 'rb') as single_file:
+            single_lines = single_file.read().splitlines()
+        with open(batch_sensor.output_file.file_path, 'rb') as batch_file:
+            batch_lines = batch_file.read().splitlines()
+
+        self.assertEqual(batch_lines, single_lines)
+
+        # Every sample's own time should be logged (except the one that wasn't ok).
+        logged_times = [float(line.split(b',')[0]) for line in batch_lines]
+        self.assertEqual(logged_times, [utc_time for utc_time, _, _, data_ok in self.samples if data_ok])
+
+class TestDataSourceIssues(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        context = zmq.Context()
+        sensor_interface = ServerInterface(context, 'controller', 'c2s_data_source_issues', '1.0.0')
+        manager_interface = ServerInterface(context, 'controller', 'c2m_data_source_issues', '1.0.0')
+
+        self.controller = SensorController(context, {'sensors': {}}, 'controller_1', sensor_interface, manager_interface)
+        self.controller.session.state = 'started'
+
+        self.sensor = FakeSensor('gps', os.path.join(self.directory, 'gps.csv'))
+        self.sensor.output_file = BinaryLog(os.path.join(self.directory, 'gps.dlog'), [{'name': 'count', 'type': 'int'}])
+
+        # Issues for data sources are normally critical.
+        self.controller.time_source = {'sensor_id': 'gps', 'controller_id': self.controller.controller_id}
+
+    def test_issue_resolved_by_valid_data(self):
+
+        for _ in range(2):
+            self.controller.handle_new_sensor_data(self.sensor, 1476700000.5, 0, ['not a number'], True)
+
+        issue = self.controller.issues.find(self.controller.controller_id, 'gps', 'invalid_log_data')
+        self.assertEqual(issue.level, 'error')
+        self.assertFalse(self.controller.issues.has_level('critical'))
+        self.assertEqual(issue.expiration_time, 0)
+
+        self.controller.handle_new_sensor_data(self.sensor, 1476700001.5, 0, [5], True)
+        self.assertGreater(issue.expiration_time, 0)
+
+    def test_loop_lag_not_critical(self):
+
+        loop_info = {'iteration_time': {'p99': 0.7}}
+        self.controller.handle_new_sensor_event(self.sensor, 'loop_lag', (True, 0.6, loop_info))
+
+        issue = self.controller.issues.find(self.controller.controller_id, 'gps', 'sensor_loop_lag')
+        self.assertEqual(issue.level, 'warning')
+        self.assertFalse(self.controller.issues.has_level('critical'))
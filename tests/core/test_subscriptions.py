@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.core.subscriptions import SubscriptionTable
+
+class TestSubscriptionTable(unittest.TestCase):
+
+    def setUp(self):
+
+        self.table = SubscriptionTable()
+        self.manager_ids = ['manager_1', 'manager_2']
+
+    def test_no_subscriptions_receives_nothing(self):
+
+        recipients = self.table.recipients(self.manager_ids, 'sensor_1', 'new_sensor_data', 0)
+        self.assertEqual(recipients, [])
+
+    def test_only_subscribed_sensor(self):
+
+        self.table.subscribe('manager_1', 'sensor_1', 'new_sensor_data')
+        self.table.subscribe('manager_2', 'sensor_2', 'new_sensor_data')
+
+        self.assertEqual(self.table.recipients(self.manager_ids, 'sensor_1', 'new_sensor_data', 0), ['manager_1'])
+        self.assertEqual(self.table.recipients(self.manager_ids, 'sensor_2', 'new_sensor_data', 0), ['manager_2'])
+        self.assertEqual(self.table.recipients(self.manager_ids, 'sensor_1', 'new_source_data', 0), [])
+
+    def test_all_sensors(self):
+
+        self.table.subscribe('manager_1', 'all', 'new_sensor_data')
+
+        self.assertEqual(self.table.recipients(['manager_1'], 'sensor_1', 'new_sensor_data', 0), ['manager_1'])
+        self.assertEqual(self.table.recipients(['manager_1'], 'sensor_2', 'new_sensor_data', 0), ['manager_1'])
+
+    def test_max_rate(self):
+
+        self.table.subscribe('manager_1', 'sensor_1', 'new_sensor_data', max_rate=10)
+
+        self.assertEqual(self.table.recipients(['manager_1'], 'sensor_1', 'new_sensor_data', 100.0), ['manager_1'])
+        self.assertEqual(self.table.recipients(['manager_1'], 'sensor_1', 'new_sensor_data', 100.05), [])
+        self.assertEqual(self.table.recipients(['manager_1'], 'sensor_1', 'new_sensor_data', 100.1), ['manager_1'])
+
+    def test_unsubscribe(self):
+
+        self.table.subscribe('manager_1', 'sensor_1', 'new_sensor_data')
+        self.table.unsubscribe('manager_1', 'sensor_1', 'new_sensor_data')
+
+        self.assertEqual(self.table.recipients(['manager_1'], 'sensor_1', 'new_sensor_data', 0), [])
+
+        self.table.subscribe('manager_1', 'sensor_1', 'new_sensor_data')
+        self.table.remove_subscriber('manager_1')
+        self.assertEqual(self.table.recipients(['manager_1'], 'sensor_1', 'new_sensor_data', 0), [])
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.core.text_message_ring import TextMessageRing
+
+class TestTextMessageRing(unittest.TestCase):
+
+    def test_drops_oldest(self):
+
+        ring = TextMessageRing(capacity=3, snapshot_size=2)
+        for i in range(5):
+            ring.add('m{}'.format(i))
+
+        self.assertEqual(list(ring), ['m2', 'm3', 'm4'])
+        self.assertEqual(ring.snapshot(), ['m3', 'm4'])
+
+    def test_rate_limit(self):
+
+        ring = TextMessageRing(max_rate=1, burst_size=2)
+
+        self.assertEqual(ring.add('a', current_time=0), ['a'])
+        self.assertEqual(ring.add('b', current_time=0), ['b'])
+        self.assertEqual(ring.add('c', current_time=0), [])
+        self.assertEqual(ring.add('d', current_time=0.5), [])
+        self.assertEqual(ring.num_suppressed, 2)
+
+        # Summary is added along with the next message that's allowed.
+        self.assertEqual(ring.add('e', current_time=1.5), ['2 messages suppressed', 'e'])
+        self.assertEqual(ring.num_suppressed, 0)
+        self.assertEqual(ring.total_suppressed, 2)
+
+    def test_flush_suppressed(self):
+
+        ring = TextMessageRing(max_rate=1, burst_size=1)
+        ring.add('a', current_time=0)
+        ring.add('b', current_time=0)
+
+        self.assertIsNone(ring.flush_suppressed(current_time=0.1))
+        self.assertEqual(ring.flush_suppressed(current_time=2), '1 message suppressed')
+        self.assertIsNone(ring.flush_suppressed(current_time=5))
+        self.assertEqual(list(ring), ['a', '1 message suppressed'])
@@ -8,6 +8,8 @@ import time
 
 from dysense.interfaces.server_interface import ServerInterface
 from dysense.interfaces.client_interface import ClientInterface
+from dysense.interfaces.message_codec import available_codec_names
+from dysense.interfaces.deadline_scheduler import DeadlineScheduler
 
 class TestLocalConnection(unittest.TestCase):
 
@@ -296,6 +298,609 @@ class TestMultiServerConnection(unittest.TestCase):
     def callback_client_test_message(self, connection, arg1, arg2):
         self.num_messages_client_received += 1
 
+class TestCodecNegotiation(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+
+        self.server_received_args = []
+        self.client_received_args = []
+
+    def test_default_json(self):
+
+        server, client = self.connect('c2s_codec_1', server_codecs=['json'], client_codecs=['json'])
+
+        self.assertEqual(server.lookup_connection('test_client_1').codec.name, 'json')
+        self.assertEqual(client.lookup_connection('test_server_1').codec.name, 'json')
+
+        self.exchange_messages(server, client)
+
+    @unittest.skipIf('msgpack' not in available_codec_names(), 'msgpack not installed')
+    def test_msgpack(self):
+
+        server, client = self.connect('c2s_codec_2', server_codecs=['msgpack', 'json'], client_codecs=['msgpack', 'json'])
+
+        self.assertEqual(server.lookup_connection('test_client_1').codec.name, 'msgpack')
+        self.assertEqual(client.lookup_connection('test_server_1').codec.name, 'msgpack')
+
+        self.exchange_messages(server, client)
+
+    @unittest.skipIf('msgpack' not in available_codec_names(), 'msgpack not installed')
+    def test_json_only_component(self):
+
+        # Client doesn't offer msgpack (like an older driver) so server must fall back to JSON.
+        server, client = self.connect('c2s_codec_3', server_codecs=['msgpack', 'json'], client_codecs=['json'])
+
+        self.assertEqual(server.lookup_connection('test_client_1').codec.name, 'json')
+
+        self.exchange_messages(server, client)
+
+    def connect(self, local_name, server_codecs, client_codecs):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', local_name, version)
+        client = ClientInterface(context, 'test_client_1', version)
+        server.codecs = server_codecs
+        client.codecs = client_codecs
+
+        client.wire_locally_to(server)
+
+        server.register_callback('server_test_message', self.callback_server_test_message)
+        client.register_callback('client_test_message', self.callback_client_test_message)
+
+        server.setup()
+        client.setup()
+
+        server.process_new_messages()
+        client.process_new_messages()
+
+        self.addCleanup(server.close)
+        self.addCleanup(client.close)
+
+        return server, client
+
+    def exchange_messages(self, server, client):
+
+        client.send_message('test_server_1', 'server_test_message', ['arg1', 1.5])
+        server.process_new_messages()
+        self.assertEqual(self.server_received_args, [['arg1', 1.5]])
+
+        server.send_message('test_client_1', 'client_test_message', ('arg1', {'key': 'val'}))
+        client.process_new_messages()
+        self.assertEqual(self.client_received_args, [['arg1', {'key': 'val'}]])
+
+    def callback_server_test_message(self, connection, arg1, arg2):
+        self.server_received_args.append([arg1, arg2])
+
+    def callback_client_test_message(self, connection, arg1, arg2):
+        self.client_received_args.append([arg1, arg2])
+
+class TestClientDrainLimit(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+
+        self.server_ids_received_from = []
+
+    def test_fair_drain(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server1 = ServerInterface(context, 'test_server_1', 'c2s_drain_1', version)
+        server2 = ServerInterface(context, 'test_server_2', 'c2s_drain_2', version)
+        client = ClientInterface(context, 'test_client_1', version)
+
+        client.register_callback('client_test_message', self.callback_client_test_message)
+
+        server1.setup()
+        server2.setup()
+        client.setup()
+        client.connect_locally_to(server1)
+        client.connect_locally_to(server2)
+
+        server1.process_new_messages()
+        server2.process_new_messages()
+        client.process_new_messages()
+
+        for _ in range(5):
+            server1.send_message('test_client_1', 'client_test_message', 'arg1')
+        for _ in range(5):
+            server2.send_message('test_client_1', 'client_test_message', 'arg1')
+
+        # Chatty servers should share the drain limit evenly.
+        client.max_messages_per_drain = 4
+        client.process_new_messages()
+        self.assertEqual(self.server_ids_received_from.count('test_server_1'), 2)
+        self.assertEqual(self.server_ids_received_from.count('test_server_2'), 2)
+
+        # Remaining messages should be received on later calls.
+        client.max_messages_per_drain = None
+        client.process_new_messages()
+        self.assertEqual(self.server_ids_received_from.count('test_server_1'), 5)
+        self.assertEqual(self.server_ids_received_from.count('test_server_2'), 5)
+
+        # No more messages so nothing should be received.
+        client.process_new_messages()
+        self.assertEqual(len(self.server_ids_received_from), 10)
+
+        server1.close()
+        server2.close()
+        client.close()
+
+    def test_fair_drain_time_limit(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server1 = ServerInterface(context, 'test_server_1', 'c2s_drain_time_1', version)
+        server2 = ServerInterface(context, 'test_server_2', 'c2s_drain_time_2', version)
+        client = ClientInterface(context, 'test_client_1', version)
+
+        client.register_callback('client_test_message', self.callback_client_test_message)
+
+        server1.setup()
+        server2.setup()
+        client.setup()
+        client.connect_locally_to(server1)
+        client.connect_locally_to(server2)
+
+        server1.process_new_messages()
+        server2.process_new_messages()
+        client.process_new_messages()
+
+        for _ in range(5):
+            server1.send_message('test_client_1', 'client_test_message', 'arg1')
+        for _ in range(5):
+            server2.send_message('test_client_1', 'client_test_message', 'arg1')
+
+        # Out of time after every message so each call should resume with the other server.
+        client.max_drain_duration = 0
+        for _ in range(4):
+            client.process_new_messages()
+        self.assertEqual(self.server_ids_received_from.count('test_server_1'), 2)
+        self.assertEqual(self.server_ids_received_from.count('test_server_2'), 2)
+
+        client.max_drain_duration = None
+        client.process_new_messages()
+        self.assertEqual(len(self.server_ids_received_from), 10)
+
+        server1.close()
+        server2.close()
+        client.close()
+
+    def callback_client_test_message(self, connection, arg1):
+        self.server_ids_received_from.append(connection.id)
+
+class TestClientWaitingMessages(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+
+        self.num_received = 0
+
+    def test_waiting_messages(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', 'c2s_waiting', version)
+        client = ClientInterface(context, 'test_client_1', version)
+
+        client.register_callback('client_test_message', self.callback_client_test_message)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+
+        self.assertEqual(len(client.socket_file_descriptors()), 1)
+
+        server.process_new_messages()
+        time.sleep(0.05)
+        client.process_new_messages()
+        self.assertFalse(client.has_waiting_messages())
+
+        for _ in range(5):
+            server.send_message('test_client_1', 'client_test_message', 'arg1')
+        time.sleep(0.05)
+        self.assertTrue(client.has_waiting_messages())
+
+        # Run out of time after the first message so the rest should still be waiting.
+        client.max_drain_duration = 0
+        client.process_new_messages()
+        self.assertEqual(self.num_received, 1)
+        self.assertTrue(client.has_waiting_messages())
+
+        client.max_drain_duration = None
+        client.process_new_messages()
+        self.assertEqual(self.num_received, 5)
+        self.assertFalse(client.has_waiting_messages())
+
+        server.close()
+        client.close()
+
+    def callback_client_test_message(self, connection, arg1):
+        self.num_received += 1
+
+class TestPollReadable(unittest.TestCase):
+
+    def test_readable_interfaces(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', 'c2s_readable', version)
+        client = ClientInterface(context, 'test_client_1', version)
+        client.heartbeat_period = 0.05
+
+        poller = zmq.Poller()
+        server.register_poller(poller)
+        client.register_poller(poller)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+
+        # Client sends introduction when it connects.
+        poll_result = dict(poller.poll(1000))
+        self.assertTrue(server.is_readable(poll_result))
+        self.assertFalse(client.is_readable(poll_result))
+
+        # Server replies with its own introduction.
+        server.process_new_messages(refresh_connections=False)
+        self.assertTrue(client.is_readable(dict(poller.poll(1000))))
+
+        # Without refreshing connections the client doesn't send heartbeats.
+        client.process_new_messages(refresh_connections=False)
+        time.sleep(0.1)
+        self.assertFalse(server.is_readable(dict(poller.poll(0))))
+
+        client.refresh_connection_states()
+        self.assertTrue(server.is_readable(dict(poller.poll(1000))))
+
+        server.close()
+        client.close()
+
+class TestHeartbeatSuppression(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+
+        self.num_heartbeats = 0
+
+    def test_no_heartbeats_while_sending(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', 'c2s_heartbeat', version)
+        client = ClientInterface(context, 'test_client_1', version)
+        client.heartbeat_period = 0.1
+
+        server.register_callback('heartbeat', self.callback_server_heartbeat)
+        server.register_callback('server_test_message', self.callback_server_test_message)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+
+        # Client keeps sending other messages so it should never need to send a heartbeat.
+        end_time = time.time() + 0.5
+        while time.time() < end_time:
+            client.send_message('test_server_1', 'server_test_message', 'arg1')
+            client.process_new_messages()
+            server.process_new_messages()
+            time.sleep(0.02)
+
+        self.assertEqual(self.num_heartbeats, 0)
+
+        # Now link is idle so heartbeats should be sent.
+        end_time = time.time() + 0.5
+        while time.time() < end_time:
+            client.process_new_messages()
+            server.process_new_messages()
+            time.sleep(0.02)
+
+        self.assertGreater(self.num_heartbeats, 0)
+
+        server.close()
+        client.close()
+
+    def test_scheduled_heartbeats(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', 'c2s_scheduled_heartbeat', version)
+        client = ClientInterface(context, 'test_client_1', version)
+        client.heartbeat_period = 0.1
+
+        server.register_callback('heartbeat', self.callback_server_heartbeat)
+
+        scheduler = DeadlineScheduler()
+        server.use_scheduler(scheduler)
+        client.use_scheduler(scheduler)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+
+        end_time = time.time() + 0.5
+        while time.time() < end_time:
+            client.process_new_messages(refresh_connections=False)
+            server.process_new_messages(refresh_connections=False)
+            scheduler.run_expired()
+            time.sleep(0.02)
+
+        self.assertGreater(self.num_heartbeats, 0)
+        self.assertEqual(client.lookup_connection('test_server_1').connection_state, 'opened')
+
+        server.close()
+        client.close()
+
+    def test_held_message_not_counted_as_sent(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', 'c2s_held_heartbeat', version)
+        client = ClientInterface(context, 'test_client_1', version)
+
+        server.register_callback('server_test_message', self.callback_server_test_message)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+
+        connection = client.lookup_connection('test_server_1')
+        last_sent_time = connection._last_sent_message_time
+
+        # Make ZMQ refuse the message so it's only held in the send queue.
+        def full_send_queue(recipient_id, frames):
+            raise zmq.Again()
+        client._send_formatted_message = full_send_queue
+        client.send_message('test_server_1', 'server_test_message', 'arg1')
+
+        self.assertEqual(len(connection.send_queue), 1)
+        self.assertEqual(connection._last_sent_message_time, last_sent_time)
+        self.assertFalse(connection.need_to_send_heartbeat())
+
+        # Once the held message actually goes out the link is no longer idle.
+        del client._send_formatted_message
+        client._flush_send_queues()
+
+        self.assertEqual(len(connection.send_queue), 0)
+        self.assertGreater(connection._last_sent_message_time, last_sent_time)
+
+        server.close()
+        client.close()
+
+    def callback_server_heartbeat(self, connection, unused):
+        self.num_heartbeats += 1
+
+    def callback_server_test_message(self, connection, arg1):
+        pass
+
+class TestConnectionStats(unittest.TestCase):
+
+    def test_heartbeat_rtt_and_traffic(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', 'c2s_stats', version)
+        client = ClientInterface(context, 'test_client_1', version)
+
+        server.register_callback('server_test_message', self.callback_server_test_message)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+
+        client.send_message('test_server_1', 'server_test_message', 'arg1')
+
+        end_time = time.time() + 0.5
+        while time.time() < end_time:
+            client.process_new_messages()
+            server.process_new_messages()
+            time.sleep(0.02)
+
+        connection = client.lookup_connection('test_server_1')
+        self.assertTrue(connection.echo_heartbeats)
+
+        # Force heartbeat to be sent so round trip time is measured.
+        connection.heartbeat_rtt_period = 0
+        end_time = time.time() + 0.2
+        while time.time() < end_time and connection.stats.heartbeat_rtt is None:
+            client.process_new_messages()
+            server.process_new_messages()
+            time.sleep(0.02)
+
+        stats = connection.public_stats()
+        self.assertIsNotNone(stats['heartbeat_rtt'])
+        self.assertGreaterEqual(stats['heartbeat_rtt'], 0)
+        self.assertGreater(stats['messages_out_per_sec_by_type']['server_test_message'], 0)
+        self.assertGreater(stats['bytes_out_per_sec'], 0)
+        self.assertGreater(stats['messages_in_per_sec'], 0)
+
+        server.close()
+        client.close()
+
+    def test_receive_queue_depth(self):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', 'c2s_queue_depth', version)
+        client = ClientInterface(context, 'test_client_1', version)
+
+        server.register_callback('server_test_message', self.callback_server_test_message)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+        server.process_new_messages()
+
+        for _ in range(3):
+            client.send_message('test_server_1', 'server_test_message', 'arg1')
+        server.process_new_messages()
+
+        stats = server.lookup_connection('test_client_1').stats
+        self.assertEqual(stats.receive_queue_depth, 3)
+
+        # Nothing received so depth should go back to zero rather than keep the last value.
+        server.process_new_messages()
+        self.assertEqual(stats.receive_queue_depth, 0)
+        self.assertEqual(stats.max_receive_queue_depth, 3)
+
+        server.close()
+        client.close()
+
+    def callback_server_test_message(self, connection, arg1):
+        pass
+
+class TestSendQueue(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+
+        self.received_args = []
+
+    def test_drop_newest(self):
+
+        server, client = self.setup_overflow('c2s_queue_newest', 'drop_newest')
+        connection = client.lookup_connection('test_server_1')
+
+        self.assertEqual(connection.num_messages_queued, 5)
+        self.assertGreater(connection.num_messages_dropped, 0)
+        self.assertEqual(connection.num_messages_sent + connection.num_messages_queued + connection.num_messages_dropped, self.num_sent + 1)
+
+        # Once server catches up the held messages should be sent.
+        while connection.num_messages_queued > 0:
+            server.process_new_messages()
+            client.process_new_messages()
+        server.process_new_messages()
+
+        self.assertEqual(len(self.received_args), self.num_sent - connection.num_messages_dropped)
+        self.assertEqual(self.received_args, sorted(self.received_args))
+
+        server.close()
+        client.close()
+
+    def test_drop_oldest(self):
+
+        server, client = self.setup_overflow('c2s_queue_oldest', 'drop_oldest')
+        connection = client.lookup_connection('test_server_1')
+
+        self.assertEqual(connection.num_messages_queued, 5)
+        self.assertGreater(connection.num_messages_dropped, 0)
+
+        while connection.num_messages_queued > 0:
+            server.process_new_messages()
+            client.process_new_messages()
+        server.process_new_messages()
+
+        # Newest message should have been kept.
+        self.assertEqual(self.received_args[-1], self.num_sent - 1)
+
+        server.close()
+        client.close()
+
+    def setup_overflow(self, local_name, policy):
+        '''Connect client to server then send messages until the client send queue overflows.'''
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        server = ServerInterface(context, 'test_server_1', local_name, version)
+        client = ClientInterface(context, 'test_client_1', version)
+        client.send_hwm = 1
+        client.max_send_queue_size = 5
+        client.send_overflow_policy = policy
+
+        server.register_callback('server_test_message', self.callback_server_test_message)
+
+        server.setup()
+        client.setup()
+        client.connect_locally_to(server)
+        server.process_new_messages()
+
+        # Server isn't receiving so its receive queue (1000 by default) fills up before the client's send queue.
+        self.num_sent = 1100
+        for i in range(self.num_sent):
+            client.send_message('test_server_1', 'server_test_message', i)
+
+        return server, client
+
+    def callback_server_test_message(self, connection, arg1):
+        self.received_args.append(arg1)
+
+class TestForwardMessage(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+
+        self.presenter_received_args = []
+        self.num_messages_manager_handled = 0
+
+    def test_forward_with_routing_headers(self):
+
+        self.relay_messages('forward_1', presenter_uses_headers=True)
+
+        # Manager should have relayed message without handling it itself.
+        self.assertEqual(self.num_messages_manager_handled, 0)
+        self.assertEqual(self.presenter_received_args, [['controller_1', 'sensor_1', 1.5, [1, 2]]])
+
+    def test_forward_to_component_without_routing_headers(self):
+
+        self.relay_messages('forward_2', presenter_uses_headers=False)
+
+        # Presenter should receive the same arguments even though message had to be re-encoded.
+        self.assertEqual(self.num_messages_manager_handled, 0)
+        self.assertEqual(self.presenter_received_args, [['controller_1', 'sensor_1', 1.5, [1, 2]]])
+
+    def relay_messages(self, local_name, presenter_uses_headers):
+
+        context = zmq.Context()
+        version = '1.0.0'
+
+        controller = ServerInterface(context, 'controller_1', local_name + '_c2m', version)
+        manager_client = ClientInterface(context, 'manager', version)
+        manager_server = ServerInterface(context, 'manager', local_name + '_m2p', version)
+        presenter = ClientInterface(context, 'presenter', version)
+
+        controller.use_routing_headers = True
+        manager_client.use_routing_headers = True
+        manager_server.use_routing_headers = True
+        presenter.use_routing_headers = presenter_uses_headers
+
+        manager_client.register_callback('new_sensor_data', self.callback_manager_new_sensor_data)
+        manager_client.register_forwarder('new_sensor_data', lambda connection, message_type, route, raw_message:
+                                          manager_server.forward_message('presenter', message_type, [connection.id] + route, raw_message))
+        presenter.register_callback('new_sensor_data', self.callback_presenter_new_sensor_data)
+
+        manager_client.wire_locally_to(controller)
+        presenter.wire_locally_to(manager_server)
+
+        for interface in [controller, manager_server, manager_client, presenter]:
+            interface.setup()
+            self.addCleanup(interface.close)
+
+        for interface in [controller, manager_server, manager_client, presenter]:
+            interface.process_new_messages()
+
+        controller.send_message('manager', 'new_sensor_data', ('sensor_1', 1.5, [1, 2]))
+        manager_client.process_new_messages()
+        presenter.process_new_messages()
+
+    def callback_manager_new_sensor_data(self, connection, *args):
+        self.num_messages_manager_handled += 1
+
+    def callback_presenter_new_sensor_data(self, connection, *args):
+        self.presenter_received_args.append(list(args))
+
 if __name__ == '__main__':
 
     unittest.main()
\ No newline at end of file
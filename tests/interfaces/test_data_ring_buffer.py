@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.interfaces.data_ring_buffer import DataRingBuffer, DataRecordLayout, make_record_layout
+
+class TestMakeRecordLayout(unittest.TestCase):
+
+    def test_numeric_data(self):
+
+        layout = make_record_layout([{'name': 'count', 'type': 'int'}, {'name': 'distance', 'type': 'float'}])
+        self.assertEqual(layout.data_types, ['int', 'float'])
+
+    def test_string_data(self):
+
+        layout = make_record_layout([{'name': 'id', 'type': 'str'}, {'name': 'distance', 'type': 'float'}])
+        self.assertIsNone(layout)
+
+    def test_no_data(self):
+
+        self.assertIsNone(make_record_layout([]))
+
+class TestDataRingBuffer(unittest.TestCase):
+
+    def setUp(self):
+
+        self.ring = DataRingBuffer(DataRecordLayout(['int', 'float']), capacity=3)
+
+    def test_write_and_read(self):
+
+        self.assertTrue(self.ring.write(10.5, 11.5, [1, 2.25], True))
+        self.assertTrue(self.ring.write(12.5, 13.5, [2, 3], False))
+
+        self.assertEqual(self.ring.read_all(), [(10.5, 11.5, [1, 2.25], True), (12.5, 13.5, [2, 3.0], False)])
+        self.assertEqual(self.ring.read_all(), [])
+
+    def test_wrap_around(self):
+
+        for i in range(5):
+            self.ring.write(i, i, [i, i], True)
+            self.assertEqual(self.ring.read_all(), [(i, i, [i, i], True)])
+
+    def test_full(self):
+
+        for i in range(4):
+            self.ring.write(i, i, [i, i], True)
+
+        self.assertEqual(self.ring.num_dropped, 1)
+        self.assertEqual([record[2][0] for record in self.ring.read_all()], [0, 1, 2])
+
+    def test_bad_data(self):
+
+        self.assertRaises(ValueError, self.ring.write, 0, 0, [1.5, 2.0], True) # float in int field
+        self.assertRaises(ValueError, self.ring.write, 0, 0, [1, None], True)
+        self.assertRaises(ValueError, self.ring.write, 0, 0, [1], True)
+        self.assertEqual(self.ring.num_waiting, 0)
+
+    def test_notification(self):
+
+        self.ring.write(0, 0, [0, 0], True)
+        self.assertTrue(self.ring.claim_notification())
+        self.ring.write(1, 1, [1, 1], True)
+        self.assertFalse(self.ring.claim_notification())
+
+        self.ring.read_all()
+        self.ring.write(2, 2, [2, 2], True)
+        self.assertTrue(self.ring.claim_notification())
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+import time
+
+from dysense.interfaces.deadline_scheduler import DeadlineScheduler
+
+class TestDeadlineScheduler(unittest.TestCase):
+
+    def setUp(self):
+
+        self.scheduler = DeadlineScheduler()
+        self.calls = []
+
+    def test_runs_in_deadline_order(self):
+
+        now = time.time()
+        self.scheduler.call_at(now + 2, lambda: self.calls.append('b'))
+        self.scheduler.call_at(now + 1, lambda: self.calls.append('a'))
+        self.scheduler.call_at(now + 3, lambda: self.calls.append('c'))
+
+        self.assertEqual(self.scheduler.next_deadline(), now + 1)
+        self.assertEqual(self.scheduler.run_expired(now + 2.5), 2)
+        self.assertEqual(self.calls, ['a', 'b'])
+        self.assertEqual(self.scheduler.next_deadline(), now + 3)
+
+    def test_cancel(self):
+
+        now = time.time()
+        call = self.scheduler.call_at(now + 1, lambda: self.calls.append('a'))
+        self.scheduler.call_at(now + 2, lambda: self.calls.append('b'))
+        call.cancel()
+
+        self.assertEqual(self.scheduler.next_deadline(), now + 2)
+        self.scheduler.run_expired(now + 5)
+        self.assertEqual(self.calls, ['b'])
+        self.assertIsNone(self.scheduler.next_deadline())
+        self.assertEqual(self.scheduler.time_until_next(max_wait=0.5), 0.5)
+
+    def test_periodic(self):
+
+        call = self.scheduler.call_every(1, lambda: self.calls.append('tick'), first_delay=1)
+        start_deadline = call.deadline
+
+        self.scheduler.run_expired(start_deadline)
+        self.assertEqual(call.deadline, start_deadline + 1)
+
+        # Fell behind so missed runs are skipped.
+        self.scheduler.run_expired(start_deadline + 5.5)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(call.deadline, start_deadline + 6.5)
+
+    def test_calls_scheduled_while_running_wait(self):
+
+        def reschedule():
+            self.calls.append('a')
+            self.scheduler.call_at(0, reschedule)
+
+        self.scheduler.call_at(0, reschedule)
+
+        self.assertEqual(self.scheduler.run_expired(), 1)
+        self.assertEqual(self.scheduler.run_expired(), 1)
+        self.assertEqual(self.calls, ['a', 'a'])
+
+    def test_time_overdue(self):
+
+        self.assertEqual(self.scheduler.time_overdue(), 0)
+
+        now = time.time()
+        self.scheduler.call_at(now + 1, lambda: None)
+        self.assertEqual(self.scheduler.time_overdue(now), 0)
+        self.assertEqual(self.scheduler.time_overdue(now + 3), 2)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.interfaces.loop_monitor import Histogram, LoopMonitor
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+
+        histogram = Histogram()
+        for i in range(1, 101):
+            histogram.add(i * 0.001)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean, 0.0505)
+        self.assertAlmostEqual(histogram.max, 0.1)
+
+        # Percentiles are bucket upper bounds so they can be up to one bucket too high, but never too low.
+        for fraction, expected in [(0.5, 0.05), (0.9, 0.09), (0.99, 0.099)]:
+            value = histogram.percentile(fraction)
+            self.assertGreaterEqual(value, expected)
+            self.assertLessEqual(value, expected * 2 ** (1.0 / Histogram.buckets_per_doubling))
+
+        self.assertEqual(histogram.percentile(1.0), 0.1)
+
+    def test_empty(self):
+
+        self.assertEqual(Histogram().percentile(0.99), 0)
+
+class TestLoopMonitor(unittest.TestCase):
+
+    def test_lagging(self):
+
+        monitor = LoopMonitor(max_lag=0.5, window=10)
+
+        monitor.record_iteration(0.001, 0.0, 1, current_time=100)
+        monitor.record_iteration(0.8, 0.7, 50, current_time=101)
+
+        self.assertEqual(monitor.check_lag(), 0.7)
+        self.assertTrue(monitor.lagging)
+
+        info = monitor.public_info(current_time=102)
+        self.assertEqual(info['iteration_time']['count'], 2)
+        self.assertEqual(info['backlog']['max'], 50)
+
+        # Recovers once lag is checked again without any new stalls.
+        monitor.record_iteration(0.001, 0.01, 1, current_time=103)
+        monitor.check_lag()
+        self.assertFalse(monitor.lagging)
+
+    def test_window(self):
+
+        monitor = LoopMonitor(window=10)
+
+        monitor.record_message_latency(0.2, current_time=100)
+        monitor.record_message_latency(0.1, current_time=111)
+
+        # Previous window is still reported along with current one.
+        self.assertEqual(monitor.public_info(current_time=112)['message_latency']['count'], 2)
+
+        # Both windows are old now.
+        self.assertEqual(monitor.public_info(current_time=135)['message_latency']['count'], 0)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unittest
+
+from dysense.interfaces.message_codec import available_codec_names, lookup_codec, decode_message
+
+class TestMessageCodec(unittest.TestCase):
+
+    # Mix of byte strings (like data read from a serial port) and unicode.
+    message = {'sender_id': str('sensor_1'), 'type': 'new_sensor_data',
+               'body': (1467822315.123456, [str('$GPGGA'), 'ñ', 57, 0.375, None], True)}
+
+    def test_json_round_trip(self):
+
+        decoded = self.round_trip('json')
+
+        self.assertEqual(decoded['body'], [1467822315.123456, ['$GPGGA', 'ñ', 57, 0.375, None], True])
+        self.assertIsInstance(decoded['sender_id'], unicode)
+        self.assertIsInstance(decoded['body'][1][0], unicode)
+
+    @unittest.skipIf('msgpack' not in available_codec_names(), 'msgpack not installed')
+    def test_msgpack_matches_json(self):
+
+        # Byte strings must come out as unicode, the same as JSON, so callbacks don't depend on the codec.
+        decoded = self.round_trip('msgpack')
+
+        self.assertEqual(decoded, self.round_trip('json'))
+        self.assertIsInstance(decoded['sender_id'], unicode)
+        self.assertIsInstance(decoded['body'][1][0], unicode)
+
+    def round_trip(self, codec_name):
+
+        return decode_message(lookup_codec(codec_name).encode(self.message))
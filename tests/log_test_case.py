@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import shutil
+import tempfile
+import unittest
+
+class LogTestCase(unittest.TestCase):
+    '''Base class for tests that write sensor data logs to a temporary directory.'''
+
+    data_metadata = [{'name': 'latitude', 'type': 'float', 'units': 'degrees'},
+                     {'name': 'count', 'type': 'int'}]
+
+    column_names = ['utc_time', 'latitude', 'count']
+
+    # How many samples are written to each log (one per second of utc_time).
+    num_samples = 100
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.samples = [[1000.5 + i, 35.25 + i, i] for i in range(self.num_samples)]
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def write_log(self, log, log_writer=None):
+        '''Write every sample to log and close it. If log_writer is specified then it's stopped once log is closed.'''
+
+        log.handle_metadata(list(self.column_names))
+        for sample in self.samples:
+            log.write(list(sample))
+        log.terminate()
+        if log_writer is not None:
+            log_writer.stop()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+
+import numpy.testing as np_test
+
+from dysense.core.binary_log import BinaryLog, supports_binary_log
+from dysense.core.csv_log import CSVLog
+from dysense.core.log_writer import LogWriter
+from dysense.processing.output_versions.binary_log_reader import is_binary_log, read_binary_log, convert_binary_log_to_csv
+from tests.log_test_case import LogTestCase
+
+class TestBinaryLog(LogTestCase):
+
+    num_samples = 50
+
+    def setUp(self):
+        LogTestCase.setUp(self)
+
+        self.binary_path = os.path.join(self.directory, 'gps.dlog')
+
+        # Latitudes with a lot of digits to check no precision is lost.
+        self.samples = [[1000.25 + i, 35.1234567890123 + i * 0.1, i] for i in range(self.num_samples)]
+
+    def test_supports_binary_log(self):
+
+        self.assertTrue(supports_binary_log(self.data_metadata))
+        self.assertFalse(supports_binary_log(self.data_metadata + [{'name': 'fix', 'type': 'str'}]))
+        self.assertFalse(supports_binary_log([]))
+
+    def test_read_arrays(self):
+
+        log_writer = LogWriter()
+        log_writer.start()
+        self.write_log(BinaryLog(self.binary_path, self.data_metadata, log_writer), log_writer)
+
+        self.assertTrue(is_binary_log(self.binary_path))
+
+        header, utc_times, data = read_binary_log(self.binary_path)
+
+        self.assertEqual([column['name'] for column in header['columns']], ['utc_time', 'latitude', 'count'])
+        np_test.assert_array_equal(utc_times, [sample[0] for sample in self.samples])
+        np_test.assert_array_equal(data, [sample[1:] for sample in self.samples])
+
+    def test_partial_record_ignored(self):
+
+        self.write_log(BinaryLog(self.binary_path, self.data_metadata))
+        with open(self.binary_path, 'ab') as log_file:
+            log_file.write(b'\x01\x02\x03')
+
+        _, utc_times, _ = read_binary_log(self.binary_path)
+        self.assertEqual(len(utc_times), len(self.samples))
+
+    def test_invalid_data(self):
+
+        binary_log = BinaryLog(self.binary_path, self.data_metadata)
+        self.assertRaises(ValueError, binary_log.write, [1000.0, 35.0, 1.5])
+        self.assertRaises(ValueError, binary_log.write, [1000.0, 35.0])
+
+    def test_convert_to_csv(self):
+
+        self.write_log(BinaryLog(self.binary_path, self.data_metadata))
+
+        converted_path = os.path.join(self.directory, 'converted.csv')
+        self.assertEqual(convert_binary_log_to_csv(self.binary_path, converted_path), len(self.samples))
+
+        # Should be exactly the same as logging to CSV in the first place.
+        csv_path = os.path.join(self.directory, 'original.csv')
+        self.write_log(CSVLog(csv_path, 1))
+
+        with open(converted_path, 'rb') as converted_file, open(csv_path, 'rb') as csv_file:
+            self.assertEqual(converted_file.read(), csv_file.read())
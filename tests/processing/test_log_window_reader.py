@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+
+import numpy.testing as np_test
+
+from dysense.core.binary_log import BinaryLog
+from dysense.core.csv_log import CSVLog
+from dysense.core.log_writer import LogWriter
+from dysense.core.time_index import TimeIndex, load_time_index, time_index_path
+from dysense.processing.output_versions.log_window_reader import log_byte_ranges, read_csv_log_window, read_binary_log_window
+from tests.log_test_case import LogTestCase
+
+class TestLogWindowReader(LogTestCase):
+
+    # Not a multiple of the index interval so the last index entry is partial.
+    num_samples = 95
+
+    def expected_times(self, start_utc, end_utc):
+
+        return [sample[0] for sample in self.samples if start_utc <= sample[0] <= end_utc]
+
+    def test_index_byte_ranges(self):
+
+        # Third block has a time that's out of order.
+        time_index = TimeIndex([(0, 10, 20, 0.0, 9.0),
+                                (10, 20, 30, 10.0, 19.0),
+                                (20, 30, 40, 5.0, 29.0),
+                                (30, 40, 50, 30.0, 39.0)])
+
+        self.assertEqual(time_index.byte_ranges(11.0, 12.0), [(20, 40)])
+        self.assertEqual(time_index.byte_ranges(6.0, 7.0), [(10, 20), (30, 40)])
+        self.assertEqual(time_index.byte_ranges(35.0, 100.0), [(40, 50)])
+        self.assertEqual(time_index.byte_ranges(100.0, 200.0), [])
+        self.assertEqual(time_index.indexed_end_offset, 50)
+
+    def test_csv_window(self):
+
+        log_writer = LogWriter()
+        log_writer.start()
+        csv_path = os.path.join(self.directory, 'gps.csv')
+        self.write_log(CSVLog(csv_path, 1, log_writer, index_interval=10), log_writer)
+
+        # 9 full blocks and a partial one.
+        self.assertEqual(len(load_time_index(csv_path).entries), 10)
+
+        rows = read_csv_log_window(csv_path, 1020.5, 1033.5)
+        self.assertEqual([row[0] for row in rows], self.expected_times(1020.5, 1033.5))
+        self.assertEqual(rows[0][1], ['55.25', '20'])
+
+        # Only the blocks overlapping the window should be read.
+        byte_ranges = log_byte_ranges(csv_path, 1020.5, 1033.5)
+        self.assertEqual(len(byte_ranges), 2)
+        self.assertEqual(byte_ranges[-1][1], None)
+        self.assertLess(byte_ranges[0][1] - byte_ranges[0][0], os.path.getsize(csv_path) / 2)
+
+    def test_binary_window(self):
+
+        binary_path = os.path.join(self.directory, 'gps.dlog')
+        self.write_log(BinaryLog(binary_path, self.data_metadata, index_interval=10))
+
+        for start_utc, end_utc in [(1020.5, 1033.5), (0, 2000), (1094.5, 1094.5), (2000, 3000)]:
+            _, records = read_binary_log_window(binary_path, start_utc, end_utc)
+            np_test.assert_array_equal(records['f0'], self.expected_times(start_utc, end_utc))
+
+    def test_unindexed_rows(self):
+
+        # Only write the first index entry, like if the session crashed.
+        csv_path = os.path.join(self.directory, 'gps.csv')
+        self.write_log(CSVLog(csv_path, 1, index_interval=10))
+        with open(time_index_path(csv_path), 'rb') as index_file:
+            first_entry_lines = index_file.readlines()[:2]
+        with open(time_index_path(csv_path), 'wb') as index_file:
+            index_file.writelines(first_entry_lines + [b'10,1'])
+
+        rows = read_csv_log_window(csv_path, 1080.5, 1090.5)
+        self.assertEqual([row[0] for row in rows], self.expected_times(1080.5, 1090.5))
+
+        # Without an index the entire log is read.
+        os.remove(time_index_path(csv_path))
+        rows = read_csv_log_window(csv_path, 1000.5, 1001.5)
+        self.assertEqual([row[0] for row in rows], [1000.5, 1001.5])
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import time
+import threading
+import unittest
+
+import zmq
+
+from dysense.interfaces.server_interface import ServerInterface
+from dysense.interfaces.message_codec import available_codec_names
+from dysense.sensor_base.sensor_base import SensorBase
+
+class FakeClockSensor(SensorBase):
+    '''Sensor driver that doesn't talk to a device and uses a system time set by the test.'''
+
+    def __init__(self, *args, **kwargs):
+        self.fake_sys_time = 1000.0
+        # Samples (utc_time, sys_time, data) handled when run() sets up the sensor.
+        self.setup_samples = []
+        SensorBase.__init__(self, *args, **kwargs)
+
+    @property
+    def sys_time(self):
+        return self.fake_sys_time
+
+    def setup(self):
+        for utc_time, sys_time, data in self.setup_samples:
+            self.handle_data(utc_time, sys_time, data)
+
+    def close(self):
+        pass
+
+    def is_closed(self):
+        return True
+
+    def read_new_data(self):
+        return 'normal'
+
+class PipeSensor(SensorBase):
+    '''Sensor driver that reads data from the read end of a pipe, like a serial port.'''
+
+    def __init__(self, device_fd, *args, **kwargs):
+        self.device_fd = device_fd
+        self.num_reads = 0
+        self.received_bytes = b''
+        SensorBase.__init__(self, *args, **kwargs)
+
+    def device_file_descriptor(self):
+        return self.device_fd
+
+    def close(self):
+        pass
+
+    def is_closed(self):
+        return True
+
+    def read_new_data(self):
+        self.num_reads += 1
+        self.received_bytes += os.read(self.device_fd, 1024)
+        return 'normal'
+
+class SensorTestCase(unittest.TestCase):
+    '''Connects a sensor to a server that records every message the sensor sends (as a (message_type, args) tuple).'''
+
+    sensor_message_types = ['new_sensor_data', 'new_sensor_data_batch', 'new_sensor_text',
+                            'new_sensor_status', 'new_sensor_event']
+
+    def setUp(self):
+
+        self.received_messages = []
+
+    def connect_sensor(self, sensor_class, local_name, *args, **kwargs):
+        '''
+        Return new sensor connected to the test controller. If setup_interface is false then the sensor doesn't
+        connect until it's run.
+        '''
+        setup_interface = kwargs.pop('setup_interface', True)
+        controller_codecs = kwargs.pop('controller_codecs', None)
+
+        context = zmq.Context()
+
+        self.controller = ServerInterface(context, 'controller', local_name, '1.0.0')
+        if controller_codecs is not None:
+            self.controller.codecs = controller_codecs
+        for message_type in self.sensor_message_types:
+            self.controller.register_callback(message_type, self.make_recorder(message_type))
+        self.controller.setup()
+        self.addCleanup(self.controller.close)
+
+        sensor = sensor_class(*(args + ('sensor_1', 'test_sensor_1', context, self.controller.local_endpoint)), **kwargs)
+        self.addCleanup(sensor.interface.close)
+
+        if setup_interface:
+            sensor.interface.setup()
+            self.receive_messages()
+
+        return sensor
+
+    def make_recorder(self, message_type):
+
+        def record_message(connection, *args):
+            self.received_messages.append((message_type, args))
+
+        return record_message
+
+    def receive_messages(self):
+        '''Return list of message types received since the last call.'''
+
+        num_previous_messages = len(self.received_messages)
+        self.controller.process_new_messages()
+
+        return [message_type for message_type, _ in self.received_messages[num_previous_messages:]]
+
+class TestDataBatching(SensorTestCase):
+
+    def test_flush_by_size(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_batch_size', max_data_batch_size=3, max_data_batch_age=10)
+
+        sensor.handle_data(1500.5, 1000.0, [1, 'a'])
+        sensor.handle_data(1501.5, 1000.5, [2, 'b'])
+        self.assertEqual(self.receive_messages(), [])
+
+        sensor.handle_data(1502.5, 1001.0, [3, 'c'], False)
+        self.assertEqual(self.receive_messages(), ['new_sensor_data_batch'])
+
+        data_batch = self.received_messages[-1][1][0]
+        self.assertEqual(data_batch, [[1500.5, 1000.0, [1, 'a'], True],
+                                      [1501.5, 1000.5, [2, 'b'], True],
+                                      [1502.5, 1001.0, [3, 'c'], False]])
+        self.assertEqual(sensor.num_data_messages_sent, 3)
+
+    def test_flush_by_age(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_batch_age', max_data_batch_size=100, max_data_batch_age=0.5)
+
+        sensor.handle_data(1500.5, 1000.0, [1])
+        sensor.fake_sys_time += 0.25
+        sensor.handle_data(1500.75, 1000.25, [2])
+        self.assertFalse(sensor._data_batch_expired())
+        self.assertEqual(self.receive_messages(), [])
+
+        # Age is measured from the oldest sample in the batch.
+        sensor.fake_sys_time += 0.25
+        self.assertTrue(sensor._data_batch_expired())
+
+        sensor.handle_data(1501.0, 1000.5, [3])
+        self.assertEqual(self.receive_messages(), ['new_sensor_data_batch'])
+        self.assertEqual(len(self.received_messages[-1][1][0]), 3)
+        self.assertFalse(sensor._data_batch_expired())
+
+    def test_batch_sent_before_other_messages(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_batch_order', max_data_batch_size=100, max_data_batch_age=10)
+
+        sensor.handle_data(1500.5, 1000.0, [1])
+        sensor.handle_data(1501.5, 1001.0, [2])
+        sensor.send_text('after data')
+
+        self.assertEqual(self.receive_messages(), ['new_sensor_data_batch', 'new_sensor_text'])
+
+        # Nothing left to send.
+        sensor.flush_data_batch()
+        self.assertEqual(self.receive_messages(), [])
+
+    def test_batch_sent_on_close(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_batch_close', max_data_batch_size=100, max_data_batch_age=10,
+                                     setup_interface=False)
+
+        sensor.setup_samples = [(1500.5, 1000.0, [1]), (1501.5, 1001.0, [2])]
+
+        # Close right away so the only data is what's already batched.
+        sensor.received_close_request = True
+        sensor.run()
+
+        message_types = self.receive_messages()
+        self.assertIn('new_sensor_data_batch', message_types)
+        self.assertLess(message_types.index('new_sensor_data_batch'), message_types.index('new_sensor_event'))
+        data_batches = [args[0] for message_type, args in self.received_messages if message_type == 'new_sensor_data_batch']
+        self.assertEqual(data_batches, [[[1500.5, 1000.0, [1], True], [1501.5, 1001.0, [2], True]]])
+
+    def test_batching_disabled(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_batch_disabled')
+
+        sensor.handle_data(1500.5, 1000.0, [1])
+        self.assertEqual(self.receive_messages(), ['new_sensor_data'])
+        self.assertEqual(self.received_messages[-1][1], (1500.5, 1000.0, [1], True))
+
+class TestPolledLoop(SensorTestCase):
+
+    def test_default_file_descriptor(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_polled_default')
+
+        # Sensors use the timed loop unless the driver provides a descriptor.
+        self.assertIsNone(sensor.device_file_descriptor())
+
+    def test_polled_loop(self):
+
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+
+        # Long read period so the sensor doesn't time out or need to wake up on its own during the test.
+        sensor = self.connect_sensor(PipeSensor, 'c2s_polled_loop', read_fd, desired_read_period=10,
+                                     wait_for_valid_time=False, setup_interface=False)
+
+        sensor_thread = threading.Thread(target=sensor.run)
+        sensor_thread.start()
+        self.addCleanup(sensor_thread.join, 5)
+
+        self.wait_for(lambda: 'sensor_1' in self.controller.connection_ids())
+
+        # Device is quiet so data should never be read.
+        self.wait_for(lambda: False, timeout=0.3)
+        self.assertEqual(sensor.num_reads, 0)
+
+        os.write(write_fd, b'$GPGGA')
+        self.wait_for(lambda: sensor.received_bytes == b'$GPGGA')
+        self.assertEqual(sensor.num_reads, 1)
+
+        # Commands are still handled while the device is quiet.
+        self.controller.send_message('sensor_1', 'command', ('resume', None))
+        self.wait_for(lambda: not sensor.paused)
+        self.controller.send_message('sensor_1', 'command', ('pause', None))
+        self.wait_for(lambda: sensor.paused)
+        self.assertEqual(sensor.num_reads, 1)
+
+        self.controller.send_message('sensor_1', 'command', ('close', None))
+        sensor_thread.join(2)
+        self.assertFalse(sensor_thread.is_alive())
+        self.assertEqual(sensor.num_reads, 1)
+        self.assertEqual(sensor.state, 'closed')
+
+    def wait_for(self, condition, timeout=2.0):
+        '''Keep handling sensor messages until condition returns true. Return false if timeout is reached first.'''
+
+        end_time = time.time() + timeout
+        while time.time() < end_time:
+            self.receive_messages()
+            if condition():
+                return True
+            time.sleep(0.01)
+
+        return False
+
+class TestReportedState(SensorTestCase):
+
+    def setUp(self):
+        SensorTestCase.setUp(self)
+
+        self.sensor = self.connect_sensor(FakeClockSensor, 'c2s_reported_state', desired_read_period=1.0)
+        self.sensor.last_received_data_time = self.sensor.fake_sys_time
+
+    def test_waiting_for_time(self):
+
+        self.sensor._handle_reported_state('normal')
+        self.assertEqual(self.sensor.state, 'waiting_for_time')
+
+        # Bad states are reported even without a valid time.
+        self.sensor._handle_reported_state('error')
+        self.assertEqual(self.sensor.state, 'error')
+
+        self.sensor.handle_new_time(None, 1500.5, self.sensor.sys_time)
+        self.sensor._handle_reported_state('normal')
+        self.assertEqual(self.sensor.state, 'normal')
+        self.assertFalse(self.sensor.still_waiting_for_data)
+
+    def test_timed_out(self):
+
+        self.sensor.handle_new_time(None, 1500.5, self.sensor.sys_time)
+        self.sensor._handle_reported_state('normal')
+
+        # Driver returned before the sensor was late so it's still waiting for the same reading.
+        self.sensor._handle_reported_state('timed_out')
+        self.assertEqual(self.sensor.state, 'normal')
+        self.assertTrue(self.sensor.still_waiting_for_data)
+
+        self.sensor.fake_sys_time += 1.5
+        self.sensor._handle_reported_state('timed_out')
+        self.assertEqual(self.sensor.state, 'timed_out')
+        self.assertFalse(self.sensor.still_waiting_for_data)
+
+    def test_driver_decides_timeout(self):
+
+        self.sensor.decide_timeout = False
+        self.sensor._handle_reported_state('timed_out')
+        self.assertEqual(self.sensor.state, 'timed_out')
+
+class TestSensorCodecs(SensorTestCase):
+
+    def test_json_controller(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_codec_json')
+
+        # Sensor offers faster codecs but controller only speaks JSON.
+        sensor.interface.process_new_messages()
+        self.assertEqual(sensor.controller_connection.codec.name, 'json')
+
+    @unittest.skipIf('msgpack' not in available_codec_names(), 'msgpack not installed')
+    def test_msgpack(self):
+
+        sensor = self.connect_sensor(FakeClockSensor, 'c2s_codec_msgpack', controller_codecs=['msgpack', 'json'])
+
+        self.assertEqual(sensor.interface.codecs[0], 'msgpack')
+
+        # Receive controller's reply to the introduction.
+        sensor.interface.process_new_messages()
+        self.assertEqual(sensor.controller_connection.codec.name, 'msgpack')
+        self.assertEqual(self.controller.lookup_connection('sensor_1').codec.name, 'msgpack')
+
+        sensor.handle_data(1500.5, 1000.0, [1, str('$GPGGA')])
+        self.assertEqual(self.receive_messages(), ['new_sensor_data'])
+        self.assertEqual(self.received_messages[-1][1], (1500.5, 1000.0, [1, '$GPGGA'], True))